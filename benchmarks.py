@@ -0,0 +1,307 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import tiebreak_events
+import tiebreak_profile
+from schedule_analyzer import *
+from season_generator import *
+from seeds_batch import *
+
+
+# Benchmarks for the seeding & tiebreak hot paths.
+#
+# Each case is timed over a number of runs (setup isn't timed), then run once
+# more under tracemalloc for its allocations. The tiebreak cache is cleared
+# before every run, otherwise everything after the first run is a cache hit.
+# Results are written as JSON & compared against a stored baseline:
+#
+#   python benchmarks.py --save-baseline      # record results/benchmark_baseline.json
+#   python benchmarks.py                      # ... make changes, then compare
+#   python benchmarks.py --profile-steps      # where the tiebreak time goes, per step
+#
+# Cases on the real seasons need the CSVs in data/ & are skipped without them.
+# The rest run on adversarial fixtures: generated seasons with lots of ties &
+# close scores, picked for how many restarts they push get_best_team into.
+
+benchmark_year = 2021
+default_baseline_path = 'results/benchmark_baseline.json'
+default_output_path = 'results/benchmark_results.json'
+default_profile_path = 'results/tiebreak_profile.json'
+
+# Steps that raise rather than break the tie
+unbenchmarked_steps = [net_touchdowns_tiebreak, coin_toss_tiebreak]
+# A single tiebreak step only takes microseconds, so each step case applies
+# the step this many times over.
+step_repeats = 100
+# Outcomes per get_seeds_batch & rank_divisions_batch case
+batch_outcomes = 1000
+# Differences smaller than this are timer noise, not regressions
+min_time_change_s = 0.0005
+
+
+# Number of teams eliminated partway through a tiebreak (each one restarts
+# get_best_team from the first step) while seeding both conferences. None if
+# the season can't be seeded without a coin toss.
+def count_restarts(schedules, year):
+    sink = tiebreak_events.BufferSink()
+    tiebreak_events.add_sink(sink)
+    try:
+        for conf in ['AFC', 'NFC']:
+            get_seeds(schedules, conf, year)
+    except UnresolvedTiebreak:
+        return None
+    finally:
+        tiebreak_events.remove_sink(sink)
+    return len([event for event in sink.events if event['event'] == 'step' and event['result'] == 'eliminated'])
+
+# Lots of ties, & scores close enough that the points tiebreaks come up too
+fixture_score_dist = ScoreDist(tie_prob=0.3, mean_points=20.0, sd_points=4.0)
+
+# Returns [(seed, games)] for the num_fixtures generated seasons (out of the
+# candidates) with the most restarts.
+def get_adversarial_fixtures(year=benchmark_year, num_fixtures=3, num_candidates=100):
+    prev_div_rankings = {div: div_teams.copy() for div, div_teams in divisions.items()}
+    candidates = []
+    for seed in range(num_candidates):
+        games = generate_season(nfl_league, year, prev_div_rankings, random.Random(seed), fixture_score_dist)
+        restarts = count_restarts(SeasonIndex(team_schedules(games, year)), year)
+        if restarts is not None:
+            candidates.append((restarts, seed, games))
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+    return [(seed, games) for _, seed, games in candidates[:num_fixtures]]
+
+
+# A benchmark case. setup() is run (untimed) before each run & its result is
+# passed to func.
+class Case:
+    def __init__(self, name, func, setup=None):
+        self.name = name
+        self.func = func
+        self.setup = setup or (lambda: None)
+
+    # Like timeit, the garbage collector is off while timing
+    def run_once(self):
+        arg = self.setup()
+        tiebreak_cache.clear()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            self.func(arg)
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    def measure_allocations(self):
+        arg = self.setup()
+        tiebreak_cache.clear()
+        tracemalloc.start()
+        try:
+            start_bytes, _ = tracemalloc.get_traced_memory()
+            self.func(arg)
+            end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak_bytes - start_bytes, end_bytes - start_bytes
+
+    def measure(self, runs):
+        times = [self.run_once() for _ in range(runs)]
+        peak_bytes, retained_bytes = self.measure_allocations()
+        return {'runs': runs, 'min_s': min(times), 'median_s': statistics.median(times),
+            'mean_s': statistics.mean(times), 'peak_bytes': peak_bytes, 'retained_bytes': retained_bytes}
+
+
+def get_tiebreak_groups(tiebreak_type):
+    if tiebreak_type == 'div':
+        return list(divisions.values())
+    # The second team of each division, so that no two are division rivals
+    return [[div_teams[1] for div, div_teams in divisions.items() if div.startswith(conf)]
+        for conf in ['AFC', 'NFC']]
+
+# Cases for one season (real or fixture), named with the given prefix
+def get_season_cases(prefix, games, year, prev_div_rankings):
+    schedules = team_schedules(games, year)
+    index = SeasonIndex(schedules)
+    cases = [
+        Case(f'{prefix}/team_schedules', lambda _: team_schedules(games, year)),
+        Case(f'{prefix}/season_index', lambda _: SeasonIndex(schedules)),
+        Case(f'{prefix}/rank_divisions', lambda _: rank_divisions(index)),
+        Case(f'{prefix}/rank_league', lambda _: rank_league(index)),
+    ]
+    for conf in ['AFC', 'NFC']:
+        cases.append(Case(f'{prefix}/get_seeds_{conf}', lambda _, conf=conf: get_seeds(index, conf, year)))
+
+    for tiebreak_type, tiebreak_funcs in [('div', div_tiebreak_funcs), ('wc', wc_tiebreak_funcs)]:
+        groups = get_tiebreak_groups(tiebreak_type)
+        for tiebreak_func in tiebreak_funcs:
+            if tiebreak_func in unbenchmarked_steps:
+                continue
+            def run_step(_, tiebreak_func=tiebreak_func, tiebreak_type=tiebreak_type, groups=groups):
+                for _ in range(step_repeats):
+                    for teams in groups:
+                        tiebreak_func(index, teams.copy(), tiebreak_type)
+            cases.append(Case(f'{prefix}/{tiebreak_type}/{tiebreak_func.__name__}', run_step))
+
+    if year >= 2021:
+        cases.append(Case(f'{prefix}/get_schedules_without_17th',
+            lambda _: get_schedules_without_17th(index, year, prev_div_rankings)))
+    cases.append(Case(f'{prefix}/get_schedules_without_ranked_opps',
+        lambda _: get_schedules_without_ranked_opps(index, year, prev_div_rankings)))
+    table = GameTable(games)
+    cases.append(Case(f'{prefix}/counterfactual_indexes', lambda _: table.get_indexes(
+        list(get_counterfactual_masks(table, year, prev_div_rankings).values()))))
+    # The same schedule with every result flipped at random, batch_outcomes times over
+    flips = np.random.default_rng(0).random((batch_outcomes, len(games))) < 0.5
+    cases.append(Case(f'{prefix}/get_seeds_batch', lambda _: get_seeds_batch(table, year, None, *table.get_flipped(flips))))
+    cases.append(Case(f'{prefix}/rank_divisions_batch', lambda _: rank_divisions_batch(table, None, *table.get_flipped(flips))))
+    return cases
+
+def run_main_quietly(_):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        main(workers=1)
+
+# Returns (cases, {skipped case: reason})
+def get_cases(year=benchmark_year):
+    cases, skipped = [], {}
+
+    prev_div_rankings = {div: div_teams.copy() for div, div_teams in divisions.items()}
+    for seed, games in get_adversarial_fixtures():
+        cases += get_season_cases(f'adversarial-{seed}', games, benchmark_year, prev_div_rankings)
+
+    missing = [data_year for data_year in [year-1, year] if not os.path.exists(f'data/{data_year}.csv')]
+    if missing:
+        skipped[f'real-{year}'] = f"missing data/{missing[0]}.csv"
+    else:
+        load_year(year)  # Make sure the cache is warm
+        cases.append(Case(f'real-{year}/parse_year', lambda _: parse_year(year)))
+        cases.append(Case(f'real-{year}/load_year', lambda _: load_year(year)))
+        games, _ = load_year(year)
+        cases += get_season_cases(f'real-{year}', games, year, rank_year(year-1))
+
+    missing = [main_year for main_year in range(2002, 2021+1) if not os.path.exists(f'data/{main_year}.csv')]
+    if missing:
+        skipped['main'] = f"missing the CSVs for {', '.join(map(str, missing))}"
+    else:
+        cases.append(Case('main', run_main_quietly))
+    return cases, skipped
+
+def run_benchmarks(runs=5, name_filter=None, year=benchmark_year):
+    cases, skipped = get_cases(year)
+    results = {}
+    for case in cases:
+        if name_filter and name_filter not in case.name:
+            continue
+        # End-to-end runs are long enough that a couple of runs will do
+        results[case.name] = case.measure(min(runs, 2) if case.name == 'main' else runs)
+        print(f"{case.name:<60} {1000 * results[case.name]['median_s']:10.3f} ms", file=sys.stderr)
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+        'year': year, 'cases': results, 'skipped': skipped}
+
+
+# Seeds both conferences & ranks the divisions of each (year, games) under
+# tiebreak_profile, & returns its summary. Seasons that need a coin toss are
+# left out.
+def profile_seasons(seasons):
+    tiebreak_cache.clear()
+    tiebreak_profile.start()
+    try:
+        for year, games in seasons:
+            index = SeasonIndex(team_schedules(games, year))
+            try:
+                for conf in ['AFC', 'NFC']:
+                    get_seeds(index, conf, year)
+                rank_divisions(index)
+            except UnresolvedTiebreak:
+                continue
+    finally:
+        tiebreak_profile.stop()
+    return tiebreak_profile.get_summary()
+
+# Profiles the real seasons (those in data/) & num_generated generated ones,
+# separately. Returns {source: summary}.
+def profile_steps(years=range(2002, 2021+1), num_generated=200):
+    real_seasons = [(year, load_year(year)[0]) for year in years if os.path.exists(f'data/{year}.csv')]
+    profiles = {}
+    for source, seasons in [('real', real_seasons),
+            ('generated', generate_seasons(num_seasons=num_generated, chain_rankings=False))]:
+        profiles[source] = profile_seasons(seasons)
+        print(f"\n{source}:")
+        tiebreak_profile.print_summary()
+    return profiles
+
+
+# Returns [(case, metric, baseline value, current value, ratio)] for the
+# cases whose best time or peak allocations grew by more than the threshold
+# (& for times, by more than min_time_change_s).
+def find_regressions(results, baseline, threshold=0.25):
+    regressions = []
+    for name, case_results in results['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        # The best time is the least affected by whatever else is running
+        for metric in ['min_s', 'peak_bytes']:
+            base_value, value = baseline['cases'][name][metric], case_results[metric]
+            if metric == 'min_s' and value - base_value < min_time_change_s:
+                continue
+            if base_value > 0 and value / base_value > 1 + threshold:
+                regressions.append((name, metric, base_value, value, value / base_value))
+    return regressions
+
+def print_comparison(results, baseline):
+    print(f"{'Case':<60} {'Baseline':>10} {'Current':>10} {'Change':>8}")
+    for name, case_results in results['cases'].items():
+        if name not in baseline['cases']:
+            print(f"{name:<60} {'-':>10} {1000 * case_results['min_s']:8.3f}ms {'new':>8}")
+            continue
+        base_time, cur_time = baseline['cases'][name]['min_s'], case_results['min_s']
+        print(f"{name:<60} {1000 * base_time:8.3f}ms {1000 * cur_time:8.3f}ms {100 * (cur_time / base_time - 1):+7.1f}%")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the seeding & tiebreak hot paths.')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--filter', help='only run cases with this in their name')
+    parser.add_argument('--year', type=int, default=benchmark_year, help='real season to benchmark')
+    parser.add_argument('--output', default=default_output_path)
+    parser.add_argument('--baseline', default=default_baseline_path)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before flagging a regression')
+    parser.add_argument('--profile-steps', action='store_true', help='profile the tiebreak steps instead')
+    parser.add_argument('--generated', type=int, default=200, help='generated seasons to profile')
+    parser.add_argument('--profile-output', default=default_profile_path)
+    args = parser.parse_args()
+
+    if args.profile_steps:
+        profiles = profile_steps(num_generated=args.generated)
+        os.makedirs(os.path.dirname(args.profile_output) or '.', exist_ok=True)
+        with open(args.profile_output, 'w') as profile_file:
+            json.dump(profiles, profile_file, indent=2)
+        sys.exit(0)
+
+    results = run_benchmarks(args.runs, args.filter, args.year)
+    for name, reason in results['skipped'].items():
+        print(f"Skipped {name}: {reason}", file=sys.stderr)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print_comparison(results, baseline)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, metric, base_value, value, ratio in regressions:
+            print(f"Regression in {name}: {metric} {base_value:.6g} -> {value:.6g} ({ratio:.2f}x)")
+        sys.exit(1 if regressions else 0)
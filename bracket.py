@@ -0,0 +1,103 @@
+import numpy as np
+
+from nfl_tiebreakers import *
+
+
+# Postseason bracket simulation, for a whole batch of seedings at once. Uses
+# the same Wild Card matchups & divisional round reseeding as verify_seeds.
+#
+#   win_probs = get_win_prob_matrix(win_prob)
+#   advanced = simulate_postseason({'AFC': afc_seed_ids, 'NFC': nfc_seed_ids}, win_probs, rng)
+#   advanced['SuperBowl']  # the champion of each row
+#
+# Seeds are N x num_seeds arrays of team IDs, like get_seeds_batch returns (a
+# single get_seeds result is np.array([get_team_ids(seeds)])). Win
+# probabilities come from the same (home_team, away_team) -> probability the
+# home team wins functions as playoff_odds. The Super Bowl is at a neutral
+# site, so it averages both ways around.
+
+postseason_rounds = ['WildCard', 'Division', 'ConfChamp', 'SuperBowl']
+
+def get_team_ids(teams):
+    return [team_ids[team] for team in teams]
+
+# [home ID, away ID] matrix of the probability that the home team wins
+def get_win_prob_matrix(win_prob):
+    return np.array([[win_prob(home, away) for away in all_teams] for home in all_teams])
+
+# Winners of the games between the home & away teams (arrays of IDs)
+def play_games(home_ids, away_ids, win_probs, rng):
+    home_wins = rng.random(home_ids.shape) < win_probs[home_ids, away_ids]
+    return np.where(home_wins, home_ids, away_ids)
+
+# Plays out one conference's bracket. Returns {round: N x k IDs of the teams
+# that won it} for the rounds up to the conference championship. Teams with a
+# bye count as winning the Wild Card round.
+def simulate_conference(seed_ids, win_probs, rng):
+    num_rows, num_seeds = seed_ids.shape
+    wc_matchups, bye_seeds = get_wild_card_round(num_seeds)
+
+    # Teams are tracked by seed (0 is the #1 seed) for the reseeding
+    home_seeds = np.array([home_seed-1 for home_seed, _ in wc_matchups])
+    away_seeds = np.array([away_seed-1 for _, away_seed in wc_matchups])
+    home_wins = play_games(seed_ids[:, home_seeds], seed_ids[:, away_seeds], win_probs, rng) == seed_ids[:, home_seeds]
+    alive = np.concatenate([np.tile([seed-1 for seed in bye_seeds], (num_rows, 1)),
+        np.where(home_wins, home_seeds, away_seeds)], axis=1)
+    alive.sort(axis=1)
+    advanced = {'WildCard': np.take_along_axis(seed_ids, alive, axis=1)}
+
+    home_idxs = [home_idx for home_idx, _ in division_round_matchups]
+    away_idxs = [away_idx for _, away_idx in division_round_matchups]
+    home_seeds, away_seeds = alive[:, home_idxs], alive[:, away_idxs]
+    home_ids = np.take_along_axis(seed_ids, home_seeds, axis=1)
+    home_wins = play_games(home_ids, np.take_along_axis(seed_ids, away_seeds, axis=1), win_probs, rng) == home_ids
+    alive = np.where(home_wins, home_seeds, away_seeds)
+    alive.sort(axis=1)
+    advanced['Division'] = np.take_along_axis(seed_ids, alive, axis=1)
+
+    # The better seed hosts
+    finalists = advanced['Division']
+    advanced['ConfChamp'] = play_games(finalists[:, 0], finalists[:, 1], win_probs, rng)[:, None]
+    return advanced
+
+# Plays out the whole postseason for each row of seeds ({conf: N x num_seeds}).
+# Returns {round: N x k IDs of the teams that won it}.
+def simulate_postseason(seeds, win_probs, rng):
+    conf_advanced = [simulate_conference(seeds[conf], win_probs, rng) for conf in ['AFC', 'NFC']]
+    advanced = {postseason_round: np.concatenate([conf_round[postseason_round] for conf_round in conf_advanced], axis=1)
+        for postseason_round in postseason_rounds[:-1]}
+
+    afc_champs, nfc_champs = advanced['ConfChamp'][:, 0], advanced['ConfChamp'][:, 1]
+    neutral_probs = (win_probs[afc_champs, nfc_champs] + 1 - win_probs[nfc_champs, afc_champs]) / 2
+    afc_wins = rng.random(len(afc_champs)) < neutral_probs
+    advanced['SuperBowl'] = np.where(afc_wins, afc_champs, nfc_champs)[:, None]
+    return advanced
+
+# Number of times each team won each round, as a 32 x len(postseason_rounds)
+# array indexed by team ID.
+def count_advanced(advanced):
+    return np.stack([np.bincount(advanced[postseason_round].ravel(), minlength=len(all_teams))
+        for postseason_round in postseason_rounds], axis=1)
+
+# Odds of each team winning each round, from num_samples runs of the bracket
+# with the given seeds (lists of teams, from get_seeds).
+def simulate_bracket_odds(afc_seeds, nfc_seeds, win_prob, num_samples, seed=0):
+    rng = np.random.default_rng(seed)
+    seeds = {conf: np.tile(get_team_ids(conf_seeds), (num_samples, 1))
+        for conf, conf_seeds in [('AFC', afc_seeds), ('NFC', nfc_seeds)]}
+    counts = count_advanced(simulate_postseason(seeds, get_win_prob_matrix(win_prob), rng))
+    return {team: (counts[team_ids[team]] / num_samples).tolist() for team in afc_seeds + nfc_seeds}
+
+
+if __name__ == '__main__':
+    import sys
+    from playoff_odds import coin_flip
+    from schedule_analyzer import load_year, team_schedules
+    year, num_samples = int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    games, _ = load_year(year)
+    schedules = SeasonIndex(team_schedules(games, year))
+    afc_seeds, nfc_seeds = get_seeds(schedules, 'AFC', year), get_seeds(schedules, 'NFC', year)
+    odds = simulate_bracket_odds(afc_seeds, nfc_seeds, coin_flip, num_samples)
+    print(f"{'Team':<5} " + ' '.join([f'{postseason_round:<10}' for postseason_round in postseason_rounds]))
+    for team, team_odds in odds.items():
+        print(f"{team:<5} " + ' '.join([f'{100 * p:9.1f}%' for p in team_odds]))
@@ -0,0 +1,174 @@
+import argparse
+import os
+import sys
+
+
+# Command line interface for the seeds, division rankings & counterfactuals.
+# Only the seasons (& conferences) that are asked for are loaded & computed,
+# and each command imports what it needs when it runs, so a one season query
+# doesn't pay for NumPy or the rest of the history:
+#
+#   python cli.py seeds 2019 --conf AFC
+#   python cli.py seeds 2021 --variant norank --trace
+#   python cli.py divisions 2010 --division AFCW
+#   python cli.py counterfactual 2015-2021 --conf NFC
+#   python cli.py sweep 2002-2021 --workers 4    # same as schedule_analyzer.py
+#
+# Years are YEAR or FIRST-LAST, & can be given more than once. The variants are
+# the same as schedule_analyzer's: 'real', 'no17' (without the 17th game) &
+# 'norank' (without any of the games against teams that finished in the same place).
+
+confs = ['AFC', 'NFC']
+variants = ['real', 'no17', 'norank']
+variant_labels = {'real': '', 'no17': 'No 17th ', 'norank': 'No rank '}
+
+# Years from a YEAR or FIRST-LAST argument
+def parse_years(year_arg):
+    first, _, last = year_arg.partition('-')
+    if not first.isdigit() or not (last or first).isdigit() or int(first) > int(last or first):
+        raise argparse.ArgumentTypeError(f"Bad year {year_arg}, should be YEAR or FIRST-LAST")
+    return list(range(int(first), int(last or first) + 1))
+
+def get_years(args):
+    years = sorted(set([year for year_range in args.years for year in year_range]))
+    missing = [year for year in years if not has_season(year)]
+    if missing:
+        sys.exit(f"No data for {', '.join(map(str, missing))}")
+    return years
+
+def has_season(year):
+    return os.path.exists(f'data/{year}.csv')
+
+def get_confs(args):
+    return confs if args.conf is None else [args.conf]
+
+def start_trace(args):
+    if args.trace:
+        import tiebreak_events
+        tiebreak_events.add_sink(tiebreak_events.TextSink())
+
+# Returns the season's (SeasonIndex, SeasonGames with the playoff games)
+def load_season(year):
+    from load_schedules import load_year, team_schedules
+    from season_index import SeasonIndex
+    games, playoff_games = load_year(year)
+    season = team_schedules(games, year, playoff_games)
+    return SeasonIndex(season), season
+
+# Schedules of the variant of the season. The counterfactuals need the
+# previous season's division rankings, so they load that season too.
+def get_variant_schedules(year, variant, schedules):
+    if variant == 'real':
+        return schedules
+    if variant == 'no17' and year < 2021:
+        sys.exit(f"There's no 17th game in {year}")
+    if not has_season(year - 1):
+        sys.exit(f"{variant} needs the {year-1} season")
+
+    from schedule_analyzer import get_schedules_without_17th, get_schedules_without_ranked_opps, rank_year
+    from season_index import SeasonIndex
+    without_games = get_schedules_without_17th if variant == 'no17' else get_schedules_without_ranked_opps
+    return SeasonIndex(without_games(schedules, year, rank_year(year - 1)))
+
+
+def seeds_command(args):
+    from nfl_tiebreakers import get_seeds, verify_seeds
+    start_trace(args)
+    for year in get_years(args):
+        schedules, season = load_season(year)
+        variant_schedules = get_variant_schedules(year, args.variant, schedules)
+        for conf in get_confs(args):
+            seeds = get_seeds(variant_schedules, conf, year)
+            if args.variant == 'real':
+                verify_seeds(season, seeds)
+            print(f"{year} {variant_labels[args.variant]}{conf} Playoff Seeds:", seeds)
+
+def divisions_command(args):
+    from load_schedules import divisions
+    from nfl_tiebreakers import rank_division
+    start_trace(args)
+    selected = [div for div in divisions if (args.division is None or div == args.division)
+        and (args.conf is None or div.startswith(args.conf))]
+    if not selected:
+        sys.exit(f"No division {args.division} in {args.conf or 'either conference'}")
+    for year in get_years(args):
+        schedules, _ = load_season(year)
+        variant_schedules = get_variant_schedules(year, args.variant, schedules)
+        for div in selected:
+            print(f"{year} {variant_labels[args.variant]}{div}:", rank_division(variant_schedules, divisions[div]))
+
+# The real seeds & whichever counterfactual seeds differ, as print_analysis shows them
+def counterfactual_command(args):
+    from schedule_analyzer import analyze_year, rank_year
+    start_trace(args)
+    for year in get_years(args):
+        prev_div_rankings = rank_year(year - 1) if has_season(year - 1) else None
+        analysis = analyze_year(year, prev_div_rankings)
+        for conf in get_confs(args):
+            seeds, *variant_seeds = analysis[conf]
+            print(f"{year} {conf} Playoff Seeds:", seeds)
+            for variant, other_seeds in zip(variants[1:], variant_seeds):
+                if other_seeds is not None and (args.all or other_seeds != seeds):
+                    print(f"{year} {variant_labels[variant]}{conf} Playoff Seeds:", other_seeds)
+
+# Runs of consecutive years, e.g. [[2010, 2011], [2015]]
+def get_year_runs(years):
+    runs = []
+    for year in years:
+        if runs and runs[-1][-1] == year - 1:
+            runs[-1].append(year)
+        else:
+            runs.append([year])
+    return runs
+
+# Each run of years starts from the rankings of the year before it, so only a
+# first year with no previous season loses its counterfactuals.
+def sweep_command(args):
+    from schedule_analyzer import analyze_years, print_analysis, rank_year
+    start_trace(args)
+    # Tracing only makes sense with everything in one process
+    workers = 1 if args.trace else args.workers
+    for years in get_year_runs(get_years(args)):
+        prev_div_rankings = rank_year(years[0] - 1) if has_season(years[0] - 1) else None
+        for year, div_rankings, analysis in analyze_years(years, workers, prev_div_rankings):
+            print_analysis(year, div_rankings, analysis)
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='NFL playoff seeds, division rankings & schedule counterfactuals.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name, func, help, default_years=None):
+        command_parser = subparsers.add_parser(name, help=help)
+        command_parser.set_defaults(func=func)
+        if default_years is None:
+            command_parser.add_argument('years', nargs='+', type=parse_years, metavar='YEAR', help='YEAR or FIRST-LAST')
+        else:
+            command_parser.add_argument('years', nargs='*', type=parse_years, metavar='YEAR', default=[default_years],
+                help='YEAR or FIRST-LAST (default: 2002-2021)')
+        command_parser.add_argument('--trace', action='store_true', help='print every tiebreak step')
+        return command_parser
+
+    seeds_parser = add_command('seeds', seeds_command, 'playoff seeds')
+    seeds_parser.add_argument('--conf', choices=confs)
+    seeds_parser.add_argument('--variant', choices=variants, default='real')
+
+    divisions_parser = add_command('divisions', divisions_command, 'division rankings')
+    divisions_parser.add_argument('--conf', choices=confs)
+    divisions_parser.add_argument('--division', help='e.g. AFCW')
+    divisions_parser.add_argument('--variant', choices=variants, default='real')
+
+    counterfactual_parser = add_command('counterfactual', counterfactual_command,
+        'seeds without the 17th game & without the ranked games')
+    counterfactual_parser.add_argument('--conf', choices=confs)
+    counterfactual_parser.add_argument('--all', action='store_true', help='show the counterfactual seeds even when unchanged')
+
+    sweep_parser = add_command('sweep', sweep_command, 'the full analysis of every season', list(range(2002, 2021+1)))
+    sweep_parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    return parser
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+import itertools
+import sys
+import time
+
+from playoff_odds import coin_flip, get_chunk_rng, sample_season_arrays, split_season
+from scenarios import MIXED, ScenarioSearch
+from season_generator import *
+from seeds_batch import *
+
+
+# Regression checks that the NumPy paths give exactly what the dict path does,
+# over generated seasons (see season_generator). The seasons are low scoring
+# with lots of ties, so the tiebreaks get well past the records & into the
+# common games, strengths of victory/schedule & points:
+#
+#   python equivalence_checks.py              # 50 seasons
+#   python equivalence_checks.py 500 3        # 500 seasons, seed 3
+#
+# get_seeds_batch & rank_divisions_batch are checked row by row against the
+# dict path, over sampled finishes of some of the seasons. Every other row is
+# masked down to the first couple of weeks, which leaves most teams tied all
+# the way through the strength of schedule, so those rows take the scalar
+# fallback.
+#
+# find_scenarios is checked against every way of playing out the last few
+# games of some of the seasons, & a whole season after week 15 has to be
+# searched in seconds.
+#
+# Each check returns a list of the mismatches it found (empty if none), & the
+# script exits non-zero if there are any.
+
+check_score_dist = ScoreDist(tie_prob=0.1, mean_points=14.0, sd_points=5.0)
+
+# Seeds of both conferences & the division rankings, or 'unresolved' if the
+# season can't be ranked without a coin toss. The tiebreak cache is cleared
+# first, since every view of the same season shares its fingerprint.
+def get_rankings(index, year):
+    tiebreak_cache.clear()
+    try:
+        return {conf: get_seeds(index, conf, year) for conf in ['AFC', 'NFC']}, rank_divisions(index)
+    except UnresolvedTiebreak:
+        return 'unresolved'
+
+# The season as SeasonIndex (the dict path), SeasonArrays & a GameTable view
+# should have the same records, fingerprint, seeds & division rankings.
+def check_season_arrays(year, games):
+    schedules = team_schedules(games, year)
+    views = {'SeasonIndex': SeasonIndex(schedules), 'SeasonArrays': SeasonArrays(schedules),
+        'GameTable': GameTable(games).get_index()}
+
+    mismatches = []
+    expected = views.pop('SeasonIndex')
+    expected_rankings = get_rankings(expected, year)
+    for name, index in views.items():
+        for field in ['records', 'points_for', 'points_against']:
+            if dict(getattr(index, field)) != dict(getattr(expected, field)):
+                mismatches.append(f"{year} {name} {field}")
+        if index.get_fingerprint() != expected.get_fingerprint():
+            mismatches.append(f"{year} {name} fingerprint")
+        if get_rankings(index, year) != expected_rankings:
+            mismatches.append(f"{year} {name} seeds/division rankings")
+    return mismatches
+
+# Rows of the sampled outcomes that the batch seeds & division rankings
+# leave to the scalar fallback
+def get_fallback_rows(table, year, batch_args):
+    num_seeds = 7 if year >= 2020 else 6
+    fallback_rows = set()
+    for start, standings, _ in iter_batch_standings(table, batch_args, batch_chunk_size):
+        for conf in ['AFC', 'NFC']:
+            standings.get_seeds(conf, num_seeds)
+        standings.rank_divisions()
+        fallback_rows.update((start + np.flatnonzero(standings.fallback)).tolist())
+    return fallback_rows
+
+# {team: games} like team_schedules, but without every team having a full schedule
+def get_partial_schedules(games):
+    schedules = {team: [] for team in all_teams}
+    for game in games:
+        schedules[game.winner].append(game)
+        schedules[game.loser].append(game)
+    return schedules
+
+# Rows with masks, every other one of them down to the games through mask_week
+def get_check_masks(games, num_outcomes, mask_week):
+    masks = np.ones((num_outcomes, len(games)), dtype=bool)
+    masks[1::2] = np.array([game.week <= mask_week for game in games])
+    return masks
+
+# Samples num_outcomes finishes of the season after the week, & checks every
+# row of get_seeds_batch & rank_divisions_batch against get_seeds &
+# rank_divisions on the row's own games. Rows that would take a coin toss are
+# left out, since the batch raises for those just like the dict path. Returns
+# (mismatches, number of rows that took the scalar fallback).
+def check_batch(year, games, week, num_outcomes, seed=0, mask_week=2):
+    played, remaining = split_season(games, week)
+    table, results = sample_season_arrays(played, remaining, coin_flip, num_outcomes, get_chunk_rng(f'{seed}:{year}'))
+    masks = get_check_masks(table.games, num_outcomes, mask_week)
+
+    rows, expected = [], []
+    for row in range(num_outcomes):
+        row_games = []
+        for game, in_row, winner_id, loser_id, pts_w, pts_l in zip(table.games, masks[row].tolist(),
+                *[array[row].tolist() for array in results]):
+            if in_row:
+                winner, loser = all_teams[winner_id], all_teams[loser_id]
+                row_games.append(make_game(game.week, winner, loser, game.home, pts_w, pts_l, game.day))
+        rankings = get_rankings(SeasonIndex(get_partial_schedules(row_games)), year)
+        if rankings != 'unresolved':
+            rows.append(row)
+            expected.append(rankings)
+
+    batch_args = [masks[rows]] + [array[rows] for array in results]
+    batch_seeds = get_seeds_batch(table, year, *batch_args)
+    batch_rankings = rank_divisions_batch(table, *batch_args)
+    fallback_rows = get_fallback_rows(table, year, batch_args)
+
+    mismatches = []
+    for batch_row, (row, (seeds, div_rankings)) in enumerate(zip(rows, expected)):
+        kind = 'fallback' if batch_row in fallback_rows else 'batch'
+        if any([get_seed_names(batch_seeds[conf][batch_row:batch_row+1])[0] != seeds[conf] for conf in seeds]):
+            mismatches.append(f"{year} week {week} row {row} ({kind}) seeds")
+        if any([[all_teams[team_id] for team_id in batch_rankings[div][batch_row].tolist()] != div_rankings[div]
+                for div in div_rankings]):
+            mismatches.append(f"{year} week {week} row {row} ({kind}) division rankings")
+    return mismatches, len(fallback_rows)
+
+# The season with the last num_remaining games left to play
+def get_scenario_search(year, games, num_remaining):
+    played, remaining = split_season(games, 15)
+    return ScenarioSearch(year, played + remaining[:-num_remaining], remaining[-num_remaining:])
+
+# The team the tiebreak's group would have picked, in a season where it isn't
+# necessarily tied. Only the steps from the tiebreak's on can separate the
+# teams if they are.
+def get_tiebreak_winner(index, tiebreak):
+    _, *group = tiebreak
+    tiebreak_type = 'div' if len({team_division[team] for team in group}) == 1 else 'wc'
+    return get_best_team(index, group, tiebreak_type)
+
+# Every way of playing out the remaining games (in the order itertools.product
+# goes through them), with the seeds of each conference, or None for a
+# conference that takes a coin toss
+def get_playouts(search):
+    all_results = list(itertools.product(*search.remaining_teams))
+    all_seeds = {}
+    for conf in ['AFC', 'NFC']:
+        try:
+            all_seeds[conf] = [search.get_seeds(conf, results)[0] for results in all_results]
+        except UnresolvedTiebreak:
+            all_seeds[conf] = None
+    return all_results, all_seeds
+
+# (clinching, eliminating) scenarios by brute force, from whether each way of
+# playing out the remaining games gets the team the outcome. A set of results
+# for some of the games is decided if both ways of the first game it leaves
+# out are decided the same way.
+def get_brute_force_scenarios(search, all_results, statuses):
+    partial_statuses = dict(zip(all_results, statuses))
+    def get_partial_status(partial):
+        if partial not in partial_statuses:
+            idx = partial.index(None)
+            branch_statuses = {get_partial_status(partial[:idx] + (winner,) + partial[idx+1:])
+                for winner in search.remaining_teams[idx]}
+            partial_statuses[partial] = branch_statuses.pop() if len(branch_statuses) == 1 else MIXED
+        return partial_statuses[partial]
+
+    scenarios = ([], [])
+    for partial in itertools.product(*[(None,) + teams for teams in search.remaining_teams]):
+        status = get_partial_status(partial)
+        if status != MIXED and all([get_partial_status(partial[:idx] + (None,) + partial[idx+1:]) != status
+                for idx, winner in enumerate(partial) if winner is not None]):
+            scenarios[not status].append({idx: winner for idx, winner in enumerate(partial) if winner is not None})
+    return scenarios
+
+# With only a few games left, the scenarios of every team should be exactly the
+# brute force ones. Teams whose conference takes a coin toss are left out.
+def check_minimal_scenarios(year, games, num_remaining=6):
+    search = get_scenario_search(year, games, num_remaining)
+    outcomes = ['division', 'playoffs'] + [('seed', seed) for seed in range(1, search.num_seeds+1)]
+    all_results, all_seeds = get_playouts(search)
+
+    mismatches = []
+    for team in all_teams:
+        if all_seeds[team_conference[team]] is None:
+            continue
+        for outcome in outcomes:
+            statuses = [search.has_outcome(team, outcome, seeds) for seeds in all_seeds[team_conference[team]]]
+            expected = get_brute_force_scenarios(search, all_results, statuses)
+            found = search.find_scenarios(team, outcome)
+            if any([{frozenset(scenario.items()) for scenario in found_scenarios} !=
+                    {frozenset(scenario.items()) for scenario in expected_scenarios}
+                    for found_scenarios, expected_scenarios in zip(found, expected)]):
+                mismatches.append(f"{year} {team} {outcome} minimal scenarios")
+    return mismatches
+
+# With more games left, some scenarios come down to tiebreak results, which
+# aren't game results brute force can list. So instead, every scenario has to
+# hold for some of the ways of playing out the games & decide the outcome for
+# all of them, & every way has to be covered by the scenarios for how it turns
+# out. Scenarios of only game results have to be minimal too. Which ways of
+# playing out the games each result holds for are kept as bitmasks. Returns
+# (mismatches, number of scenarios with tiebreak results).
+def check_scenarios(year, games, num_remaining=12):
+    search = get_scenario_search(year, games, num_remaining)
+    outcomes = ['division', 'playoffs'] + [('seed', seed) for seed in range(1, search.num_seeds+1)]
+    all_results, all_seeds = get_playouts(search)
+    found = {(team, outcome): search.find_scenarios(team, outcome) for team in all_teams for outcome in outcomes
+        if all_seeds[team_conference[team]] is not None}
+
+    result_masks = {}
+    for playout_idx, results in enumerate(all_results):
+        for result in enumerate(results):
+            result_masks[result] = result_masks.get(result, 0) | 1 << playout_idx
+    tiebreaks = {key for scenarios in found.values() for scenario in scenarios[0] + scenarios[1]
+        for key in scenario if isinstance(key, tuple)}
+    if tiebreaks:
+        for playout_idx, results in enumerate(all_results):
+            index = search.get_index(results)
+            for tiebreak in tiebreaks:
+                result = (tiebreak, get_tiebreak_winner(index, tiebreak))
+                result_masks[result] = result_masks.get(result, 0) | 1 << playout_idx
+    all_mask = (1 << len(all_results)) - 1
+    def get_mask(scenario):
+        mask = all_mask
+        for result in scenario.items():
+            mask &= result_masks.get(result, 0)
+        return mask
+
+    mismatches = []
+    num_tiebreak_scenarios = 0
+    for (team, outcome), scenarios in found.items():
+        status_mask = 0
+        for playout_idx, seeds in enumerate(all_seeds[team_conference[team]]):
+            status_mask |= search.has_outcome(team, outcome, seeds) << playout_idx
+        for status, status_scenarios in zip([True, False], scenarios):
+            other_mask = all_mask & ~status_mask if status else status_mask
+            covered = 0
+            for scenario in status_scenarios:
+                has_tiebreaks = any([isinstance(key, tuple) for key in scenario])
+                num_tiebreak_scenarios += has_tiebreaks
+                mask = get_mask(scenario)
+                covered |= mask
+                if not mask or mask & other_mask:
+                    mismatches.append(f"{year} {team} {outcome} {scenario} doesn't decide it")
+                elif not has_tiebreaks and any([not get_mask({other: winner for other, winner in scenario.items()
+                        if other != key}) & other_mask for key in scenario]):
+                    mismatches.append(f"{year} {team} {outcome} {scenario} isn't minimal")
+            if (all_mask & ~other_mask) & ~covered:
+                mismatches.append(f"{year} {team} {outcome} {'clinching' if status else 'eliminating'} not covered")
+    return mismatches, num_tiebreak_scenarios
+
+# Every scenario of every team after week 15 (about 30 remaining games), each
+# search within max_secs
+def check_scenario_times(year, games, max_secs=5.0):
+    search = ScenarioSearch(year, *split_season(games, 15))
+    mismatches = []
+    for team in all_teams:
+        for outcome in ['division', 'playoffs'] + [('seed', seed) for seed in range(1, search.num_seeds+1)]:
+            start = time.perf_counter()
+            search.find_scenarios(team, outcome)
+            secs = time.perf_counter() - start
+            if secs > max_secs:
+                mismatches.append(f"{year} {team} {outcome} scenarios took {secs:.1f}s")
+    return mismatches
+
+def check_seasons(num_seasons=50, seed=0, batch_every=10, batch_week=14, num_outcomes=200):
+    mismatches = []
+    num_fallback_rows = num_tiebreak_scenarios = 0
+    seasons = generate_seasons(2018, num_seasons, score_dist=check_score_dist, seed=seed, chain_rankings=False)
+    for season_idx, (year, games) in enumerate(seasons):
+        mismatches += check_season_arrays(year, games)
+        if season_idx % batch_every == 0:
+            batch_mismatches, batch_fallback_rows = check_batch(year, games, batch_week, num_outcomes, seed)
+            mismatches += batch_mismatches
+            num_fallback_rows += batch_fallback_rows
+            mismatches += check_minimal_scenarios(year, games)
+            scenario_mismatches, season_tiebreak_scenarios = check_scenarios(year, games)
+            mismatches += scenario_mismatches
+            num_tiebreak_scenarios += season_tiebreak_scenarios
+        if season_idx == 0:
+            mismatches += check_scenario_times(year, games)
+    # Otherwise the fallback & tiebreak results aren't being checked at all
+    if not num_fallback_rows:
+        mismatches.append("No batch rows took the scalar fallback")
+    if not num_tiebreak_scenarios:
+        mismatches.append("No scenarios came down to tiebreak results")
+    return mismatches
+
+
+if __name__ == '__main__':
+    num_seasons = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    mismatches = check_seasons(num_seasons, seed)
+    for mismatch in mismatches:
+        print(mismatch)
+    print(f"{num_seasons} seasons, {len(mismatches)} mismatches", file=sys.stderr)
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,104 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import glob
+import os
+
+from load_schedules import *
+
+
+# Streaming ingestion of many seasons. Seasons are yielded as (year, games,
+# playoff_games) as soon as each one is complete, so whatever's done with them
+# (team_schedules, rank_divisions, ...) can start before the rest is read.
+#
+#   for year, games, playoff_games in stream_seasons(range(2002, 2021+1)):
+#       div_rankings = rank_divisions(team_schedules(games, year))
+
+# Years with a CSV in data/
+def get_data_years():
+    years = []
+    for path in glob.glob('data/*.csv'):
+        name = os.path.basename(path)[:-len('.csv')]
+        if name.isdigit():
+            years.append(int(name))
+    return sorted(years)
+
+def load_season(year):
+    games, playoff_games = load_year(year)
+    return year, games, playoff_games
+
+# Reads & parses the years' CSVs (through the season cache) with up to
+# `workers` processes, & only a couple of seasons per worker in flight at a time.
+# Seasons are yielded in year order, unless ordered is False, in which case
+# they're yielded as they finish.
+def stream_seasons(years=None, workers=None, ordered=True):
+    years = list(years) if years is not None else get_data_years()
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for year in years:
+            yield load_season(year)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = []
+        for year in years:
+            pending.append(executor.submit(load_season, year))
+            if len(pending) < 2 * workers:
+                continue
+            yield pending.pop(0 if ordered else get_done_idx(pending)).result()
+        while pending:
+            yield pending.pop(0 if ordered else get_done_idx(pending)).result()
+
+# Index of the first finished future, waiting for one if none are
+def get_done_idx(futures):
+    for idx, future in enumerate(futures):
+        if future.done():
+            return idx
+    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+    return futures.index(next(iter(done)))
+
+# Splits a single CSV of many seasons into (year, games, playoff_games), yielding
+# each season as soon as its last row has been read. Seasons are told apart by a
+# "Season" column if there is one. Otherwise, the file is taken to be the
+# seasons' CSVs one after the other (each with its header row), starting with
+# first_year.
+def stream_combined_file(path, first_year=None):
+    with open(path, 'r') as combined_csv:
+        csv_reader = csv.reader(combined_csv)
+        header_row = next(csv_reader)
+        column_indexes = get_game_column_indexes(header_row, ['Season'])
+        season_column = column_indexes.get('Season')
+        assert season_column is not None or first_year is not None
+
+        year, games, playoff_games = first_year, [], []
+        for game_entry in csv_reader:
+            if game_entry == header_row:
+                if season_column is None:
+                    if games or playoff_games:
+                        yield year, games, playoff_games
+                    year, games, playoff_games = year + 1, [], []
+                continue
+            if not is_game_row(game_entry, column_indexes):
+                continue
+
+            if season_column is not None and int(game_entry[season_column]) != year:
+                if games or playoff_games:
+                    yield year, games, playoff_games
+                year, games, playoff_games = int(game_entry[season_column]), [], []
+            game = parse_game_row(game_entry, column_indexes)
+            if game.is_playoff:
+                playoff_games.append(game)
+            else:
+                games.append(game)
+
+        if games or playoff_games:
+            yield year, games, playoff_games
+
+
+if __name__ == '__main__':
+    import sys
+    from nfl_tiebreakers import rank_divisions
+    from schedule_analyzer import team_schedules
+    seasons = stream_combined_file(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)\
+        if len(sys.argv) > 1 else stream_seasons()
+    for year, games, playoff_games in seasons:
+        print(f"{year}: {len(games)} games, {len(playoff_games)} playoff games")
+        print("\tDivision rankings:", rank_divisions(team_schedules(games, year)))
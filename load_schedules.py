@@ -1,9 +1,8 @@
+import array
 import csv
-
-trace_on = False
-def trace_print(msg):
-    if trace_on:
-        print(msg)
+import hashlib
+import mmap
+import os
 
 # Team names/cities that have changed since 2002 are changed to 2021 designator of the same francise
 team_abbrev = {
@@ -57,20 +56,120 @@ divisions = {
 }
 
 team_division = {}
-for div in divisions:
-    for team in div:
+for div, div_teams in divisions.items():
+    for team in div_teams:
         team_division[team] = div
 
+conf_teams = {'NFC': [], 'AFC': []}
+team_conference = {}
+for div, div_teams in divisions.items():
+    conf = div[:3]
+    conf_teams[conf] += div_teams
+    for team in div_teams:
+        team_conference[team] = conf
+
+# Integer IDs for each team, in the same order as divisions
+all_teams = [team for div_teams in divisions.values() for team in div_teams]
+team_ids = {team: idx for idx, team in enumerate(all_teams)}
+
+# Regular season weeks are numbered as is, playoff rounds as negative numbers.
+playoff_week_codes = {'WildCard': -1, 'Division': -2, 'ConfChamp': -3, 'SuperBowl': -4}
+playoff_weeks = {code: week for week, code in playoff_week_codes.items()}
+day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# A single game. Teams are stored by their team_ids, the week as an int
+# (see playoff_week_codes) and the day as an index into day_names (-1 if unknown).
+# winner_home is False when the loser was the home team. For neutral site
+# games (& ties) the winner is the home team, same as in the CSV.
+#
+# Games can still be read like the dicts they used to be, e.g. game['Winner']
+# or game['Week'] (as the CSV writes it). Scores are ints either way.
+class Game:
+    __slots__ = ['week', 'day', 'winner_id', 'loser_id', 'winner_home', 'pts_w', 'pts_l']
+    dict_keys = ['Week', 'Day', 'Winner', 'Loser', 'Home', 'PtsW', 'PtsL']
+
+    def __init__(self, week, day, winner_id, loser_id, winner_home, pts_w, pts_l):
+        self.week = week
+        self.day = day
+        self.winner_id = winner_id
+        self.loser_id = loser_id
+        self.winner_home = winner_home
+        self.pts_w = pts_w
+        self.pts_l = pts_l
+
+    @property
+    def winner(self):
+        return all_teams[self.winner_id]
+
+    @property
+    def loser(self):
+        return all_teams[self.loser_id]
+
+    @property
+    def home(self):
+        return all_teams[self.winner_id if self.winner_home else self.loser_id]
+
+    @property
+    def away(self):
+        return all_teams[self.loser_id if self.winner_home else self.winner_id]
+
+    @property
+    def is_tie(self):
+        return self.pts_w == self.pts_l
+
+    @property
+    def is_playoff(self):
+        return self.week < 0
+
+    def __getitem__(self, key):
+        if key == 'Week':
+            return playoff_weeks[self.week] if self.week < 0 else str(self.week)
+        elif key == 'Day':
+            return day_names[self.day] if self.day >= 0 else ''
+        elif key == 'Winner':
+            return self.winner
+        elif key == 'Loser':
+            return self.loser
+        elif key == 'Home':
+            return self.home
+        elif key == 'PtsW':
+            return self.pts_w
+        elif key == 'PtsL':
+            return self.pts_l
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in Game.dict_keys
+
+    def keys(self):
+        return list(Game.dict_keys)
+
+    def get(self, key, default=None):
+        return self[key] if key in Game.dict_keys else default
+
+    # Same game with the result reversed (the new winner gets PtsW)
+    def flipped(self):
+        return Game(self.week, self.day, self.loser_id, self.winner_id,
+            not self.winner_home, self.pts_w, self.pts_l)
+
+    def __repr__(self):
+        return f"Game({dict([(key, self[key]) for key in Game.dict_keys])})"
+
+# Builds a game from team abbreviations
+def make_game(week, winner, loser, home, pts_w, pts_l, day=-1):
+    assert home in [winner, loser]
+    return Game(week, day, team_ids[winner], team_ids[loser], home == winner, pts_w, pts_l)
+
 # Returns 1 for a win, 0.5 for a tie, 0 for a lose.
 # Raises if an exception if the team did not play in the game.
 def game_result(game, team):
-    assert team in [game['Winner'], game['Loser']]
-    if game['PtsW'] == game['PtsL']:
+    team_id = team_ids[team]
+    assert team_id in [game.winner_id, game.loser_id]
+    if game.pts_w == game.pts_l:
         return 0.5
-    elif game['Winner'] == team:
+    elif game.winner_id == team_id:
         return 1.0
     else:
-        assert game['Loser'] == team
         return 0.0
 
 # Games is a list of games (can be a subset of full schedule)
@@ -78,50 +177,82 @@ def get_team_record(games, team):
     return sum(map(lambda game: game_result(game, team), games))
 
 def get_game_opponent(game, team):
-    assert team in [game['Winner'], game['Loser']]
-    return game['Winner'] if game['Winner'] != team else game['Loser']
+    team_id = team_ids[team]
+    assert team_id in [game.winner_id, game.loser_id]
+    return all_teams[game.winner_id if game.winner_id != team_id else game.loser_id]
 
+# Indexed schedules (SeasonGames, SeasonIndex, ...) already have each team's opponents
 def get_all_opponents(schedules, team):
+    if hasattr(schedules, 'opponents'):
+        return schedules.opponents[team]
     return set(map(lambda game: get_game_opponent(game, team), schedules[team]))
 
 def get_common_games(schedules, teams):
     # First, need to get common opponents
-    common_opponents = None
-    for team in teams:
-        opponents = get_all_opponents(schedules, team)
-        if common_opponents is None:
-            common_opponents = opponents
-        else:
-            common_opponents = common_opponents.intersection(opponents)
+    common_opponents = set.intersection(*[set(get_all_opponents(schedules, team)) for team in teams])
 
     # Then, we'll go back and get the games
     common_games = {}
     for team in teams:
-        common_games[team] = [game for game in schedules[team] if get_game_opponent(game, team) in common_opponents]
+        if isinstance(schedules, SeasonGames):
+            common_games[team] = [game for opp in common_opponents for game in schedules.games_between[(team, opp)]]
+        else:
+            common_games[team] = [game for game in schedules[team] if get_game_opponent(game, team) in common_opponents]
 
     return common_games
 
+def list_teams(games):
+    teams = set()
+    for game in games:
+        teams.add(game.winner)
+        teams.add(game.loser)
+    return teams
+
+# A season's games, indexed in a single pass for constant time lookups. It's a
+# {team: games} dict of the regular season, same as team_schedules, plus:
+#   opponents[team]            set of the team's opponents
+#   games_by_week[week]        games of the week (playoff weeks are playoff_week_codes)
+#   games_between[(team, opp)] regular season games between the two, in either order
+#   playoff_hosts[(week, home)] the playoff game the team hosted that week
+class SeasonGames(dict):
+    def __init__(self, games, playoff_games=()):
+        super().__init__()
+        self.opponents = {}
+        self.games_by_week = {}
+        self.games_between = {}
+        self.playoff_hosts = {}
+        for game in games:
+            winner, loser = game.winner, game.loser
+            self.setdefault(winner, []).append(game)
+            self.setdefault(loser, []).append(game)
+            self.opponents.setdefault(winner, set()).add(loser)
+            self.opponents.setdefault(loser, set()).add(winner)
+            self.games_by_week.setdefault(game.week, []).append(game)
+            # Both orders share the same list
+            pair_games = self.games_between.setdefault((winner, loser), [])
+            self.games_between.setdefault((loser, winner), pair_games).append(game)
+        for game in playoff_games:
+            self.games_by_week.setdefault(game.week, []).append(game)
+            self.playoff_hosts.setdefault((game.week, game.home), game)
+
+def team_schedules(games, year, playoff_games=()):
+    schedules = SeasonGames(games, playoff_games)
+    for team_games in schedules.values():
+        assert len(team_games) == 16 if year < 2021 else 17
+    return schedules
+
 # Returns a list of teams in the same conference as the given list of teams.
 # Will raise an exception if all teams are not in the same conference.
 def get_conf_teams(teams):
-    # Get the teams of the two conferences.
-    nfc_teams, afc_teams = [], []
-    for div, div_teams in divisions.items():
-        if div.startswith('NFC'):
-            nfc_teams += div_teams
-        else:
-            assert div.startswith('AFC')
-            afc_teams += div_teams
+    nfc_teams, afc_teams = conf_teams['NFC'], conf_teams['AFC']
     assert len(nfc_teams) == len(afc_teams)
-    
+
     # All teams should be in the same conference
     if all([team in nfc_teams for team in teams]):
-        conf_teams = nfc_teams
+        return nfc_teams
     else:
         assert all([team in afc_teams for team in teams])
-        conf_teams = afc_teams
-
-    return conf_teams
+        return afc_teams
 
 
 # Get a mapping from the name of column to its index number
@@ -136,57 +267,145 @@ def get_header_indexes(header_row, wanted_columns):
 
     return column_indexes
 
-# NOTE The "Playoffs" heading row should be removed from the CSV data
+wanted_columns = ["Week", "Day", "Winner/tie", "Loser/tie", "PtsW", "PtsL"]
+
+# Builds a Game from a row of the CSV.
+def parse_game_row(game_entry, column_indexes):
+    game_dict = {}
+    for column, idx in column_indexes.items():
+
+        if column == "Winner/tie":
+            if game_entry[idx+1] in ['', 'N']:
+                assert 'Home' not in game_dict
+                game_dict['Home'] = team_abbrev[game_entry[idx]]
+            else:
+                assert(game_entry[idx+1] == '@')
+
+            game_dict['Winner'] = team_abbrev[game_entry[idx]]
+
+        elif column == "Loser/tie":
+            if game_entry[idx-1] == '@':
+                assert 'Home' not in game_dict
+                game_dict['Home'] = team_abbrev[game_entry[idx]]
+            else:
+                assert(game_entry[idx-1] in ['', 'N'])
+
+            game_dict['Loser'] = team_abbrev[game_entry[idx]]
+
+        elif column in wanted_columns:
+            game_dict[column] = game_entry[idx]
+
+    assert 'Home' in game_dict
+    winner, loser, week = game_dict['Winner'], game_dict['Loser'], game_dict['Week']
+    day = day_names.index(game_dict['Day']) if game_dict.get('Day') in day_names else -1
+    return Game(playoff_week_codes.get(week) or int(week), day, team_ids[winner], team_ids[loser],
+        game_dict['Home'] == winner, int(game_dict['PtsW']), int(game_dict['PtsL']))
+
+def get_game_column_indexes(header_row, extra_columns=()):
+    column_indexes = get_header_indexes(header_row, wanted_columns + list(extra_columns))
+
+    # The CSV denotes the home team by putting an "@" symbol between
+    # the Winner & Loser columns if the away team wins. Otherwise, the
+    # column is left empty. The "Winner/tie" column contains the home team
+    # in case of a tie. "N" is used for neutral site (i.e. the Super Bowl).
+    assert column_indexes["Winner/tie"] + 2 == column_indexes["Loser/tie"]
+    return column_indexes
+
+# False for heading rows (e.g. "Playoffs") & blank lines
+def is_game_row(game_entry, column_indexes):
+    return len(game_entry) > column_indexes["Loser/tie"] and game_entry[column_indexes["Winner/tie"]] != ''
+
+# Yields the games of a season's CSV lines, as they're read
+def iter_csv_games(lines):
+    csv_reader = csv.reader(lines)
+    header_row = next(csv_reader)
+    column_indexes = get_game_column_indexes(header_row)
+    for game_entry in csv_reader:
+        if game_entry != header_row and is_game_row(game_entry, column_indexes):
+            yield parse_game_row(game_entry, column_indexes)
+
 # TODO Verify that games happen within expected timerange
-def load_year(year):
+def parse_year(year):
     games = []
     playoff_games = []
-    wanted_columns = ["Week", "Day", "Winner/tie", "Loser/tie", "PtsW", "PtsL"]
     week_list = [str(week+1) for week in range(18 if year >= 2021 else 17)]
 
     with open(f'data/{year}.csv', 'r') as year_csv:
-        csv_reader = csv.reader(year_csv)
+        for game in iter_csv_games(year_csv):
+            # Only regular season games
+            if game['Week'] in week_list:
+                games.append(game)
+            else:
+                assert(game.is_playoff)
+                playoff_games.append(game)
 
-        header_row = next(csv_reader)
-        column_indexes = get_header_indexes(header_row, wanted_columns)
+    return games, playoff_games
 
-        # The CSV denotes the home team by putting an "@" symbol between
-        # the Winner & Loser columns if the away team wins. Otherwise, the
-        # column is left empty. The "Winner/tie" column contains the home team
-        # in case of a tie. "N" is used for neutral site (i.e. the Super Bowl).
-        assert column_indexes["Winner/tie"] + 2 == column_indexes["Loser/tie"]
-        for game_entry in csv_reader:
-            game_dict = {}
-            for column, idx in column_indexes.items():
 
-                if column == "Winner/tie":
-                    if game_entry[idx+1] in ['', 'N']:
-                        assert 'Home' not in game_dict
-                        game_dict['Home'] = team_abbrev[game_entry[idx]]
-                    else:
-                        assert(game_entry[idx+1] == '@')
+# Parsed seasons are cached in data/cache as flat arrays of 16-bit ints, one
+# row of game_cache_fields per game. Files are named after the year, a hash of
+# the CSV's contents & the parser version. So editing the CSV (or changing how
+# it's parsed, which should bump PARSER_VERSION) is a cache miss.
+PARSER_VERSION = 2
+season_cache_dir = 'data/cache'
+game_cache_fields = Game.__slots__
 
-                    game_dict['Winner'] = team_abbrev[game_entry[idx]]
+# Identifies the contents of the year's CSV
+def get_csv_hash(year):
+    with open(f'data/{year}.csv', 'rb') as year_csv:
+        return hashlib.sha256(year_csv.read()).hexdigest()[:16]
 
-                elif column == "Loser/tie":
-                    if game_entry[idx-1] == '@':
-                        assert 'Home' not in game_dict
-                        game_dict['Home'] = team_abbrev[game_entry[idx]]
-                    else:
-                        assert(game_entry[idx-1] in ['', 'N'])
+def get_season_cache_path(year, csv_hash):
+    return f'{season_cache_dir}/{year}-{csv_hash}-v{PARSER_VERSION}.bin'
 
-                    game_dict['Loser'] = team_abbrev[game_entry[idx]]
+def encode_games(games):
+    values = array.array('h')
+    for game in games:
+        values.extend([game.week, game.day, game.winner_id, game.loser_id,
+            int(game.winner_home), game.pts_w, game.pts_l])
+    return values
 
-                else:
-                    game_dict[column] = game_entry[idx]
+def decode_games(values):
+    games = []
+    num_fields = len(game_cache_fields)
+    for idx in range(0, len(values), num_fields):
+        week, day, winner_id, loser_id, winner_home, pts_w, pts_l = values[idx:idx+num_fields]
+        games.append(Game(week, day, winner_id, loser_id, bool(winner_home), pts_w, pts_l))
+    return games
 
-            assert 'Home' in game_dict
+# Same as parse_year, but goes through the parsed season cache.
+def load_year(year, use_cache=True):
+    if not use_cache:
+        return parse_year(year)
 
-            # Only regular season games
-            if game_dict['Week'] in week_list:
-                games.append(game_dict)
-            else:
-                assert(game_dict['Week'] in ['WildCard', 'Division', 'ConfChamp', 'SuperBowl'])
-                playoff_games.append(game_dict)
+    cache_path = get_season_cache_path(year, get_csv_hash(year))
+
+    if os.path.exists(cache_path) and os.path.getsize(cache_path) > 0:
+        with open(cache_path, 'rb') as cache_file:
+            with mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ) as cache_map:
+                values = memoryview(cache_map).cast('h')
+                all_games = decode_games(values)
+                values.release()
+        games = [game for game in all_games if not game.is_playoff]
+        playoff_games = [game for game in all_games if game.is_playoff]
+        return games, playoff_games
+
+    games, playoff_games = parse_year(year)
+    try:
+        values = encode_games(games + playoff_games)
+    except OverflowError:
+        # Something the cache format doesn't cover (e.g. a score over 16 bits), just don't cache it.
+        return games, playoff_games
 
+    # Clear out this year's stale entries, then write to a temp file & move it in
+    # place, so a reader never sees a partially written file.
+    os.makedirs(season_cache_dir, exist_ok=True)
+    for file_name in os.listdir(season_cache_dir):
+        stale_path = f'{season_cache_dir}/{file_name}'
+        if file_name.startswith(f'{year}-') and file_name.endswith('.bin') and stale_path != cache_path:
+            os.remove(stale_path)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as cache_file:
+        values.tofile(cache_file)
+    os.replace(tmp_path, cache_path)
     return games, playoff_games
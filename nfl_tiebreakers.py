@@ -1,4 +1,11 @@
+from collections import OrderedDict
+from itertools import islice
+import time
+
 from load_schedules import *
+import tiebreak_events
+import tiebreak_profile
+from season_index import *
 
 
 # Returns a list of the team(s) with the best record.
@@ -9,33 +16,35 @@ def get_best_record(records):
     return [team for team, record in records.items() if record == best_record]
 
 def get_head_to_head_records(schedules, teams):
-    h2h_records = {}
-    for team in teams:
-        h2h_games = [game for game in schedules[team] if get_game_opponent(game, team) in teams]
-        h2h_records[team] = get_team_record(h2h_games, team)
-    return h2h_records
+    index = get_season_index(schedules)
+    return {team: index.get_record_vs(team, teams) for team in teams}
 
 # Ok, having a better record really isn't a tiebreak per se.
 # You need to tie first, to break a tie.
 # But treating it as such makes things easiest.
 # Send your complaints to Rodger.
 def best_record_tiebreak(schedules, teams, tiebreaker_type):
-    team_records = {team: get_team_record(schedules[team], team) for team in teams}
-    trace_print(f"[ ] Team records: {team_records}")
+    index = get_season_index(schedules)
+    team_records = {team: index.records[team] for team in teams}
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Team records', values=team_records)
     return get_best_record(team_records)
 
 def head_to_head_tiebreak(schedules, teams, tiebreaker_type):
     teams, og_teams = teams.copy(), teams
+    index = get_season_index(schedules)
 
-    h2h_records = get_head_to_head_records(schedules, teams)
-    trace_print(f"[ ] Head-to-head records: {h2h_records}")
-    if tiebreaker_type == 'wc':
+    h2h_records = get_head_to_head_records(index, teams)
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Head-to-head records', values=h2h_records)
+    if tiebreaker_type in ['wc', 'league']:
         # For the Wild Card, only applied if one team beat every other team, or
         # if one team lost to every other team. For Wild Card opponents, each
         # pair of teams can meet at most once.
         for team in teams:
             if h2h_records[team] == len(teams) - 1:
-                trace_print(f"[ ] {team} beat all teams in {teams}")
+                if tiebreak_events.enabled:
+                    tiebreak_events.add_detail('beat_all', team=team, teams=teams.copy())
                 return [team]
 
         # To state the obvious, only one team can lose against every 
@@ -47,16 +56,18 @@ def head_to_head_tiebreak(schedules, teams, tiebreaker_type):
         for team in teams:
             # The team was winless head-to-head...
             if h2h_records[team] == 0.0: 
-                opponents = get_all_opponents(schedules, team)
+                opponents = index.opponents[team]
                 # ...and the team played all other teams in the season.
                 if all([opp in opponents for opp in teams if opp != team]):
                     teams.remove(team)
-                    trace_print(f"[ ] {team} lost to each of {teams}")
+                    if tiebreak_events.enabled:
+                        tiebreak_events.add_detail('lost_to_all', team=team, teams=teams.copy())
                     return teams
 
         # If no-team either won all or lost all games head-to-head,
         # then this step in not applicable.
-        trace_print(f"[ ] WildCard head-to-head did not chagne {teams}")
+        if tiebreak_events.enabled:
+            tiebreak_events.add_detail('h2h_not_applicable', teams=teams.copy())
         return teams
     else:
         # For the division, best record in head-to-head always applies.
@@ -65,83 +76,68 @@ def head_to_head_tiebreak(schedules, teams, tiebreaker_type):
         return get_best_record(h2h_records)
 
 def div_tiebreak(schedules, teams, tiebreaker_type):
+    index = get_season_index(schedules)
     div_records = {}
     for team in teams:
-        for div_teams in divisions.values():
-            if team in div_teams:
-               curr_div_records = get_head_to_head_records(schedules, div_teams)
-               div_records[team] = curr_div_records[team]
-               break 
-        else:
+        if team not in team_division:
             raise Exception(f"Couldn't find division for {team}")
+        div_records[team] = index.div_records[team]
 
     # All teams have the same number of division games
-    trace_print(f"[ ] Div records: {div_records}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Div records', values=div_records)
     return get_best_record(div_records)
 
 def conf_tiebreak(schedules, teams, tiebreaker_type):
+    index = get_season_index(schedules)
     conf_teams = get_conf_teams(teams)
 
-    # Over-doing it a bit by getting the conference record of
-    # everytime, not just the teams that we're applying the 
-    # tiebreaker for. It's just easier to write this way.
-    conf_records = get_head_to_head_records(schedules, conf_teams)
-    # Now, widdle it down to just the ones that we care about.
-    tied_conf_records = {team: record for team, record in conf_records.items() if team in teams}
+    # Listed in conference order rather than in the order of teams, same as
+    # when this step used to build the whole conference's table.
     # As with the division, all teams played the same number of conference games.
-    trace_print(f"[ ] Conf records: {tied_conf_records}")
+    tied_conf_records = {team: index.conf_records[team] for team in conf_teams if team in teams}
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Conf records', values=tied_conf_records)
     return get_best_record(tied_conf_records)
 
 # TODO Might be possible to have a different number of common games. This would break in that case.
 def common_games_tiebreak(schedules, teams, tiebreak_type):
-    common_games = get_common_games(schedules, teams)
+    index = get_season_index(schedules)
+    common_opponents = index.get_common_opponents(teams)
     
     # Skip this tiebreak if less than minimum 4 common games (WC-only)
-    if tiebreak_type == 'wc' and all([len(games) < 4 for games in common_games.values()]):
-        trace_print(f"[!] Common games tiebreak skipped in WC for {teams}")
+    if tiebreak_type in ['wc', 'league'] and all([index.get_games_vs(team, common_opponents) < 4 for team in teams]):
+        if tiebreak_events.enabled:
+            tiebreak_events.add_detail('skipped', teams=teams.copy())
         return teams
 
-    common_records = {team: get_team_record(common_games[team], team) for team in teams}
+    common_records = {team: index.get_record_vs(team, common_opponents) for team in teams}
 
-    trace_print(f"[ ] Common records: {common_records}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Common records', values=common_records)
     return get_best_record(common_records)
 
 def strength_of_victory_tiebreak(schedules, teams, tiebreak_type):
-    teams_sov = {}
-    for team in teams:
-        teams_sov[team] = 0.0
-        for game in schedules[team]:
-            if game_result(game, team) == 1.0:
-                beaten_opponent = get_game_opponent(game, team)
-                teams_sov[team] += get_team_record(schedules[beaten_opponent], beaten_opponent)
+    index = get_season_index(schedules)
+    teams_sov = {team: index.sov[team] for team in teams}
 
-    trace_print(f"[ ] SoV: {teams_sov}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='SoV', values=teams_sov)
     return get_best_record(teams_sov)
 
 def strength_of_schedule_tiebreak(schedules, teams, tiebreak_type):
-    teams_sos = {}
-    for team in teams:
-        teams_sos[team] = 0.0
-        for game in schedules[team]:
-            opponent = get_game_opponent(game, team)
-            teams_sos[team] += get_team_record(schedules[opponent], opponent)
+    index = get_season_index(schedules)
+    teams_sos = {team: index.sos[team] for team in teams}
 
-    trace_print(f"[ ] SoS: {teams_sov}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='SoS', values=teams_sos)
     return get_best_record(teams_sos)
 
-# pointsFunc should be a function that takes (game, team),
-# and return a point value for that game. This is intended to
-# be either the points scored for or the points scored against,
-# but in reality this could be anything numeric. This setup
-# removes duplication of logic otherwise necessary to rank both.
-def rank_teams(schedules, teams, pointsFunc):
-    pointsDict = {}
-
-    for team in teams:
-        pointsDict[team] = 0
-        for game in schedules[team]:
-            pointsDict[team] += gamePointsFunc(game, team)
-
+# pointsDict should be {team: points}. This is intended to be either the
+# points scored for or the points scored against, but in reality this could
+# be anything numeric. This setup removes duplication of logic otherwise
+# necessary to rank both.
+def rank_teams(pointsDict):
     # Create a list of (team, points) tuples, 
     # sorted from highest to lowest by points
     ranking = list(pointsDict.items())
@@ -161,23 +157,23 @@ def rank_teams(schedules, teams, pointsFunc):
             tied_score_idx = idx
         prev_score = score
 
-    trace_print(f"[ ] Ranking ({str(pointsDict)}): {ranking}\n\t{rankingDict}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('ranking', points=pointsDict, ranking=ranking, ranks=rankingDict)
     return rankingDict
 
 def rank_teams_points_for(schedules, teams):
-    def get_points_for(game, team):
-        return game['PtsW'] if game_result(game, team) == 1.0 else game['PtsL']
-    return rank_teams(schedules, teams, get_points_for)
+    index = get_season_index(schedules)
+    return rank_teams({team: index.points_for[team] for team in teams})
 
 def rank_teams_points_against(schedules, teams):
-    def get_points_against(game, team):
-        return game['PtsL'] if game_result(game, team) == 1.0 else game['PtsW']
-    return rank_teams(schedules, teams, get_points_against)
+    index = get_season_index(schedules)
+    return rank_teams({team: index.points_against[team] for team in teams})
 
 def conf_combined_ranking_tiebreak(schedules, teams, tiebreak_type):
+    index = get_season_index(schedules)
     conf_teams = get_conf_teams(teams)
-    points_for_ranks = rank_teams_points_for(schedules, conf_teams)
-    points_against_ranks = rank_teams_points_against(schedules, conf_teams)
+    points_for_ranks = rank_teams_points_for(index, conf_teams)
+    points_against_ranks = rank_teams_points_against(index, conf_teams)
 
     combined_ranks = {}
     for team in teams:
@@ -185,15 +181,17 @@ def conf_combined_ranking_tiebreak(schedules, teams, tiebreak_type):
         combined_ranks[team] = len(points_for_ranks) - points_for_ranks[team]
         combined_ranks[team] += len(points_against_ranks) - points_against_ranks[team]
 
-    trace_print(f"[ ] Conf combined rank: {combined_ranks}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Conf combined rank', values=combined_ranks)
     return get_best_record(combined_ranks)
 
 def combined_ranking_tiebreak(schedules, teams, tiebreak_type):
+    index = get_season_index(schedules)
     all_teams = []
     for div_teams in divisions.values():
         all_teams += div_teams
-    points_for_ranks = rank_teams_points_for(schedules, all_teams)
-    points_against_ranks = rank_teams_points_against(schedules, all_teams)
+    points_for_ranks = rank_teams_points_for(index, all_teams)
+    points_against_ranks = rank_teams_points_against(index, all_teams)
 
     combined_ranks = {}
     for team in teams:
@@ -201,47 +199,44 @@ def combined_ranking_tiebreak(schedules, teams, tiebreak_type):
         combined_ranks[team] = len(points_for_ranks) - points_for_ranks[team]
         combined_ranks[team] += len(points_against_ranks) - points_against_ranks[team]
 
-    trace_print(f"[ ] Combined rank: {combined_ranks}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Combined rank', values=combined_ranks)
     return get_best_record(combined_ranks)
 
 # TODO It's common games, not conference games :(
 # "Net points" == points scored - points allowed
 def conf_net_points_tiebreak(schedules, teams, tiebreak_type):
+    index = get_season_index(schedules)
     conf_teams = get_conf_teams(teams)
-    team_points = {}
-    for team in teams:
-        team_points[team] = 0
-        for game in schedules[team]:
-            if get_game_opponent(game, team) in conf_teams:
-                if team == game['Winner']:
-                    team_points[team] += game['PtsW'] - game['PtsL']
-                # Lose or tie
-                else:
-                    team_points[team] += game['PtsL'] - game['PtsW']
-
-    trace_print(f"[ ] Conf net points: {team_points}")
+    team_points = {team: index.get_net_points_vs(team, conf_teams) for team in teams}
+
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Conf net points', values=team_points)
     return get_best_record(team_points)
 
 def net_points_tiebreak(schedules, teams, tiebreak_type):
-    team_points = {}
-    for team in teams:
-        team_points[team] = 0
-        for game in schedules[team]:
-            if team == game['Winner']:
-                team_points[team] += game['PtsW'] - game['PtsL']
-            # Lose or tie
-            else:
-                team_points[team] += game['PtsL'] - game['PtsW']
+    index = get_season_index(schedules)
+    team_points = {team: index.get_net_points(team) for team in teams}
 
-    trace_print(f"[ ] Net points: {team_points}")
+    if tiebreak_events.enabled:
+        tiebreak_events.add_detail('values', label='Net points', values=team_points)
     return get_best_record(team_points)
 
+# Raised when the teams are still tied after every step the data can settle.
+# Seasons that get this far can't be ranked deterministically.
+class UnresolvedTiebreak(Exception):
+    pass
+
 def net_touchdowns_tiebreak(schedules, teams, tiebreak_type):
-    raise NotImplemented("Data set doesn't include touchdowns. Hopefully this isn't needed.")
+    raise UnresolvedTiebreak(f"Data set doesn't include touchdowns. Hopefully this isn't needed. ({teams})")
 
 def coin_toss_tiebreak(schedules, teams, tiebreak_type):
-    raise NotImplemented("Coin-toss!?! Sigh, I was hoping that I could keep this deterministic/not have special handling of a corner case.")
+    raise UnresolvedTiebreak(f"Coin-toss!?! Sigh, I was hoping that I could keep this deterministic/not have special handling of a corner case. ({teams})")
+
 
+# Bump whenever a change to the tiebreak steps (or to the order they're applied
+# in) could change their results. Stored results from other versions are stale.
+tiebreak_rules_version = 1
 
 div_tiebreak_funcs = [best_record_tiebreak, head_to_head_tiebreak,\
     div_tiebreak, common_games_tiebreak, conf_tiebreak,\
@@ -256,12 +251,86 @@ wc_tiebreak_funcs = [best_record_tiebreak, head_to_head_tiebreak,\
     combined_ranking_tiebreak, conf_net_points_tiebreak, net_points_tiebreak,\
     net_touchdowns_tiebreak, coin_toss_tiebreak]
 
+# For ties between teams from different conferences (see rank_league), the
+# steps that still mean something across conferences.
+league_tiebreak_funcs = [best_record_tiebreak, head_to_head_tiebreak,\
+    common_games_tiebreak, strength_of_victory_tiebreak,\
+    strength_of_schedule_tiebreak, combined_ranking_tiebreak,\
+    net_points_tiebreak, net_touchdowns_tiebreak, coin_toss_tiebreak]
+
+# Steps that only compare a value of each team (its record, SoV, ...), which
+# doesn't depend on what other teams are tied. If one of these doesn't separate
+# a group of teams, it can't separate any smaller group of them either.
+group_independent_steps = [best_record_tiebreak, div_tiebreak, conf_tiebreak,\
+    strength_of_victory_tiebreak, strength_of_schedule_tiebreak,\
+    conf_combined_ranking_tiebreak, combined_ranking_tiebreak,\
+    conf_net_points_tiebreak, net_points_tiebreak]
+
+# Bounded LRU cache of get_best_team results, keyed on (set of teams,
+# tiebreaker type, fingerprint of the season's games). The result doesn't depend
+# on the order the teams are given in, only on which teams they are.
+class TiebreakCache:
+    def __init__(self, max_size=65536):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, team):
+        self.entries[key] = team
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get_stats(self):
+        return {'size': len(self.entries), 'hits': self.hits,
+            'misses': self.misses, 'evictions': self.evictions}
+
+tiebreak_cache = TiebreakCache()
+
+# Cached front end to resolve_best_team. The cache is skipped while tracing,
+# so that the trace still shows every tiebreak step.
+#
+# settled is {step: [sets of teams]} of the groups each group independent step
+# has already failed to separate. Any of those steps can be skipped for a
+# subset of one of its groups. Shared across the calls of rank_group.
+def get_best_team(schedules, teams, tiebreaker_type, settled=None):
+    schedules = get_season_index(schedules)
+    if tiebreak_profile.enabled:
+        tiebreak_profile.count('get_best_team')
+        resolve = lambda *args: tiebreak_profile.call_at_depth(resolve_best_team, *args)
+    else:
+        resolve = resolve_best_team
+    if tiebreak_events.enabled:
+        return resolve(schedules, teams, tiebreaker_type)
+
+    key = (frozenset(teams), tiebreaker_type, schedules.get_fingerprint())
+    team = tiebreak_cache.get(key)
+    if team is None:
+        team = resolve(schedules, teams, tiebreaker_type, settled)
+        tiebreak_cache.put(key, team)
+    elif tiebreak_profile.enabled:
+        tiebreak_profile.count('cache_hits')
+    return team
+
 # TODO For WC b/w two teams in the same div, apply div procedure
 # See https://www.nfl.com/standings/tie-breaking-procedures
-def get_best_team(schedules, teams, tiebreaker_type):
+def resolve_best_team(schedules, teams, tiebreaker_type, settled=None):
     teams, og_teams = teams.copy(), teams
+    schedules = get_season_index(schedules)
 
-    assert tiebreaker_type in ['div', 'wc']
+    assert tiebreaker_type in ['div', 'wc', 'league']
 
     # Only one team from each division can advance to the WC tiebreak steps.
     # 
@@ -278,7 +347,7 @@ def get_best_team(schedules, teams, tiebreaker_type):
             if len(div_ties) < 2:
                 continue
 
-            best_of_div = get_best_team(schedules, div_ties, 'div')
+            best_of_div = get_best_team(schedules, div_ties, 'div', settled)
             div_ties.remove(best_of_div)
             for div_eliminated in div_ties:
                 teams.remove(div_eliminated)
@@ -286,40 +355,123 @@ def get_best_team(schedules, teams, tiebreaker_type):
     # The 4 team cap has two different origins, baked into one:
     # For WC, only 4 divisions per conference & only one team per conference should remain.
     # For Division, only 4 teams per division.
+    # For league, it's the best remaining team of each conference.
     assert len(teams) <= 4
     assert len(teams) > 0
     if len(teams) == 1:
         team = teams.pop()
-        trace_print(f"[+] Only team ({team}) is best team, out of original {og_teams}")
+        if tiebreak_events.enabled:
+            tiebreak_events.emit({'event': 'only_team', 'team': team, 'og_teams': og_teams.copy()})
         return team
         
     # Chose which tiebreak steps to follow
     if tiebreaker_type == 'div':
         tiebreak_funcs = div_tiebreak_funcs 
-    else:
-        assert tiebreaker_type == 'wc'
+    elif tiebreaker_type == 'wc':
         tiebreak_funcs = wc_tiebreak_funcs
+    else:
+        tiebreak_funcs = league_tiebreak_funcs
 
+    team_set = frozenset(teams)
     for tiebreak_func in tiebreak_funcs:
+        if settled is not None and tiebreak_func in group_independent_steps\
+                and any([team_set <= settled_teams for settled_teams in settled.get(tiebreak_func, [])]):
+            if tiebreak_profile.enabled:
+                tiebreak_profile.record_skip(tiebreak_func, tiebreaker_type)
+            continue
+        if tiebreak_events.enabled:
+            tiebreak_events.take_details()
+        if tiebreak_profile.enabled:
+            step_start = time.perf_counter()
         remaining_teams = tiebreak_func(schedules, teams, tiebreaker_type)
+        if tiebreak_profile.enabled:
+            tiebreak_profile.record_step(tiebreak_func, tiebreaker_type, teams, remaining_teams,
+                time.perf_counter() - step_start)
         assert all([remaining_team in teams for remaining_team in remaining_teams])
 
+        if tiebreak_events.enabled:
+            if len(remaining_teams) == 1:
+                result = 'selected'
+            elif remaining_teams != teams:
+                result = 'eliminated'
+            else:
+                result = 'unchanged'
+            tiebreak_events.emit({'event': 'step', 'step': tiebreak_func.__name__,
+                'type': tiebreaker_type, 'teams': teams.copy(), 'og_teams': og_teams.copy(),
+                'details': tiebreak_events.take_details(), 'survivors': remaining_teams.copy(),
+                'result': result})
+
         # If the tie-break has been resolved
         if len(remaining_teams) == 1:
-            trace_print(f"[+] {remaining_teams[0]} selected out of {og_teams} using {str(tiebreak_func.__name__)}")
             return remaining_teams[0]
         # If a team was eliminated, restart tiebreak from the beginning
         elif remaining_teams != teams:
-            trace_print(f"[-] {remaining_teams} remain out of {og_teams} using {str(tiebreak_func.__name__)}")
-            return get_best_team(schedules, remaining_teams, tiebreaker_type)
+            return get_best_team(schedules, remaining_teams, tiebreaker_type, settled)
         # If no changes in the teams, continue to the next tiebreaker
-        else:
-            pass
+        elif settled is not None and tiebreak_func in group_independent_steps:
+            settled.setdefault(tiebreak_func, []).append(team_set)
     else:
         raise Exception("All tiebreaks applied without resolution")
 
+# Yields the teams from best to worst, one at a time, so that the caller can
+# stop once it has the places it needs. Each place is the best of the teams
+# left (with the usual restarts), but group independent steps that couldn't
+# separate the teams for an earlier place aren't applied again.
+def iter_group_ranking(schedules, teams, tiebreaker_type):
+    schedules = get_season_index(schedules)
+    teams = list(teams)
+    settled = None if tiebreak_events.enabled else {}
+    while teams:
+        team = get_best_team(schedules, teams, tiebreaker_type, settled)
+        yield team
+        teams.remove(team)
+
+# Returns the teams ordered from best to worst, or only the first num_places.
+# Same as calling get_best_team for each place & removing the winner.
+def rank_group(schedules, teams, tiebreaker_type, num_places=None):
+    return list(islice(iter_group_ranking(schedules, teams, tiebreaker_type), num_places))
+
+# Returns all 32 teams ordered from best to worst. Each conference is ordered
+# with the Wild Card procedure, & the two orders are merged, with ties between
+# the conferences broken by league_tiebreak_funcs.
+def rank_league(schedules):
+    schedules = get_season_index(schedules)
+    conf_rankings = [rank_group(schedules, conf_team_list, 'wc') for conf_team_list in conf_teams.values()]
+    league_ranking = []
+    while any(conf_rankings):
+        heads = [conf_ranking[0] for conf_ranking in conf_rankings if conf_ranking]
+        best_team = get_best_team(schedules, heads, 'league')
+        league_ranking.append(best_team)
+        for conf_ranking in conf_rankings:
+            if conf_ranking and conf_ranking[0] == best_team:
+                conf_ranking.pop(0)
+    return league_ranking
+
+# Returns all 32 teams in draft order (first pick first). Teams that missed the
+# playoffs pick first, from worst record to best, then the playoff teams in the
+# order they were knocked out. Ties pick in order of strength of schedule
+# (lowest first), then the reverse of rank_league.
+#
+# Without playoff_games, every team is ordered by its regular season alone.
+def get_draft_order(schedules, playoff_games=None):
+    schedules = get_season_index(schedules)
+    league_idxs = {team: idx for idx, team in enumerate(rank_league(schedules))}
+
+    # Teams that went out in a later round pick later
+    playoff_rounds = {}
+    for game in playoff_games or []:
+        playoff_rounds[game.loser] = max(playoff_rounds.get(game.loser, 0), -game.week)
+        if game.week == playoff_week_codes['SuperBowl']:
+            playoff_rounds[game.winner] = -game.week + 1
+
+    return sorted(league_idxs, key=lambda team: (playoff_rounds.get(team, 0),
+        schedules.records[team], schedules.sos[team], -league_idxs[team]))
+
 # Returns an ordered list of playoff seeding for the selected conference
 def get_seeds(schedules, conf, year):
+    schedules = get_season_index(schedules)
+    if tiebreak_profile.enabled:
+        tiebreak_profile.start_seeds()
     seeds = []
     div_champs = []
     remaining_teams = []
@@ -329,61 +481,70 @@ def get_seeds(schedules, conf, year):
         if not div.startswith(conf):
             continue
         div_champs.append(get_best_team(schedules, teams, 'div'))
-        trace_print(f"[*] {div_champs[-1]} won the {div}")
+        if tiebreak_events.enabled:
+            tiebreak_events.emit({'event': 'division_champ', 'team': div_champs[-1], 'division': div})
         remaining_teams += [team for team in teams if team != div_champs[-1]]
     assert len(div_champs) == 4
     assert len(remaining_teams) == 12
 
     # Seed div champs
-    remaining_div_champs = div_champs.copy()
-    for seed_idx in range(len(remaining_div_champs)):
-        # The NFL Tiebreaking Procedures specify that the Wild Card
-        # tiebreaking procedures should be applied to determine home
-        # field advantage between division winnners.
-        #
-        # They also specify that only one team advances on any given
-        # tie-breaking step. Remaining teams revert to the first step.
-        seeds.append(get_best_team(schedules, remaining_div_champs, 'wc'))
-        trace_print(f"[*] Selected {seeds[-1]} as #{seed_idx+1} seed")
-        remaining_div_champs.remove(seeds[-1])
-    assert len(remaining_div_champs) == 0
+    #
+    # The NFL Tiebreaking Procedures specify that the Wild Card
+    # tiebreaking procedures should be applied to determine home
+    # field advantage between division winnners.
+    #
+    # They also specify that only one team advances on any given
+    # tie-breaking step. Remaining teams revert to the first step.
+    for seed_idx, team in enumerate(iter_group_ranking(schedules, div_champs, 'wc')):
+        seeds.append(team)
+        if tiebreak_events.enabled:
+            tiebreak_events.emit({'event': 'seed', 'team': seeds[-1], 'seed': seed_idx+1})
     assert len(seeds) == 4
 
     # Get Wild Cards
     num_wcs = 2 if year < 2020 else 3
-    for wc_num in range(num_wcs):
-        seeds.append(get_best_team(schedules, remaining_teams, 'wc'))
-        trace_print(f"[*] Selected {seeds[-1]} as #{wc_num+1} WC / #{len(seeds)} seed")
+    wc_ranking = iter_group_ranking(schedules, remaining_teams, 'wc')
+    for wc_num, team in enumerate(islice(wc_ranking, num_wcs)):
+        seeds.append(team)
+        if tiebreak_events.enabled:
+            tiebreak_events.emit({'event': 'wild_card', 'team': seeds[-1], 'wild_card': wc_num+1, 'seed': len(seeds)})
         remaining_teams.remove(seeds[-1])
     assert len(seeds) + len(remaining_teams) == 16
 
+    if tiebreak_profile.enabled:
+        tiebreak_profile.end_seeds()
     return seeds
 
+# Returns the Wild Card round's (home seed, away seed) matchups & the seeds
+# with a bye, for a conference with the given number of seeds.
+def get_wild_card_round(num_seeds):
+    if num_seeds == 7:
+        return [(3, 6), (4, 5), (2, 7)], [1]
+    assert num_seeds == 6
+    return [(3, 6), (4, 5)], [1, 2]
+
+# Divisional round matchups, as (home, away) indexes into the 4 teams left
+# sorted by seed: the best seed left hosts the worst.
+division_round_matchups = [(0, 3), (1, 2)]
+
 # I could bring in another dataset here to get the actual seeding results,
 # but we can also just look at the games played (including who hosted the game).
+# The playoff games are either a list or a SeasonGames with them.
 def verify_seeds(playoff_games, predicted_seeds):
+    playoff_hosts = playoff_games.playoff_hosts if isinstance(playoff_games, SeasonGames) else\
+        SeasonGames((), playoff_games).playoff_hosts
+    wc_matchups, bye_seeds = get_wild_card_round(len(predicted_seeds))
     # Treat a bye as a WC win
-    wc_winners = []
-    wc_matchups = [(3, 6), (4, 5)]
-    if len(predicted_seeds) == 7:
-        wc_matchups.append((2, 7))
-        wc_winners.append(predicted_seeds[0])
-    else:
-        assert len(predicted_seeds) == 6
-        wc_winners += predicted_seeds[0:2]
-    
-    def verify_playoff_winner(home_team, away_team, playoff_round):
-        for game in playoff_games:
-            if game['Week'] != playoff_round:
-                continue
+    wc_winners = [predicted_seeds[seed-1] for seed in bye_seeds]
 
-            if game['Home'] == home_team:
-                assert home_team in [game['Winner'], game['Loser']]
-                assert away_team in [game['Winner'], game['Loser']]
-
-                return game['Winner']
+    def verify_playoff_winner(home_team, away_team, playoff_round):
+        game = playoff_hosts.get((playoff_week_codes[playoff_round], home_team))
+        if game is None:
+            raise Exception(f"{home_team} did not host {away_team} in the {playoff_round} round")
 
-        raise Exception(f"{home_team} did not host {away_team} in the {playoff_round} round")
+        assert home_team in [game.winner, game.loser]
+        assert away_team in [game.winner, game.loser]
+        return game.winner
 
     for home_seed, away_seed in wc_matchups:
         home_team = predicted_seeds[home_seed-1]
@@ -395,17 +556,24 @@ def verify_seeds(playoff_games, predicted_seeds):
     wc_winners.sort(key=lambda team: predicted_seeds.index(team))
     # Check the division games, but discard the winners as there's 
     # no need to check the Conference Champion game.
-    verify_playoff_winner(wc_winners[0], wc_winners[3], 'Division')
-    verify_playoff_winner(wc_winners[1], wc_winners[2], 'Division')
+    for home_idx, away_idx in division_round_matchups:
+        verify_playoff_winner(wc_winners[home_idx], wc_winners[away_idx], 'Division')
+
+# Returns the division's teams ordered from best to worst record.
+def rank_division(schedules, div_teams):
+    div_ranking = []
+    for team in iter_group_ranking(schedules, div_teams, 'div'):
+        div_ranking.append(team)
+        if tiebreak_events.enabled:
+            tiebreak_events.emit({'event': 'division_rank', 'team': div_ranking[-1],
+                'division': team_division[div_ranking[-1]], 'rank': len(div_ranking)})
+    return div_ranking
 
 # Returns a dictionary, indexed by division, where each entry contains list of
 # teams in that division ordered from best to worst record.
 def rank_divisions(schedules):
+    schedules = get_season_index(schedules)
     div_rankings = {}
     for division, div_teams in divisions.items():
-        teams = div_teams.copy()
-        div_rankings[division] = []
-        for _ in range(len(div_teams)):
-            div_rankings[division].append(get_best_team(schedules, teams, 'div'))
-            teams.remove(div_rankings[division][-1])
+        div_rankings[division] = rank_division(schedules, div_teams)
     return div_rankings
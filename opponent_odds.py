@@ -0,0 +1,104 @@
+import numpy as np
+
+import playoff_odds
+from playoff_odds import *
+from seeds_batch import rank_divisions_batch
+
+
+# Odds of each team's place-based opponents next season, from the final
+# division rankings of simulated seasons. Takes a season as played through some
+# week (like playoff_odds), samples the rest of it, ranks the divisions of every
+# sample with rank_divisions_batch, & counts the matchups they give next season:
+#
+#   odds = simulate_opponent_odds(2022, 10, 100000)
+#   odds.opponent_odds('KC', '17th')  # [(opp, probability)], likeliest first
+#
+# '17th' is the 17th game (get_interconference_ranked_opponents, from 2021 on)
+# & 'ranked' the two intraconference games against the teams that finished in
+# the same place (get_intraconference_ranked_opponents). Only the counts are
+# kept, so memory doesn't depend on the number of samples.
+
+# Matchups between division places, as [((div, rank_idx), (opp_div, opp_rank_idx))]
+# for each kind of place-based game in the year. These are the regular
+# matchup functions applied to rankings of places instead of teams.
+def get_place_matchups(year):
+    places = {div: [(div, rank_idx) for rank_idx in range(len(div_teams))] for div, div_teams in divisions.items()}
+    matchups = {'ranked': [(place, opp_place)
+        for place, opp_places in get_intraconference_ranked_opponents(year, places).items() for opp_place in opp_places]}
+    if year >= 2021:
+        matchups['17th'] = list(get_interconference_ranked_opponents(year, places).items())
+    return matchups
+
+# Tallies of each team's place-based opponents over all samples so far
+class OpponentOdds:
+    def __init__(self, year):
+        self.year = year
+        self.samples = 0
+        self.place_matchups = get_place_matchups(year)
+        # [team ID, opp ID] number of samples the two are matched up
+        self.opp_counts = {kind: np.zeros((len(all_teams), len(all_teams)), dtype=np.int64)
+            for kind in self.place_matchups}
+
+    # Division rankings from rank_divisions_batch, a row per sample
+    def add_div_rankings(self, div_rankings):
+        num_teams = len(all_teams)
+        for kind, place_matchups in self.place_matchups.items():
+            team_ids = np.concatenate([div_rankings[div][:, rank_idx] for (div, rank_idx), _ in place_matchups])
+            opp_ids = np.concatenate([div_rankings[div][:, rank_idx] for _, (div, rank_idx) in place_matchups])
+            counts = np.bincount(team_ids * num_teams + opp_ids, minlength=num_teams**2)
+            self.opp_counts[kind] += counts.reshape(num_teams, num_teams)
+        self.samples += len(next(iter(div_rankings.values())))
+
+    # A single rank_divisions result
+    def add_div_ranking(self, div_ranking):
+        self.add_div_rankings({div: get_team_id_array(div_teams)[None] for div, div_teams in div_ranking.items()})
+
+    def merge(self, other):
+        assert self.year == other.year
+        self.samples += other.samples
+        for kind in self.opp_counts:
+            self.opp_counts[kind] += other.opp_counts[kind]
+
+    # [(opp, probability)] of the team's opponents of the kind, likeliest
+    # first. For 'ranked', each sample counts both opponents.
+    def opponent_odds(self, team, kind):
+        counts = self.opp_counts[kind][team_ids[team]]
+        opp_ids = sorted(np.flatnonzero(counts).tolist(), key=lambda opp_id: (-counts[opp_id], all_teams[opp_id]))
+        return [(all_teams[opp_id], counts[opp_id].item() / self.samples) for opp_id in opp_ids]
+
+    def print_report(self, max_opps=4):
+        print(f"{self.samples} samples, opponents for {self.year}")
+        for kind in self.opp_counts:
+            print(f"{kind}:")
+            for div, div_teams in divisions.items():
+                for team in div_teams:
+                    opps = ', '.join([f'{opp} {100 * p:.1f}%' for opp, p in self.opponent_odds(team, kind)[:max_opps]])
+                    print(f"  {team:<5}{opps}")
+
+
+def simulate_opponents_chunk(chunk_seed, num_samples):
+    year, played, remaining, win_prob, _ = playoff_odds._worker_season
+    rng = get_chunk_rng(chunk_seed)
+    table, results = sample_season_arrays(played, remaining, win_prob, num_samples, rng)
+    odds = OpponentOdds(year + 1)
+    odds.add_div_rankings(rank_divisions_batch(table, None, *results))
+    return odds
+
+# Samples the rest of the season after the given week, split into chunks over
+# the worker processes the same way as simulate_playoff_odds.
+def simulate_opponent_odds(year, week, num_samples, win_prob=coin_flip, seed=0, workers=None, chunk_size=1000):
+    games, _ = load_year(year)
+    played, remaining = split_season(games, week)
+
+    odds = OpponentOdds(year + 1)
+    def add_chunk(chunk_odds):
+        odds.merge(chunk_odds)
+    run_chunks(simulate_opponents_chunk, (year, played, remaining, win_prob, True), num_samples, add_chunk,
+        seed, workers, chunk_size)
+    return odds
+
+
+if __name__ == '__main__':
+    import sys
+    year, week, num_samples = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+    simulate_opponent_odds(year, week, num_samples).print_report()
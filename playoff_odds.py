@@ -0,0 +1,274 @@
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import random
+
+import numpy as np
+
+from bracket import *
+from schedule_analyzer import *
+from seeds_batch import get_seeds_batch
+
+
+# Monte Carlo playoff odds. Takes a season as played through some week,
+# samples the results of the remaining games & seeds both conferences for
+# each sample. Each chunk of samples' seedings is then played out through the
+# Super Bowl (see bracket), with the same win probabilities. Counts are
+# aggregated as they come in, so memory doesn't depend on the number of samples.
+#
+# Samples are split into fixed size chunks. Each chunk gets its own RNG, seeded
+# from (seed, chunk number), and chunks are merged in order. So the same seed
+# gives the same odds regardless of the number of worker processes.
+#
+# By default each chunk is sampled as arrays & seeded by get_seeds_batch. With
+# batched=False (--scalar) every sample is seeded through the dict path
+# instead, which is kept as the reference but is a couple of orders of
+# magnitude slower, far too slow for a million samples. The samples come from
+# a different RNG, so the odds aren't the same as batched for the same seed.
+
+# Win probability sources are called with (home_team, away_team) and should
+# return the probability that the home team wins. They need to be picklable
+# (i.e. module level functions) to be sent to the worker processes.
+def coin_flip(home_team, away_team):
+    return 0.5
+
+# Games through the given week are treated as played, the rest as unplayed.
+def split_season(games, week):
+    played = [game for game in games if game.week <= week]
+    remaining = [game for game in games if game.week > week]
+    return played, remaining
+
+# Tallies of seeds, division titles & playoff appearances over all samples so far
+class PlayoffOdds:
+    def __init__(self, num_seeds):
+        self.num_seeds = num_seeds
+        self.samples = 0
+        self.seed_counts = {team: [0] * num_seeds for team in all_teams}
+        self.div_title_counts = {team: 0 for team in all_teams}
+        # Times each team won each of the postseason_rounds
+        self.round_counts = {team: [0] * len(postseason_rounds) for team in all_teams}
+
+    def add_seeds(self, seeds):
+        for seed_idx, team in enumerate(seeds):
+            self.seed_counts[team][seed_idx] += 1
+            # The top 4 seeds are the division champs
+            if seed_idx < 4:
+                self.div_title_counts[team] += 1
+
+    # Seeds from get_seeds_batch, a row per sample
+    def add_seed_ids(self, seed_ids):
+        for seed_idx, seed_team_ids in enumerate(seed_ids.T):
+            counts = np.bincount(seed_team_ids, minlength=len(all_teams))
+            for team_id in np.flatnonzero(counts).tolist():
+                self.seed_counts[all_teams[team_id]][seed_idx] += counts[team_id].item()
+                if seed_idx < 4:
+                    self.div_title_counts[all_teams[team_id]] += counts[team_id].item()
+
+    # From simulate_postseason
+    def add_postseason(self, advanced):
+        for team_id, team_counts in enumerate(count_advanced(advanced).tolist()):
+            for round_idx, count in enumerate(team_counts):
+                self.round_counts[all_teams[team_id]][round_idx] += count
+
+    def merge(self, other):
+        assert self.num_seeds == other.num_seeds
+        self.samples += other.samples
+        for team in all_teams:
+            for seed_idx in range(self.num_seeds):
+                self.seed_counts[team][seed_idx] += other.seed_counts[team][seed_idx]
+            self.div_title_counts[team] += other.div_title_counts[team]
+            for round_idx in range(len(postseason_rounds)):
+                self.round_counts[team][round_idx] += other.round_counts[team][round_idx]
+
+    # Index 0 is the odds of the #1 seed, and so on
+    def seed_odds(self, team):
+        return [count / self.samples for count in self.seed_counts[team]]
+
+    def div_title_odds(self, team):
+        return self.div_title_counts[team] / self.samples
+
+    def playoff_odds(self, team):
+        return sum(self.seed_counts[team]) / self.samples
+
+    def elimination_odds(self, team):
+        return 1.0 - self.playoff_odds(team)
+
+    # Index 0 is the odds of winning the Wild Card round (or having a bye),
+    # and so on through winning the Super Bowl
+    def round_odds(self, team):
+        return [count / self.samples for count in self.round_counts[team]]
+
+    # Half-width of the widest (Wilson score) confidence interval out of all of
+    # the reported odds. Unlike the normal approximation, it doesn't shrink to
+    # nothing for odds that are 0% or 100% so far, so a run can't stop early
+    # just because it hasn't seen a rare outcome yet.
+    def max_confidence_interval(self, z=1.96):
+        counts = [self.div_title_counts[team] for team in all_teams]
+        counts += [sum(self.seed_counts[team]) for team in all_teams]
+        for team in all_teams:
+            counts += self.seed_counts[team] + self.round_counts[team]
+        # The half-width only depends on the count through count * (samples - count)
+        worst = max([count * (self.samples - count) for count in counts])
+        return z * math.sqrt(worst / self.samples + z**2 / 4) / (self.samples + z**2)
+
+    def print_report(self):
+        print(f"{self.samples} samples")
+        for conf in ['AFC', 'NFC']:
+            seed_headers = ' '.join([f'#{seed_idx+1:<5}' for seed_idx in range(self.num_seeds)])
+            round_headers = ' '.join([f'{round_header:<6}' for round_header in ['DivRd', 'ConfCh', 'SB', 'Champ']])
+            print(f"{conf:<5}{seed_headers} {'Div':<6} {'Playoff':<7} {'Elim':<6} {round_headers}")
+            teams = sorted(conf_teams[conf], key=lambda team: (-self.playoff_odds(team), self.seed_odds(team)))
+            for team in teams:
+                odds = self.seed_odds(team) + [self.div_title_odds(team),
+                    self.playoff_odds(team), self.elimination_odds(team)] + self.round_odds(team)
+                print(f"{team:<5}" + ' '.join([f'{100 * p:5.1f}%' for p in odds]))
+
+
+# Everything a worker needs to sample the season, sent once per process.
+_worker_season = None
+
+def init_worker(season):
+    global _worker_season
+    _worker_season = season
+
+def simulate_chunk(chunk_seed, num_samples):
+    year, played, remaining, win_prob, batched = _worker_season
+    if batched:
+        return simulate_chunk_batched(chunk_seed, num_samples)
+    rng = random.Random(chunk_seed)
+
+    # Scores for the sampled games are drawn from the games already played.
+    # (They only matter once the tiebreaks get down to points.)
+    scores = [(game.pts_w, game.pts_l) for game in played if not game.is_tie]
+    if not scores:
+        scores = [(24, 17)]
+
+    # The played games are the same in every sample, so only the sampled ones are
+    # added to each team's schedule.
+    played_schedules = {team: [] for team in all_teams}
+    for game in played:
+        played_schedules[game.winner].append(game)
+        played_schedules[game.loser].append(game)
+    home_win_probs = [win_prob(game.home, game.away) for game in remaining]
+
+    odds = PlayoffOdds(7 if year >= 2020 else 6)
+    sampled_seeds = {'AFC': [], 'NFC': []}
+    for _ in range(num_samples):
+        schedules = {team: games.copy() for team, games in played_schedules.items()}
+        for game, home_win_prob in zip(remaining, home_win_probs):
+            home, away = game.home, game.away
+            winner, loser = (home, away) if rng.random() < home_win_prob else (away, home)
+            pts_w, pts_l = rng.choice(scores)
+            sampled_game = make_game(game.week, winner, loser, home, pts_w, pts_l, game.day)
+            schedules[winner].append(sampled_game)
+            schedules[loser].append(sampled_game)
+
+        schedules = SeasonIndex(schedules)
+        for conf in ['AFC', 'NFC']:
+            seeds = get_seeds(schedules, conf, year)
+            odds.add_seeds(seeds)
+            sampled_seeds[conf].append(get_team_ids(seeds))
+        odds.samples += 1
+
+    postseason_rng = np.random.default_rng(rng.getrandbits(64))
+    sampled_seeds = {conf: np.array(conf_seeds, dtype=np.intp).reshape(num_samples, odds.num_seeds)
+        for conf, conf_seeds in sampled_seeds.items()}
+    odds.add_postseason(simulate_postseason(sampled_seeds, get_win_prob_matrix(win_prob), postseason_rng))
+    return odds
+
+# Samples the remaining games' results num_samples times, as arrays. Returns
+# the season's GameTable (played games first) & [winners, losers, pts_w, pts_l]
+# with a row per sample, as for GameTable.get_indexes.
+def sample_season_arrays(played, remaining, win_prob, num_samples, rng):
+    scores = [(game.pts_w, game.pts_l) for game in played if not game.is_tie] or [(24, 17)]
+    scores = np.array(scores, dtype=np.int64)
+
+    # A column per game, with the remaining games' results filled in per sample
+    table = GameTable(played + remaining)
+    home_ids = get_team_id_array([game.home for game in remaining])
+    away_ids = get_team_id_array([game.away for game in remaining])
+    home_win_probs = np.array([win_prob(game.home, game.away) for game in remaining])
+    sample_shape = (num_samples, len(remaining))
+
+    home_wins = rng.random(sample_shape) < home_win_probs
+    sampled_scores = scores[rng.integers(len(scores), size=sample_shape)]
+    results = [np.tile(array, (num_samples, 1)) for array in [table.winners, table.losers, table.pts_w, table.pts_l]]
+    results[0][:, len(played):] = np.where(home_wins, home_ids, away_ids)
+    results[1][:, len(played):] = np.where(home_wins, away_ids, home_ids)
+    results[2][:, len(played):] = sampled_scores[:, :, 0]
+    results[3][:, len(played):] = sampled_scores[:, :, 1]
+    return table, results
+
+def get_chunk_rng(chunk_seed):
+    return np.random.default_rng(random.Random(chunk_seed).getrandbits(64))
+
+# Same as simulate_chunk, with the whole chunk sampled & seeded as arrays
+def simulate_chunk_batched(chunk_seed, num_samples):
+    year, played, remaining, win_prob, _ = _worker_season
+    rng = get_chunk_rng(chunk_seed)
+    table, results = sample_season_arrays(played, remaining, win_prob, num_samples, rng)
+
+    odds = PlayoffOdds(7 if year >= 2020 else 6)
+    seeds = get_seeds_batch(table, year, None, *results)
+    for seed_ids in seeds.values():
+        odds.add_seed_ids(seed_ids)
+    odds.add_postseason(simulate_postseason(seeds, get_win_prob_matrix(win_prob), rng))
+    odds.samples += num_samples
+    return odds
+
+# Runs chunk_func(chunk_seed, size) over the samples in chunks, with the season
+# set up in each worker (see init_worker), & passes each chunk's result to
+# add_chunk in chunk order. Stops early if add_chunk returns True.
+def run_chunks(chunk_func, season, num_samples, add_chunk, seed=0, workers=None, chunk_size=1000):
+    num_chunks = math.ceil(num_samples / chunk_size)
+    chunk_sizes = [min(chunk_size, num_samples - chunk_idx * chunk_size) for chunk_idx in range(num_chunks)]
+    chunk_seeds = [f'{seed}:{chunk_idx}' for chunk_idx in range(num_chunks)]
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        init_worker(season)
+        for chunk_seed, size in zip(chunk_seeds, chunk_sizes):
+            if add_chunk(chunk_func(chunk_seed, size)):
+                break
+        return
+
+    # Only keep a couple of chunks per worker in flight. That keeps memory flat
+    # and means not much is thrown away when stopping early.
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(season,)) as executor:
+        pending = []
+        chunks = iter(zip(chunk_seeds, chunk_sizes))
+        for chunk_seed, size in chunks:
+            pending.append(executor.submit(chunk_func, chunk_seed, size))
+            if len(pending) < 2 * workers:
+                continue
+            if add_chunk(pending.pop(0).result()):
+                break
+        else:
+            while pending and not add_chunk(pending.pop(0).result()):
+                pass
+        # Whatever's left when stopping early hasn't been added. Chunks that
+        # haven't started are dropped, the rest are waited for on the way out.
+        for future in pending:
+            future.cancel()
+
+# Samples the rest of the season after the given week. Stops early once every
+# reported odds is within +/- max_ci (95% confidence), if given.
+def simulate_playoff_odds(year, week, num_samples, win_prob=coin_flip, seed=0,
+        workers=None, chunk_size=1000, max_ci=None, batched=True):
+    games, _ = load_year(year)
+    played, remaining = split_season(games, week)
+    season = (year, played, remaining, win_prob, batched)
+
+    odds = PlayoffOdds(7 if year >= 2020 else 6)
+    def add_chunk(chunk_odds):
+        odds.merge(chunk_odds)
+        return max_ci is not None and odds.max_confidence_interval() <= max_ci
+
+    run_chunks(simulate_chunk, season, num_samples, add_chunk, seed, workers, chunk_size)
+    return odds
+
+
+if __name__ == '__main__':
+    import sys
+    year, week, num_samples = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+    simulate_playoff_odds(year, week, num_samples, batched='--scalar' not in sys.argv[4:]).print_report()
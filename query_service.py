@@ -0,0 +1,284 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from ingest import stream_seasons
+from schedule_analyzer import *
+
+
+# Local query service. Loads & indexes every season once, then answers queries
+# over localhost HTTP from the warm indexes:
+#
+#   python query_service.py serve
+#   python query_service.py query /seeds year=2019 conf=AFC
+#   python query_service.py query /divisions year=2010
+#   python query_service.py query /seeds year=2021 conf=AFC variant=norank
+#   python query_service.py query /seeds year=2021 conf=AFC flip=9:KC:TEN
+#   python query_service.py load --clients 8   # stand-in clients, for testing
+#
+# Queries are GETs with the parameters in the query string, & answers are JSON:
+#   /years                                   years that are loaded
+#   /seeds?year=&conf=&variant=&flip=        seeds of one conference (or both)
+#   /divisions?year=&variant=&flip=          division rankings
+#
+# variant is 'real' (the default), 'no17' or 'norank' (see schedule_analyzer).
+# flip is WEEK:TEAM:OPP, the game that week between the two teams going the
+# other way, & can be given more than once. Bad queries get a 400 with
+# {'error': ...}.
+
+default_host = '127.0.0.1'
+default_port = 8032
+
+class QueryError(Exception):
+    pass
+
+# One season's games, with its index & division rankings computed up front.
+# The counterfactual views are built (& kept) the first time they're asked for.
+class WarmSeason:
+    def __init__(self, year, games, playoff_games):
+        self.year = year
+        self.games = games
+        self.playoff_games = playoff_games
+        self.table = GameTable(games)
+        self.index = SeasonIndex(team_schedules(games, year))
+        self.div_rankings = rank_divisions(self.index)
+        self.counterfactuals = None
+        self.variant_indexes = {}
+
+    # Mask of the games to flip, from [(week, team, opp)]
+    def get_flip_mask(self, flips):
+        mask = np.zeros(len(self.games), dtype=bool)
+        for week, team, opp in flips:
+            game_idxs = [game_idx for game_idx, game in enumerate(self.games)
+                if game.week == week and {game.winner, game.loser} == {team, opp}]
+            if len(game_idxs) != 1:
+                raise QueryError(f"No {self.year} week {week} game between {team} and {opp}")
+            if self.games[game_idxs[0]].is_tie:
+                raise QueryError(f"Can't flip a tie ({self.year} week {week} {team} vs {opp})")
+            mask[game_idxs[0]] = True
+        return mask
+
+class WarmSeasons:
+    def __init__(self, years=None, workers=None):
+        self.seasons = {year: WarmSeason(year, games, playoff_games)
+            for year, games, playoff_games in stream_seasons(years, workers)}
+        # Queries are serialized on purpose. The tiebreak cache, the tiebreak
+        # events' step details & the indexes' lazily built fields are all shared
+        # & none of them are thread safe. The queries are pure Python (so the GIL
+        # would serialize them anyway) & only take milliseconds once warm, so
+        # the threads are just there to keep slow clients from blocking others.
+        self.lock = threading.Lock()
+
+    def get_season(self, year):
+        if year not in self.seasons:
+            raise QueryError(f"No data for {year}")
+        return self.seasons[year]
+
+    def get_index(self, year, variant='real', flips=()):
+        season = self.get_season(year)
+        if variant == 'real':
+            if not flips:
+                return season.index
+            return season.table.get_index(None, *season.table.get_flipped(season.get_flip_mask(flips)))
+
+        if variant not in ['no17', 'norank']:
+            raise QueryError(f"Unknown variant {variant}")
+        if year - 1 not in self.seasons:
+            raise QueryError(f"{variant} needs the {year-1} season")
+        if variant == 'no17' and year < 2021:
+            raise QueryError(f"There's no 17th game in {year}")
+        if season.counterfactuals is None:
+            season.counterfactuals = get_counterfactual_masks(season.table, year, self.seasons[year-1].div_rankings)
+        mask = season.counterfactuals[variant]
+        if not flips:
+            if variant not in season.variant_indexes:
+                season.variant_indexes[variant] = season.table.get_index(mask)
+            return season.variant_indexes[variant]
+        return season.table.get_index(mask, *season.table.get_flipped(season.get_flip_mask(flips)))
+
+    def get_seeds(self, year, confs, variant='real', flips=()):
+        with self.lock:
+            index = self.get_index(year, variant, flips)
+            return {conf: get_seeds(index, conf, year) for conf in confs}
+
+    def get_div_rankings(self, year, variant='real', flips=()):
+        with self.lock:
+            if variant == 'real' and not flips:
+                return self.get_season(year).div_rankings
+            return rank_divisions(self.get_index(year, variant, flips))
+
+
+# Returns [(week, team, opp)] from the flip parameters
+def parse_flips(flip_params):
+    flips = []
+    for flip in flip_params:
+        fields = flip.split(':')
+        if len(fields) != 3 or not fields[0].isdigit() or not all([team in team_ids for team in fields[1:]]):
+            raise QueryError(f"Bad flip {flip}, should be WEEK:TEAM:OPP")
+        flips.append((int(fields[0]), fields[1], fields[2]))
+    return flips
+
+def get_param(params, name, default=None):
+    if name not in params:
+        if default is None:
+            raise QueryError(f"Missing {name}")
+        return default
+    return params[name][-1]
+
+def get_year_param(params):
+    year = get_param(params, 'year')
+    if not year.isdigit():
+        raise QueryError(f"Bad year {year}")
+    return int(year)
+
+queries = ['/years', '/seeds', '/divisions']
+
+def answer_query(seasons, path, params):
+    if path == '/years':
+        return {'years': sorted(seasons.seasons)}
+
+    year = get_year_param(params)
+    variant = get_param(params, 'variant', 'real')
+    flips = parse_flips(params.get('flip', []))
+    if path == '/seeds':
+        conf = get_param(params, 'conf', 'both')
+        if conf not in ['AFC', 'NFC', 'both']:
+            raise QueryError(f"Bad conf {conf}")
+        confs = ['AFC', 'NFC'] if conf == 'both' else [conf]
+        return {'year': year, 'variant': variant, 'seeds': seasons.get_seeds(year, confs, variant, flips)}
+    else:
+        assert path == '/divisions'
+        return {'year': year, 'variant': variant, 'div_rankings': seasons.get_div_rankings(year, variant, flips)}
+
+class QueryServer(ThreadingHTTPServer):
+    # Enough room for a burst of clients connecting at once
+    request_queue_size = 64
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # Set on the server by serve()
+    quiet = True
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            if url.path not in queries:
+                status, answer = 404, {'error': f"Unknown query {url.path}"}
+            else:
+                status, answer = 200, answer_query(self.server.seasons, url.path, urllib.parse.parse_qs(url.query))
+        except QueryError as e:
+            status, answer = 400, {'error': str(e)}
+        except Exception as e:
+            traceback.print_exc()
+            status, answer = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        body = json.dumps(answer).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def serve(host=default_host, port=default_port, years=None, workers=None, quiet=True):
+    start = time.perf_counter()
+    seasons = WarmSeasons(years, workers)
+    server = QueryServer((host, port), QueryHandler)
+    server.seasons = seasons
+    QueryHandler.quiet = quiet
+    print(f"Loaded {len(seasons.seasons)} seasons in {time.perf_counter() - start:.2f}s,"
+        f" listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Client side. Returns (status, answer).
+def query(path, host=default_host, port=default_port, **params):
+    url = f"http://{host}:{port}{path}?{urllib.parse.urlencode(params, doseq=True)}"
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+# Stand-in clients: each sends num_requests random queries (seeds, division
+# rankings, counterfactuals) to the service, all at once. Returns the
+# latencies in seconds, & the number of queries that didn't get a 200.
+def run_load(num_clients=8, num_requests=100, host=default_host, port=default_port, seed=0):
+    _, answer = query('/years', host, port)
+    years = answer['years']
+
+    def run_client(client_idx):
+        rng = random.Random(seed + client_idx)
+        latencies, failures = [], 0
+        for _ in range(num_requests):
+            year = rng.choice(years)
+            path, params = rng.choice([('/seeds', {'conf': rng.choice(['AFC', 'NFC'])}),
+                ('/divisions', {}), ('/seeds', {'variant': 'norank'})])
+            if params.get('variant') and year - 1 not in years:
+                params = {}
+            start = time.perf_counter()
+            status, _ = query(path, host, port, year=year, **params)
+            latencies.append(time.perf_counter() - start)
+            failures += status != 200
+        return latencies, failures
+
+    with ThreadPoolExecutor(num_clients) as executor:
+        results = list(executor.map(run_client, range(num_clients)))
+    return [latency for latencies, _ in results for latency in latencies], sum([failures for _, failures in results])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local query service for seeds & division rankings.')
+    parser.add_argument('--host', default=default_host)
+    parser.add_argument('--port', type=int, default=default_port)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='load the seasons & answer queries')
+    serve_parser.add_argument('years', nargs='*', type=int, help='years to load (default: all in data/)')
+    serve_parser.add_argument('--verbose', action='store_true', help='log every request')
+    query_parser = subparsers.add_parser('query', help='send one query')
+    query_parser.add_argument('path', help='e.g. /seeds')
+    query_parser.add_argument('params', nargs='*', help='NAME=VALUE, e.g. year=2019')
+    load_parser = subparsers.add_parser('load', help='run concurrent stand-in clients')
+    load_parser.add_argument('--clients', type=int, default=8)
+    load_parser.add_argument('--requests', type=int, default=100, help='queries per client')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.years or None, quiet=not args.verbose)
+    elif args.command == 'query':
+        params = {}
+        for param in args.params:
+            name, value = param.split('=', 1)
+            params.setdefault(name, []).append(value)
+        status, answer = query(args.path, args.host, args.port, **params)
+        print(json.dumps(answer, indent=2))
+        sys.exit(0 if status == 200 else 1)
+    else:
+        start = time.perf_counter()
+        latencies, failures = run_load(args.clients, args.requests, args.host, args.port)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(f"{len(latencies)} queries from {args.clients} clients in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s),"
+            f" {failures} failed")
+        print(f"Latency: median {1000 * statistics.median(latencies):.2f} ms,"
+            f" p99 {1000 * latencies[int(0.99 * (len(latencies) - 1))]:.2f} ms, max {1000 * latencies[-1]:.2f} ms")
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+import tiebreak_events
+from schedule_analyzer import *
+
+
+# Local SQLite store of the seeds & division rankings for each season, for the
+# real schedule & both counterfactuals, along with the tiebreak step that
+# decided each place. Results are keyed on the season, the hash of the CSVs
+# they were computed from, the variant & tiebreak_rules_version, so only the
+# seasons whose inputs or rules changed are recomputed:
+#
+#   store = ResultStore()
+#   update_store(store, range(2002, 2021+1))
+#   store.get_seeds(2014, 'AFC')
+#
+# Deciding steps are the names of the tiebreak functions, e.g.
+# 'best_record_tiebreak', or 'only_team' for the last team left.
+#
+# Every decision (each division title, seed & division place) is also logged
+# with the tiebreak events behind it, indexed by season, conference, variant,
+# deciding step & the teams that were in the tie, so they can be looked up &
+# explained without recomputing anything:
+#
+#   store.find_decisions(step='strength_of_victory_tiebreak')
+#   print('\n'.join(store.explain_seed(2014, 'AFC', 6)))
+
+default_store_path = 'results/results.db'
+# Bump when the schema changes. Stores of another version are rebuilt.
+store_format_version = 2
+
+# 'real' is the actual schedule, the others are from get_counterfactual_masks
+variants = ['real', 'no17', 'norank']
+
+schema = '''
+CREATE TABLE IF NOT EXISTS results (
+    season INTEGER NOT NULL,
+    variant TEXT NOT NULL,
+    csv_hash TEXT NOT NULL,
+    rules_version INTEGER NOT NULL,
+    num_games INTEGER NOT NULL,
+    num_teams INTEGER NOT NULL,
+    PRIMARY KEY (season, variant, csv_hash, rules_version)
+);
+CREATE TABLE IF NOT EXISTS seeds (
+    season INTEGER NOT NULL,
+    variant TEXT NOT NULL,
+    conf TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    deciding_step TEXT NOT NULL,
+    PRIMARY KEY (season, variant, conf, seed)
+);
+CREATE TABLE IF NOT EXISTS div_rankings (
+    season INTEGER NOT NULL,
+    variant TEXT NOT NULL,
+    division TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    deciding_step TEXT NOT NULL,
+    PRIMARY KEY (season, variant, division, rank)
+);
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY,
+    season INTEGER NOT NULL,
+    variant TEXT NOT NULL,
+    conf TEXT NOT NULL,
+    division TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    place INTEGER NOT NULL,
+    team TEXT NOT NULL,
+    deciding_step TEXT NOT NULL,
+    events BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decision_teams (
+    team TEXT NOT NULL,
+    decision_id INTEGER NOT NULL,
+    PRIMARY KEY (team, decision_id)
+);
+CREATE INDEX IF NOT EXISTS seeds_by_step ON seeds (deciding_step);
+CREATE INDEX IF NOT EXISTS div_rankings_by_step ON div_rankings (deciding_step);
+CREATE INDEX IF NOT EXISTS decisions_by_season ON decisions (season, variant, conf, kind, place);
+CREATE INDEX IF NOT EXISTS decisions_by_step ON decisions (deciding_step, season);
+'''
+
+store_tables = ['results', 'seeds', 'div_rankings', 'decisions', 'decision_teams']
+
+# Events are stored as compressed JSON (sets of teams become lists)
+def pack_events(events):
+    return zlib.compress(json.dumps(events, default=list).encode())
+
+def unpack_events(packed):
+    return json.loads(zlib.decompress(packed))
+
+class ResultStore:
+    def __init__(self, path=default_store_path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        (version,), = self.query('PRAGMA user_version')
+        if version != store_format_version:
+            # Everything in the store can be recomputed
+            for table in store_tables:
+                self.connection.execute(f'DROP TABLE IF EXISTS {table}')
+            self.connection.execute(f'PRAGMA user_version = {store_format_version}')
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, sql, params=()):
+        return self.connection.execute(sql, params).fetchall()
+
+    def is_current(self, season, variant, csv_hash):
+        return bool(self.query('SELECT 1 FROM results WHERE season = ? AND variant = ? AND csv_hash = ? AND rules_version = ?',
+            (season, variant, csv_hash, tiebreak_rules_version)))
+
+    # Replaces whatever was stored for the season & variant
+    def save(self, season, variant, csv_hash, result):
+        with self.connection:
+            self.connection.execute('DELETE FROM decision_teams WHERE decision_id IN'
+                ' (SELECT id FROM decisions WHERE season = ? AND variant = ?)', (season, variant))
+            for table in ['results', 'seeds', 'div_rankings', 'decisions']:
+                self.connection.execute(f'DELETE FROM {table} WHERE season = ? AND variant = ?', (season, variant))
+            self.connection.execute('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (season, variant, csv_hash, tiebreak_rules_version, result['num_games'], result['num_teams']))
+            for conf, seeds in result['seeds'].items():
+                self.connection.executemany('INSERT INTO seeds VALUES (?, ?, ?, ?, ?, ?)',
+                    [(season, variant, conf, seed_idx+1, team, step)
+                     for seed_idx, (team, step) in enumerate(zip(seeds, result['seed_steps'][conf]))])
+            for div, div_ranking in result['div_rankings'].items():
+                self.connection.executemany('INSERT INTO div_rankings VALUES (?, ?, ?, ?, ?, ?)',
+                    [(season, variant, div, rank_idx+1, team, step)
+                     for rank_idx, (team, step) in enumerate(zip(div_ranking, result['div_steps'][div]))])
+            for decision in result['decisions']:
+                cursor = self.connection.execute('INSERT INTO decisions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (season, variant, team_conference[decision['team']], decision['division'], decision['kind'],
+                     decision['place'], decision['team'], decision['deciding_step'], pack_events(decision['events'])))
+                self.connection.executemany('INSERT INTO decision_teams VALUES (?, ?)',
+                    [(team, cursor.lastrowid) for team in decision['tied_teams']])
+
+    def has_results(self, season, variant='real'):
+        return bool(self.query('SELECT 1 FROM results WHERE season = ? AND variant = ?', (season, variant)))
+
+    # Seeds in order, or None if there aren't any stored
+    def get_seeds(self, season, conf, variant='real'):
+        rows = self.query('SELECT team FROM seeds WHERE season = ? AND variant = ? AND conf = ? ORDER BY seed',
+            (season, variant, conf))
+        return [team for team, in rows] or None
+
+    def get_seed_steps(self, season, conf, variant='real'):
+        rows = self.query('SELECT deciding_step FROM seeds WHERE season = ? AND variant = ? AND conf = ? ORDER BY seed',
+            (season, variant, conf))
+        return [step for step, in rows] or None
+
+    # {div: teams from first to last}, same as rank_divisions, or None
+    def get_div_rankings(self, season, variant='real'):
+        rows = self.query('SELECT division, team FROM div_rankings WHERE season = ? AND variant = ? ORDER BY rank',
+            (season, variant))
+        if not rows:
+            return None
+        div_rankings = {div: [] for div in divisions}
+        for div, team in rows:
+            div_rankings[div].append(team)
+        return div_rankings
+
+    # (season, variant, conf, seed, team) for every seed decided by the step
+    def find_seeds_decided_by(self, step):
+        return self.query('SELECT season, variant, conf, seed, team FROM seeds WHERE deciding_step = ? ORDER BY season, variant, conf, seed',
+            (step,))
+
+    # Returns [(season, variant, conf, kind, place, team, deciding_step)] for the
+    # decisions matching all of the given fields. With team, it's the decisions
+    # where the team was one of the teams in the tie.
+    def find_decisions(self, step=None, season=None, conf=None, variant=None, kind=None, team=None):
+        sql = 'SELECT season, variant, conf, kind, place, decisions.team, deciding_step FROM decisions'
+        conditions, params = [], []
+        if team is not None:
+            sql += ' JOIN decision_teams ON decision_teams.decision_id = decisions.id'
+            conditions.append('decision_teams.team = ?')
+            params.append(team)
+        for column, value in [('deciding_step', step), ('season', season), ('conf', conf),
+                ('variant', variant), ('kind', kind)]:
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return self.query(sql + ' ORDER BY season, variant, conf, kind, place', params)
+
+    # Seasons with at least one decision made by the step
+    def find_seasons_decided_by(self, step, variant='real'):
+        rows = self.query('SELECT DISTINCT season FROM decisions WHERE deciding_step = ? AND variant = ? ORDER BY season',
+            (step, variant))
+        return [season for season, in rows]
+
+    # Returns the tiebreak events (ending with the decision's own event) of
+    # the decisions matching the conditions, in order
+    def get_decision_events(self, conditions, params):
+        rows = self.query(f'SELECT events FROM decisions WHERE {conditions} ORDER BY id', params)
+        return [unpack_events(events) for events, in rows]
+
+    # Lines of the text trace for how the team got the seed: its division title
+    # (for the top 4 seeds) & the seeding itself. Empty if it isn't stored.
+    def explain_seed(self, season, conf, seed, variant='real'):
+        seed_events = self.get_decision_events('season = ? AND variant = ? AND conf = ? AND kind IN (?, ?) AND place = ?',
+            (season, variant, conf, 'seed', 'wild_card', seed))
+        if not seed_events:
+            return []
+        team = seed_events[0][-1]['team']
+        title_events = self.get_decision_events('season = ? AND variant = ? AND kind = ? AND team = ?',
+            (season, variant, 'division_champ', team)) if seed <= 4 else []
+        return [line for events in title_events + seed_events for event in events for line in tiebreak_events.render_event(event)]
+
+    def explain_div_rank(self, season, division, rank, variant='real'):
+        rank_events = self.get_decision_events('season = ? AND variant = ? AND division = ? AND kind = ? AND place = ?',
+            (season, variant, division, 'division_rank', rank))
+        return [line for events in rank_events for event in events for line in tiebreak_events.render_event(event)]
+
+    # (div_rankings, analysis) in the same format as analyze_years, or None
+    def get_analysis(self, season):
+        if not self.has_results(season):
+            return None
+        (num_games, num_teams), = self.query('SELECT num_games, num_teams FROM results WHERE season = ? AND variant = ?',
+            (season, 'real'))
+        analysis = {'num_games': num_games, 'num_teams': num_teams}
+        for conf in ['AFC', 'NFC']:
+            analysis[conf] = tuple([self.get_seeds(season, conf, variant) for variant in variants])
+        return self.get_div_rankings(season), analysis
+
+
+# Runs func(*args) with the tiebreak events captured. Returns (result, events).
+def capture_events(func, *args):
+    sink = tiebreak_events.BufferSink()
+    tiebreak_events.add_sink(sink)
+    try:
+        return func(*args), sink.events
+    finally:
+        tiebreak_events.remove_sink(sink)
+
+# Events that pick a team, for a division title, a seed or a place in the division
+decision_events = ['division_champ', 'division_rank', 'seed', 'wild_card']
+
+# Splits the events from get_seeds or rank_divisions into the decisions that
+# picked each team: {kind, team, division, place, deciding_step, tied_teams,
+# events}. The deciding step is the last step to select a team since the
+# previous pick, which includes the division tiebreaks applied before a Wild
+# Card tiebreak. The tied teams are all the teams the steps were applied to.
+def get_decisions(events):
+    decisions, decision_events_so_far = [], []
+    for event in events:
+        decision_events_so_far.append(event)
+        if event['event'] not in decision_events:
+            continue
+
+        deciding_step, tied_teams = None, {event['team']}
+        for step_event in decision_events_so_far:
+            if step_event['event'] == 'step':
+                tied_teams.update(step_event['teams'])
+                if step_event['result'] == 'selected':
+                    deciding_step = step_event['step']
+        decisions.append({'kind': event['event'], 'team': event['team'],
+            'division': event.get('division', team_division[event['team']]),
+            'place': event.get('seed', event.get('rank', 1)), 'deciding_step': deciding_step or 'only_team',
+            'tied_teams': sorted(tied_teams), 'events': decision_events_so_far})
+        decision_events_so_far = []
+    return decisions
+
+# The deciding step of each of the decisions of the given kinds
+def get_deciding_steps(events, markers):
+    return [decision['deciding_step'] for decision in get_decisions(events) if decision['kind'] in markers]
+
+# The counterfactuals need the previous season's rankings, so they're
+# only for seasons whose previous season is in data/.
+def get_season_variants(year):
+    if not os.path.exists(f'data/{year-1}.csv'):
+        return ['real']
+    return [variant for variant in variants if variant != 'no17' or year >= 2021]
+
+# Hash of the CSVs the variant of the season is computed from. The
+# counterfactuals also depend on the previous season (through its rankings).
+def get_input_hash(year, variant):
+    if variant == 'real':
+        return get_csv_hash(year)
+    return hashlib.sha256(f'{get_csv_hash(year)}:{get_csv_hash(year-1)}'.encode()).hexdigest()[:16]
+
+# Returns {variant: result} for the season, where results have the seeds,
+# division rankings & deciding steps of each.
+def compute_season_results(year, prev_div_rankings, season_variants):
+    games, playoff_games = load_year(year)
+    season = team_schedules(games, year, playoff_games)
+    indexes = {'real': SeasonIndex(season)}
+    if prev_div_rankings is not None:
+        table = GameTable(games)
+        masks = get_counterfactual_masks(table, year, prev_div_rankings)
+        indexes.update(zip(masks, table.get_indexes(list(masks.values()))))
+
+    results = {}
+    for variant in season_variants:
+        index = indexes[variant]
+        result = {'num_games': len(games), 'num_teams': len(list_teams(games)),
+            'seeds': {}, 'seed_steps': {}, 'div_steps': {}, 'decisions': []}
+        for conf in ['AFC', 'NFC']:
+            result['seeds'][conf], events = capture_events(get_seeds, index, conf, year)
+            result['seed_steps'][conf] = get_deciding_steps(events, ['seed', 'wild_card'])
+            result['decisions'] += get_decisions(events)
+            if variant == 'real':
+                verify_seeds(season, result['seeds'][conf])
+        result['div_rankings'], events = capture_events(rank_divisions, index)
+        div_steps = get_deciding_steps(events, ['division_rank'])
+        result['decisions'] += get_decisions(events)
+        for div_idx, div in enumerate(divisions):
+            result['div_steps'][div] = div_steps[4*div_idx:4*(div_idx+1)]
+        results[variant] = result
+    return results
+
+# Brings the store up to date for the years, only recomputing the seasons
+# (& variants) whose CSVs or tiebreak rules changed since they were stored.
+# Returns the (season, variant)s that were recomputed.
+def update_store(store, years, season_variants=None):
+    recomputed = []
+    for year in years:
+        stale = [variant for variant in season_variants or get_season_variants(year)
+            if not store.is_current(year, variant, get_input_hash(year, variant))]
+        if not stale:
+            continue
+
+        prev_div_rankings = None
+        if stale != ['real']:
+            recomputed += update_store(store, [year-1], ['real'])
+            prev_div_rankings = store.get_div_rankings(year-1)
+        for variant, result in compute_season_results(year, prev_div_rankings, stale).items():
+            store.save(year, variant, get_input_hash(year, variant), result)
+            recomputed.append((year, variant))
+    return recomputed
+
+
+if __name__ == '__main__':
+    import sys
+    store = ResultStore()
+    # python result_store.py explain 2014 AFC 6 [variant]
+    # python result_store.py decided-by strength_of_victory_tiebreak
+    if sys.argv[1:2] == ['explain']:
+        season, conf, seed = int(sys.argv[2]), sys.argv[3], int(sys.argv[4])
+        lines = store.explain_seed(season, conf, seed, *sys.argv[5:6])
+        print('\n'.join(lines) if lines else f"No {season} {conf} #{seed} seed stored")
+    elif sys.argv[1:2] == ['decided-by']:
+        for season, variant, conf, kind, place, team, _ in store.find_decisions(step=sys.argv[2]):
+            print(f"{season} {variant:<6} {conf} {kind:<14} {place} {team}")
+    else:
+        years = [int(year) for year in sys.argv[1:]] or range(2002, 2021+1)
+        recomputed = update_store(store, years)
+        print(f"Recomputed {len(recomputed)} season results", file=sys.stderr)
+        for year in years:
+            analysis = store.get_analysis(year)
+            if analysis is None:
+                print(f"No {year} results stored")
+                continue
+            print_analysis(year, *analysis)
+    store.close()
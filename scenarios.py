@@ -0,0 +1,708 @@
+import itertools
+import math
+
+from playoff_odds import split_season
+from schedule_analyzer import *
+import tiebreak_events
+
+
+# Clinch/elimination scenarios for the end of a season.
+#
+# A scenario is a set of results for some of the remaining games, as a
+# {game number: winner} dict (game numbers index into the remaining games).
+# A scenario clinches (or eliminates) an outcome for a team if every way of
+# playing out the rest of the games gets the team that outcome (or doesn't).
+# Only the minimal scenarios are listed, i.e. dropping any one result from
+# them would leave the outcome undecided. A team that has already clinched
+# (or been eliminated) has the empty scenario.
+#
+# Outcomes are 'division', 'playoffs' and ('seed', n), 1-indexed like the seeds.
+#
+# Ties aren't considered for the remaining games. Since the remaining games
+# don't have scores, they're all counted as 1-0 for the points tiebreaks.
+#
+# Only the games that can change where the team finishes are searched: its own
+# games & those of the teams whose records can end up level with it. Once those
+# are all decided, every other team is known to finish above or below the team,
+# & the rest of the games only matter if the team's tie group (or that of any
+# team level with it) gets as far as the steps that look outside the tied teams'
+# own games. So one set of results for the rest is played out, & the search only
+# goes on through the games those steps look at, if any of them were applied.
+#
+# Going through those games can take thousands of scenarios that only differ in
+# how the strengths of victory/schedule add up. So where the outcome only comes
+# down to which team the tied groups' tiebreaks pick from those steps on, the
+# scenarios list that instead (see get_tiebreak_scenarios), as tiebreak results
+# of ((step, teams of the group...), team picked) after the game results. Since
+# the same tiebreaks can come up after different game results, a scenario with
+# tiebreak results isn't always minimal.
+unplayed_score = (1, 0)
+
+MIXED = 'mixed'
+
+# Steps that depend on games the tied teams didn't play in, through their
+# opponents' records or their points ranks among other teams
+outside_steps = ['strength_of_victory_tiebreak', 'strength_of_schedule_tiebreak',
+    'conf_combined_ranking_tiebreak', 'combined_ranking_tiebreak']
+strength_steps = outside_steps[:2]
+strength_names = {'strength_of_victory_tiebreak': 'strength of victory',
+    'strength_of_schedule_tiebreak': 'strength of schedule'}
+
+# Both caches are bounded, so long searches don't keep every scenario around.
+# Scenarios are keyed as bitmasks over the remaining games to keep entries small.
+status_cache_size = 1 << 18
+seeds_cache_size = 1 << 16
+
+# Collects the groups of teams that any of the outside_steps were applied to,
+# & where each tiebreak ended up: the team picked, or the teams it started
+# over with
+class OutsideStepSink:
+    def __init__(self):
+        self.steps = []
+        self.ends = {}
+
+    def send(self, event):
+        if event['event'] == 'only_team':
+            self.ends[frozenset(event['og_teams'])] = event['team']
+        elif event['event'] == 'step':
+            if len(event['survivors']) == 1:
+                self.ends[frozenset(event['og_teams'])] = event['survivors'][0]
+            elif set(event['survivors']) != set(event['teams']):
+                self.ends[frozenset(event['og_teams'])] = frozenset(event['survivors'])
+            if event['step'] in outside_steps:
+                self.steps.append((event['step'], event['type'], frozenset(event['teams']), frozenset(event['og_teams'])))
+
+    # [(step, 'div' or 'wc', group of teams, the team the group's tiebreak picked)]
+    def get_groups(self):
+        groups = []
+        for step, tiebreak_type, group, og_group in self.steps:
+            winner = self.ends[og_group]
+            while isinstance(winner, frozenset):
+                winner = self.ends[winner]
+            groups.append((step, tiebreak_type, group, winner))
+        return groups
+
+class ScenarioSearch:
+    def __init__(self, year, played, remaining):
+        self.year = year
+        self.remaining = remaining
+        self.num_seeds = 7 if year >= 2020 else 6
+        self.num_wcs = self.num_seeds - 4
+
+        played_schedules = {team: [] for team in all_teams}
+        for game in played:
+            played_schedules[game.winner].append(game)
+            played_schedules[game.loser].append(game)
+        # Every set of results is the played games plus the remaining ones,
+        # so the played games are only indexed once.
+        self.played_index = SeasonIndex(played_schedules)
+        self.played_records = self.played_index.records
+        self.remaining_teams = [(game.home, game.away) for game in remaining]
+        self.game_orders = {}
+
+        # Whole season opponents, for the strength of victory/schedule
+        self.opponents = {team: set(self.played_index.opponents[team]) for team in all_teams}
+        for home, away in self.remaining_teams:
+            self.opponents[home].add(away)
+            self.opponents[away].add(home)
+
+        # Seeds only depend on the results of all of the remaining games,
+        # so they're shared between every team & outcome being searched.
+        self.seeds_cache = TiebreakCache(seeds_cache_size)
+        self.status_cache = TiebreakCache(status_cache_size)
+
+    # (decided games, games the away team won) as bitmasks over the remaining games
+    def get_scenario_key(self, scenario):
+        decided = away_wins = 0
+        for game_idx, winner in scenario.items():
+            decided |= 1 << game_idx
+            if winner != self.remaining_teams[game_idx][0]:
+                away_wins |= 1 << game_idx
+        return decided, away_wins
+
+    # Min & max possible records for every team, given some of the remaining results
+    def get_record_bounds(self, scenario):
+        min_records = self.played_records.copy()
+        max_records = self.played_records.copy()
+        for game_idx, teams in enumerate(self.remaining_teams):
+            if game_idx in scenario:
+                min_records[scenario[game_idx]] += 1.0
+                max_records[scenario[game_idx]] += 1.0
+            else:
+                for team in teams:
+                    max_records[team] += 1.0
+        return min_records, max_records
+
+    # Returns True/False if the record bounds alone decide whether the
+    # team gets the outcome, otherwise None.
+    def get_bound_status(self, team, outcome, scenario):
+        min_records, max_records = self.get_record_bounds(scenario)
+        rivals = [rival for rival in divisions[team_division[team]] if rival != team]
+        others = [other for other in conf_teams[team_conference[team]] if other != team]
+
+        # Strictly better/worse records, so the tiebreaks can't come into it. A
+        # rival that can only tie the team at the very end of both their ranges
+        # is a two team tie, & the head-to-head & division games may already
+        # decide that.
+        level_rivals = [rival for rival in rivals if max_records[rival] == min_records[team]]
+        if all([min_records[team] > max_records[rival] for rival in rivals if rival not in level_rivals])\
+                and (not level_rivals or (len(level_rivals) == 1 and self.wins_level_tie(team, level_rivals[0], scenario))):
+            division = True
+        elif self.has_rival_ahead(team, rivals, min_records, max_records, scenario):
+            division = False
+        else:
+            division = None
+            level_rivals = [rival for rival in rivals if min_records[rival] == max_records[team]]
+            if len(level_rivals) == 1 and all([max_records[rival] < max_records[team] for rival in rivals if rival not in level_rivals])\
+                    and self.wins_level_tie(level_rivals[0], team, scenario):
+                division = False
+
+        # Not winning the division, a team still gets a Wild Card if fewer teams than
+        # there are Wild Cards could possibly catch it. Without the division, it's out
+        # if enough teams are guaranteed to finish ahead of it to take every seed.
+        # Whichever team wins a division finishes ahead of the rest of it, so of
+        # the teams in a division that finish ahead of the team, all but one can be
+        # after a Wild Card.
+        catching = {div: 0 for div in divisions}
+        ahead = {div: 0 for div in divisions}
+        for other in others:
+            catching[team_division[other]] += max_records[other] >= min_records[team]
+            ahead[team_division[other]] += min_records[other] > max_records[team]
+        min_wcs_ahead = sum([max(0, count - 1) for count in ahead.values()])
+        max_wcs_ahead = sum([max(0, count - 1) for count in catching.values()])
+        if division or max_wcs_ahead < self.num_wcs:
+            playoffs = True
+        elif division == False and (sum(ahead.values()) >= self.num_seeds or min_wcs_ahead >= self.num_wcs):
+            playoffs = False
+        else:
+            playoffs = None
+
+        if outcome == 'division':
+            return division
+        elif outcome == 'playoffs':
+            return playoffs
+        # The seed is one more than the number of division champs (or Wild Cards) ahead
+        # of the team, so it's out of reach if that can't come to seed - 1.
+        _, seed = outcome
+        if playoffs == False:
+            return False
+        if seed <= 4:
+            champs = [div for div in divisions if div != team_division[team]]
+            min_ahead = len([div for div in champs if ahead[div]])
+            max_ahead = len([div for div in champs if catching[div]])
+            if division == False or not min_ahead < seed <= max_ahead + 1:
+                return False
+        elif division == True or not min_wcs_ahead < seed - 4 <= max_wcs_ahead + 1:
+            return False
+        return None
+
+    # True if some rival has to finish with a better record than the team's
+    # best. Each rival can only win so many more games before it's ahead, & the
+    # rivals can't all stay under that if there are more games left among some
+    # of them than they can win between them.
+    def has_rival_ahead(self, team, rivals, min_records, max_records, scenario):
+        wins_left = {rival: math.floor(max_records[team] - min_records[rival]) for rival in rivals}
+        if any([wins < 0 for wins in wins_left.values()]):
+            return True
+        rival_games = [teams for game_idx, teams in enumerate(self.remaining_teams)
+            if game_idx not in scenario and all([other in wins_left for other in teams])]
+        for size in range(2, len(rivals) + 1):
+            for some_rivals in itertools.combinations(rivals, size):
+                num_games = len([teams for teams in rival_games if set(teams) <= set(some_rivals)])
+                if num_games > sum([wins_left[rival] for rival in some_rivals]):
+                    return True
+        return False
+
+    # True if the team wins the tiebreak against its division rival in the only
+    # way the two can finish level: the team losing every undecided game & the
+    # rival winning every one. Only the head-to-head & division records are
+    # checked, the first two steps after the records.
+    def wins_level_tie(self, team, rival, scenario):
+        h2h_records = {team: self.played_index.records_vs[team].get(rival, 0.0),
+            rival: self.played_index.records_vs[rival].get(team, 0.0)}
+        div_records = {team: self.played_index.div_records[team], rival: self.played_index.div_records[rival]}
+        for game_idx, teams in enumerate(self.remaining_teams):
+            if game_idx in scenario:
+                winner = scenario[game_idx]
+            elif rival in teams:
+                winner = rival
+            elif team in teams:
+                winner = teams[0] if teams[1] == team else teams[1]
+            else:
+                continue
+            loser = teams[0] if teams[1] == winner else teams[1]
+            if winner in h2h_records:
+                if loser in h2h_records:
+                    h2h_records[winner] += 1.0
+                if team_division[loser] == team_division[winner]:
+                    div_records[winner] += 1.0
+        if h2h_records[team] != h2h_records[rival]:
+            return h2h_records[team] > h2h_records[rival]
+        return div_records[team] > div_records[rival]
+
+    # The whole season, given the winner of every remaining game
+    def get_index(self, results):
+        games = []
+        for game, winner, teams in zip(self.remaining, results, self.remaining_teams):
+            loser = teams[0] if teams[1] == winner else teams[1]
+            pts_w, pts_l = unplayed_score
+            games.append(make_game(game.week, winner, loser, game.home, pts_w, pts_l, game.day))
+        return self.played_index.with_games(games)
+
+    # Returns (seeds, the OutsideStepSink groups for the outside_steps applied) for
+    # the conference, given the winner of every remaining game.
+    def get_seeds(self, conf, results):
+        key = (conf, self.get_scenario_key(dict(enumerate(results)))[1])
+        cached = self.seeds_cache.get(key)
+        if cached is None:
+            sink = OutsideStepSink()
+            tiebreak_events.add_sink(sink)
+            try:
+                cached = (get_seeds(self.get_index(results), conf, self.year), sink.get_groups())
+            finally:
+                tiebreak_events.remove_sink(sink)
+            self.seeds_cache.put(key, cached)
+        return cached
+
+    # Teams (including the team) whose records can end up level with the team's.
+    # Only the division can matter for winning it, the whole conference otherwise.
+    def get_level_teams(self, team, outcome, scenario):
+        min_records, max_records = self.get_record_bounds(scenario)
+        candidates = divisions[team_division[team]] if outcome == 'division' else conf_teams[team_conference[team]]
+        return [other for other in candidates
+            if min_records[other] <= max_records[team] and max_records[other] >= min_records[team]]
+
+    # Seeds & outside step groups with the home team winning all of the undecided games
+    def get_playout_seeds(self, team, scenario):
+        results = tuple([scenario.get(game_idx, teams[0]) for game_idx, teams in enumerate(self.remaining_teams)])
+        return self.get_seeds(team_conference[team], results)
+
+    # Whether the seeds get the team the outcome
+    def has_outcome(self, team, outcome, seeds):
+        if outcome == 'division':
+            return team in seeds[:4]
+        elif outcome == 'playoffs':
+            return team in seeds
+        _, seed = outcome
+        return len(seeds) >= seed and seeds[seed-1] == team
+
+    # Teams whose games the outside step looks at for the group: the opponents
+    # (whose records make up the strengths of victory & schedule), or every team
+    # in the points rankings.
+    def get_outside_teams(self, step, group):
+        if step == 'conf_combined_ranking_tiebreak':
+            return set(conf_teams[team_conference[next(iter(group))]])
+        elif step == 'combined_ranking_tiebreak':
+            return set(all_teams)
+        return set().union(*[self.opponents[other] for other in group])
+
+    # The (step, group, winner) of the outside step groups that can matter for
+    # the team's outcome, in the order the steps were applied: those with any of
+    # the level teams in them. Only the division tiebreaks decide the division.
+    def get_level_groups(self, outcome, level_teams, groups):
+        return [(step, group, winner) for step, tiebreak_type, group, winner in groups
+            if group & level_teams and (outcome != 'division' or tiebreak_type == 'div')]
+
+    # {opponent: weight} of the opponents' records in the team's strength of
+    # victory (wins against them) or schedule (games with them), once all of the
+    # team's games are decided
+    def get_strength_weights(self, step, team, scenario):
+        if step == 'strength_of_victory_tiebreak':
+            weights = self.played_index.wins_vs[team].copy()
+        else:
+            weights = self.played_index.games_vs[team].copy()
+        for game_idx, winner in scenario.items():
+            home, away = self.remaining_teams[game_idx]
+            if team in (home, away) and (team == winner or step == 'strength_of_schedule_tiebreak'):
+                opp = away if team == home else home
+                weights[opp] = weights.get(opp, 0) + 1
+        return weights
+
+    # Returns (difference, [(game number, home team's weights, away team's)]) for
+    # the team's strengths (one for each of steps) less the other's. The
+    # difference is with only the decided games counted, & each undecided game
+    # adds the weights of whichever of its teams wins it, so the difference is
+    # linear in the results. Only the games that can change it are listed. With
+    # both steps, differences are lists compared one after the other, same as
+    # the steps are applied, & that order adds up the same way numbers do.
+    def get_strength_diff(self, steps, team, other, scenario):
+        diff_weights = {}
+        for step_idx, step in enumerate(steps):
+            team_weights = self.get_strength_weights(step, team, scenario)
+            other_weights = self.get_strength_weights(step, other, scenario)
+            for opp in team_weights.keys() | other_weights.keys():
+                diff_weights.setdefault(opp, [0] * len(steps))[step_idx] =\
+                    team_weights.get(opp, 0) - other_weights.get(opp, 0)
+
+        decided_records, _ = self.get_record_bounds(scenario)
+        diff = [sum([opp_weights[step_idx] * decided_records[opp] for opp, opp_weights in diff_weights.items()])
+            for step_idx in range(len(steps))]
+        no_weights = [0] * len(steps)
+        game_diffs = []
+        for game_idx, (home, away) in enumerate(self.remaining_teams):
+            if game_idx in scenario:
+                continue
+            home_diff, away_diff = diff_weights.get(home, no_weights), diff_weights.get(away, no_weights)
+            if home_diff == away_diff:
+                diff = add_diffs(diff, home_diff)
+            else:
+                game_diffs.append((game_idx, home_diff, away_diff))
+        return diff, game_diffs
+
+    # True if the strength of victory/schedule step picks the same teams out of
+    # the group however the undecided games go: the teams that can't fall behind
+    # any other always come out level with each other & ahead of the rest. A pair
+    # that can come out level on strength of victory is settled too if the same
+    # team always comes out ahead on it & the strength of schedule after it.
+    def is_step_settled(self, step, group, scenario):
+        if step not in strength_steps:
+            return False
+        if any([group.intersection(teams) for game_idx, teams in enumerate(self.remaining_teams)
+                if game_idx not in scenario]):
+            return False
+
+        min_diffs = {}
+        for team in group:
+            for other in group - {team}:
+                min_diffs[team, other], _ = get_diff_range(*self.get_strength_diff([step], team, other, scenario))
+        survivors = [team for team in group if all([min_diffs[team, other] >= [0] for other in group if other != team])]
+        if survivors and all([min_diffs[team, other] > [0] for team in survivors for other in group
+                if other not in survivors]):
+            return True
+        if step == 'strength_of_victory_tiebreak' and len(group) == 2:
+            min_diff, max_diff = get_diff_range(*self.get_strength_diff(strength_steps, *group, scenario))
+            return min_diff > [0, 0] or max_diff < [0, 0]
+        return False
+
+    # Returns the tiebreaks for the unsettled groups in the order they were
+    # reached, or None unless they were all first reached on one of the
+    # strength_steps. A tiebreak is (step, teams of the group...) for the first
+    # step that isn't settled for the group.
+    def get_tiebreaks(self, outcome, level_teams, groups, scenario):
+        steps = {}
+        for step, group, _ in self.get_level_groups(outcome, level_teams, groups):
+            if group in steps or self.is_step_settled(step, group, scenario):
+                continue
+            if step not in strength_steps:
+                return None
+            steps[group] = step
+        return [(step,) + tuple(sorted(group)) for group, step in steps.items()]
+
+    # [(difference, game differences, strict)] for the winner of the tiebreak
+    # against each of the other teams in it, from get_strength_diff: ahead
+    # of them, or exactly level with those in level_with. Coming out ahead of
+    # all of them gets the winner through the step, or for a pair, through the
+    # rest of the strength_steps after it if they're level on it. Coming out
+    # level with some of them starts the tiebreak over with just those.
+    def get_tiebreak_constraints(self, tiebreak, winner, level_with, scenario):
+        step, *group = tiebreak
+        steps = strength_steps[strength_steps.index(step):] if len(group) == 2 else [step]
+        constraints = []
+        for other in group:
+            if other == winner:
+                continue
+            diff, game_diffs = self.get_strength_diff(steps, winner, other, scenario)
+            if other in level_with:
+                constraints += [(diff, game_diffs, False), (negate_diff(diff),
+                    [(game_idx, negate_diff(home_diff), negate_diff(away_diff)) for game_idx, home_diff, away_diff in game_diffs], False)]
+            else:
+                constraints.append((diff, game_diffs, True))
+        return constraints
+
+    # Seeds & outside step groups for some way of playing out the rest of the
+    # games that meets the constraints of the [(tiebreak, winner, level_with)],
+    # or None if there isn't one
+    def get_tiebreak_playout(self, team, scenario, witnesses):
+        constraints = [constraint for tiebreak, winner, level_with in witnesses
+            for constraint in self.get_tiebreak_constraints(tiebreak, winner, level_with, scenario)]
+        sides = find_playout_sides(constraints)
+        if sides is None:
+            return None
+        playout = {game_idx: self.remaining_teams[game_idx][side] for game_idx, side in sides.items()}
+        return self.get_playout_seeds(team, {**scenario, **playout})
+
+    # Tiebreak results are (tiebreak, winner) for the group's tiebreak from the
+    # step on (see get_tiebreaks) picking the winner.
+    #
+    # Returns the minimal (clinching, eliminating) sets of tiebreak results that
+    # decide the outcome, on top of the scenario & the results of the witnesses,
+    # found the same way as find_scenarios, or None if the rest of the games
+    # don't come down to those. The playout is some way of playing out the rest
+    # that gives the results (see get_winner_scenarios), & it goes on through the
+    # first unsettled tiebreak it reaches that isn't among them yet, if any.
+    # Every way of playing them out that gives the results goes through the same
+    # tiebreaks up to that one, since the ones before it are all either settled
+    # or among the results.
+    def get_tiebreak_scenarios(self, team, outcome, level_teams, scenario, witnesses=(), playout=None):
+        seeds, groups = playout or self.get_playout_seeds(team, scenario)
+        tiebreaks = self.get_tiebreaks(outcome, level_teams, groups, scenario)
+        if tiebreaks is None:
+            return None
+        for tiebreak in tiebreaks:
+            if tiebreak in [witness[0] for witness in witnesses]:
+                continue
+            branches = []
+            for winner in tiebreak[1:]:
+                found = self.get_winner_scenarios(team, outcome, level_teams, scenario, witnesses, tiebreak, winner)
+                if found is None:
+                    return None
+                branches.append(((tiebreak, winner), found))
+            return combine_branches(branches)
+        status = self.has_outcome(team, outcome, seeds)
+        return {status: {frozenset()}, not status: set()}
+
+    # get_tiebreak_scenarios with the tiebreak picking the winner too, or no
+    # scenarios if it can't. The winner has to come out ahead of the rest of
+    # the group, or level with some of them, & then get picked when the tiebreak
+    # starts over with just those. If the tiebreak doesn't get past the group's
+    # own games then, it picks the same team every time they're level. Coming
+    # out level with all of them isn't looked into any further.
+    def get_winner_scenarios(self, team, outcome, level_teams, scenario, witnesses, tiebreak, winner):
+        others = [other for other in tiebreak[1:] if other != winner]
+        for num_level in range(len(others)):
+            for level_with in itertools.combinations(others, num_level):
+                winner_witnesses = witnesses + ((tiebreak, winner, frozenset(level_with)),)
+                playout = self.get_tiebreak_playout(team, scenario, winner_witnesses)
+                if playout is None:
+                    continue
+                winners = {(step,) + tuple(sorted(group)): group_winner for step, _, group, group_winner in playout[1]}
+                if all([winners.get(witness[0]) == witness[1] for witness in winner_witnesses]):
+                    return self.get_tiebreak_scenarios(team, outcome, level_teams, scenario, winner_witnesses, playout)
+                restart = {winner, *level_with}
+                if not level_with or any([winners.get(witness[0]) != witness[1] for witness in witnesses])\
+                        or any([group <= restart for _, _, group, _ in playout[1]]):
+                    return None
+        if self.get_tiebreak_playout(team, scenario, witnesses + ((tiebreak, winner, frozenset(others)),)) is not None:
+            return None
+        return {True: set(), False: set()}
+
+    # The team's own games first, then the rest of its conference, then everyone else.
+    # Going through the most relevant games first lets the bounds kick in sooner.
+    def get_game_order(self, team):
+        if team in self.game_orders:
+            return self.game_orders[team]
+
+        def relevance(game_idx):
+            teams = self.remaining_teams[game_idx]
+            if team in teams:
+                return 0
+            elif any([team_division[other] == team_division[team] for other in teams]):
+                return 1
+            elif any([team_conference[other] == team_conference[team] for other in teams]):
+                return 2
+            return 3
+        self.game_orders[team] = sorted(range(len(self.remaining)), key=relevance)
+        return self.game_orders[team]
+
+    # Returns (the next undecided game that can change where the team finishes,
+    # tiebreak scenarios). The games are the team's own & those of teams whose
+    # records can end up level with it, then the games that any unsettled outside
+    # steps applied to the level teams' tie groups look at. The game is None once
+    # the outcome doesn't depend on any of the undecided games, or if it only
+    # depends on them through the tiebreaks of get_tiebreak_scenarios, which are
+    # returned instead.
+    #
+    # Only the record bounds are needed until the level teams' games are all
+    # decided. After that, the rest of the games are played out to find the tie
+    # groups, & there's no need to go any further unless one of them is unsettled.
+    def get_next_game(self, team, outcome, scenario):
+        level_teams = set(self.get_level_teams(team, outcome, scenario))
+        undecided = [game_idx for game_idx in self.get_game_order(team) if game_idx not in scenario]
+        for game_idx in undecided:
+            if level_teams.intersection(self.remaining_teams[game_idx]):
+                return game_idx, None
+        if not undecided:
+            return None, None
+
+        _, playout_groups = self.get_playout_seeds(team, scenario)
+        unsettled = [(step, group) for step, group, _ in self.get_level_groups(outcome, level_teams, playout_groups)
+            if not self.is_step_settled(step, group, scenario)]
+        if not unsettled:
+            return None, None
+        tiebreak_found = self.get_tiebreak_scenarios(team, outcome, level_teams, scenario)
+        if tiebreak_found is not None:
+            return None, tiebreak_found
+        outside_teams = set().union(*[self.get_outside_teams(step, group) for step, group in unsettled])
+        for game_idx in undecided:
+            if outside_teams.intersection(self.remaining_teams[game_idx]):
+                return game_idx, None
+        return None, None
+
+    # True/False if every way the rest of the remaining games can go
+    # does/doesn't get the team the outcome, otherwise MIXED.
+    def get_status(self, team, outcome, scenario):
+        key = (team, outcome, self.get_scenario_key(scenario))
+        status = self.status_cache.get(key)
+        if status is not None:
+            return status
+
+        status = self.get_bound_status(team, outcome, scenario)
+        if status is None:
+            game_idx, tiebreak_found = self.get_next_game(team, outcome, scenario)
+            if tiebreak_found is not None:
+                statuses = [status for status, found in tiebreak_found.items() if found]
+                status = statuses[0] if len(statuses) == 1 else MIXED
+            elif game_idx is None:
+                seeds, _ = self.get_playout_seeds(team, scenario)
+                status = self.has_outcome(team, outcome, seeds)
+            else:
+                for winner in self.remaining_teams[game_idx]:
+                    branch_status = self.get_status(team, outcome, {**scenario, game_idx: winner})
+                    if status is None:
+                        status = branch_status
+                    elif branch_status != status:
+                        status = MIXED
+                    if status == MIXED:
+                        break
+
+        self.status_cache.put(key, status)
+        return status
+
+    # Returns the minimal (clinching, eliminating) scenarios for the team & outcome.
+    # Where the outcome only depends on the rest of the games through tiebreaks,
+    # the scenarios are finished off with tiebreak results (see
+    # get_tiebreak_scenarios) instead of going through all of the games.
+    def find_scenarios(self, team, outcome):
+        def search(scenario):
+            status = self.get_status(team, outcome, scenario)
+            if status != MIXED:
+                return {status: {frozenset()}, not status: set()}
+            game_idx, tiebreak_found = self.get_next_game(team, outcome, scenario)
+            if tiebreak_found is not None:
+                return tiebreak_found
+            return combine_branches([((game_idx, winner), search({**scenario, game_idx: winner}))
+                for winner in self.remaining_teams[game_idx]])
+        found = search({})
+
+        def ordered(scenarios):
+            return [dict(sorted(scenario, key=get_result_order))
+                for scenario in sorted(scenarios, key=lambda s: (len(s), sorted(map(get_result_order, s))))]
+        return ordered(found[True]), ordered(found[False])
+
+    def describe(self, scenario):
+        if not scenario:
+            return 'already decided'
+        results = []
+        for key, winner in scenario.items():
+            if isinstance(key, tuple):
+                step, *group = key
+                others = ', '.join([other for other in group if other != winner])
+                results.append(f"{winner} ahead of {others} on the tiebreaks from {strength_names[step]} on")
+            else:
+                home, away = self.remaining_teams[key]
+                loser = home if winner == away else away
+                results.append(f"Wk {self.remaining[key].week} {winner} over {loser}")
+        return ', '.join(results)
+
+# Game results first, then tiebreak results
+def get_result_order(result):
+    key, winner = result
+    return (isinstance(key, tuple), key, winner)
+
+# Minimal (clinching, eliminating) scenarios given [(result, minimal scenarios)]
+# for each way a game or tiebreak can go. Every minimal scenario either has one
+# of the results, & is one of that way's own with it added, or holds every way,
+# & is one from each put together. Ways that can't happen are left out, & if
+# that only leaves one, its scenarios are left as they are.
+def combine_branches(branches):
+    branches = [(result, found) for result, found in branches if any(found.values())]
+    if len(branches) == 1:
+        return branches[0][1]
+
+    found = {}
+    for status in [True, False]:
+        candidates = {scenario | {result} for result, branch_found in branches for scenario in branch_found[status]}
+        for branch_scenarios in itertools.product(*[branch_found[status] for _, branch_found in branches]):
+            combined = frozenset().union(*branch_scenarios)
+            if len(dict(combined)) == len(combined):
+                candidates.add(combined)
+        found[status] = {candidate for candidate in candidates
+            if not any([other < candidate for other in candidates])}
+    return found
+
+def add_diffs(diff, other_diff):
+    return [value + other_value for value, other_value in zip(diff, other_diff)]
+
+# Lowest & highest the difference from get_strength_diff can come out. Since
+# the games are independent, that's the lowest/highest each game can add.
+def get_diff_range(diff, game_diffs):
+    min_diff = max_diff = diff
+    for _, home_diff, away_diff in game_diffs:
+        min_diff = add_diffs(min_diff, min(home_diff, away_diff))
+        max_diff = add_diffs(max_diff, max(home_diff, away_diff))
+    return min_diff, max_diff
+
+def negate_diff(diff):
+    return [-value for value in diff]
+
+# Returns {game number: 0 for the home team winning, 1 for the away team} for
+# the games in the [(difference, game differences, strict)] (see
+# get_strength_diff) that leaves every difference above 0 (at least 0 if not
+# strict), or None if none does. Goes through the games one at a time, giving
+# up on the partial sums the games after them can't bring up far enough.
+def find_playout_sides(constraints):
+    game_diffs = {}
+    for constraint_idx, (_, constraint_game_diffs, _) in enumerate(constraints):
+        for game_idx, home_diff, away_diff in constraint_game_diffs:
+            game_diffs.setdefault(game_idx, {})[constraint_idx] = (home_diff, away_diff)
+    game_ids = sorted(game_diffs)
+
+    # Highest each difference can be raised by the games from each one on
+    max_after = [[[0] * len(diff) for diff, _, _ in constraints]]
+    for game_idx in reversed(game_ids):
+        max_after.append([add_diffs(total, max(game_diffs[game_idx][constraint_idx]))
+            if constraint_idx in game_diffs[game_idx] else total for constraint_idx, total in enumerate(max_after[-1])])
+    max_after.reverse()
+
+    def is_enough(diff, strict):
+        return diff > [0] * len(diff) if strict else diff >= [0] * len(diff)
+
+    failed = set()
+    def search(idx, diffs):
+        key = (idx, tuple(map(tuple, diffs)))
+        if key in failed or not all([is_enough(add_diffs(diff, most), strict)
+                for diff, most, (_, _, strict) in zip(diffs, max_after[idx], constraints)]):
+            return None
+        if idx == len(game_ids):
+            return {}
+        game_idx = game_ids[idx]
+        # The side more of the differences do better with first
+        away_first = sum([away_diff > home_diff for home_diff, away_diff in game_diffs[game_idx].values()]) * 2 >\
+            len(game_diffs[game_idx])
+        for side in [1, 0] if away_first else [0, 1]:
+            sides = search(idx + 1, [add_diffs(diff, game_diffs[game_idx][constraint_idx][side])
+                if constraint_idx in game_diffs[game_idx] else diff for constraint_idx, diff in enumerate(diffs)])
+            if sides is not None:
+                sides[game_idx] = side
+                return sides
+        failed.add(key)
+        return None
+    return search(0, [diff for diff, _, _ in constraints])
+
+
+# Returns {team: {outcome: (clinching scenarios, eliminating scenarios)}}
+# for the given teams (default: all) after the given week.
+def find_season_scenarios(year, week, teams=None):
+    games, _ = load_year(year)
+    search = ScenarioSearch(year, *split_season(games, week))
+    num_seeds = search.num_seeds
+
+    scenarios = {}
+    for team in teams or all_teams:
+        outcomes = ['division', 'playoffs'] + [('seed', seed) for seed in range(1, num_seeds+1)]
+        scenarios[team] = {outcome: search.find_scenarios(team, outcome) for outcome in outcomes}
+    return search, scenarios
+
+
+if __name__ == '__main__':
+    import sys
+    year, week = int(sys.argv[1]), int(sys.argv[2])
+    search, scenarios = find_season_scenarios(year, week, sys.argv[3:] or None)
+    for team, team_scenarios in scenarios.items():
+        print(team)
+        for outcome, (clinches, eliminations) in team_scenarios.items():
+            outcome = outcome if isinstance(outcome, str) else f'#{outcome[1]} seed'
+            for scenario in clinches:
+                print(f"\tClinches {outcome}: {search.describe(scenario)}")
+            for scenario in eliminations:
+                print(f"\tEliminated from {outcome}: {search.describe(scenario)}")
@@ -1,7 +1,10 @@
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import os
 
 from load_schedules import *
 from nfl_tiebreakers import *
+from season_arrays import *
 
 
 # Starting in 2002, this rotation repeats every 3 years.
@@ -16,7 +19,7 @@ intraconf_matchup_rotation = [  {'W': 'E', 'E': 'W', 'N': 'S', 'S': 'N'},
 interconf_matchup_rotation = [  {'AFCE': 'NFCE', 'AFCN': 'NFCW', 'AFCS': 'NFCS', 'AFCW': 'NFCN'},
                                 {'AFCE': 'NFCW', 'AFCN': 'NFCE', 'AFCS': 'NFCN', 'AFCW': 'NFCS'},
                                 {'AFCE': 'NFCS', 'AFCN': 'NFCN', 'AFCS': 'NFCW', 'AFCW': 'NFCE'},
-                                {'AFCE': 'NFCN', 'AFCN': 'NFCS', 'AFCS': 'NFCE', 'AFCW': 'NFCN'}]
+                                {'AFCE': 'NFCN', 'AFCN': 'NFCS', 'AFCS': 'NFCE', 'AFCW': 'NFCW'}]
 # Add the reverse for ease-of-use
 for year in interconf_matchup_rotation:
     for k, v in year.copy().items():
@@ -66,9 +69,9 @@ def get_intraconference_ranked_opponents(year, prev_div_rankings):
 
 def get_schedules_without_17th(schedules, year, prev_div_rankings):
     assert year >= 2021
+    interconf_opps = get_interconference_ranked_opponents(year, prev_div_rankings)
     new_schedules = {}
     for team, games in schedules.items():
-        interconf_opps = get_interconference_ranked_opponents(year, prev_div_rankings)
         new_schedules[team] = [game for game in games\
             if get_game_opponent(game, team) != interconf_opps[team]]
         assert len(new_schedules[team]) == len(schedules[team]) - 1
@@ -80,15 +83,33 @@ def get_schedules_without_ranked_opps(schedules, year, prev_div_rankings):
     if year >= 2021:
         schedules = get_schedules_without_17th(schedules, year, prev_div_rankings)
 
+    intraconf_opps = get_intraconference_ranked_opponents(year, prev_div_rankings)
     new_schedules = {}
     for team, games in schedules.items():
-        intraconf_opps = get_intraconference_ranked_opponents(year, prev_div_rankings)
         new_schedules[team] = [game for game in games\
             if get_game_opponent(game, team) not in intraconf_opps[team]]
         assert len(new_schedules[team]) == len(schedules[team]) - len(intraconf_opps[team])
 
     return new_schedules
 
+# The same two counterfactuals as above, as masks of the games in the table
+# that are kept. Returns {'no17': mask, 'norank': mask}, without 'no17' before 2021.
+def get_counterfactual_masks(table, year, prev_div_rankings):
+    masks = {}
+    ranked_games = table.get_matchup_mask(get_intraconference_ranked_opponents(year, prev_div_rankings))
+    if year >= 2021:
+        interconf_games = table.get_matchup_mask(get_interconference_ranked_opponents(year, prev_div_rankings))
+        masks['no17'] = ~interconf_games
+        ranked_games |= interconf_games
+    masks['norank'] = ~ranked_games
+
+    # Every team loses the same number of games (1 for the 17th game, 2 more for the ranked ones)
+    all_games = table.get_all_games_mask()
+    for variant, mask in masks.items():
+        removed = table.get_game_counts(all_games) - table.get_game_counts(mask)
+        assert (removed == (1 if variant == 'no17' else (3 if year >= 2021 else 2))).all()
+    return masks
+
 def verify_ranked_games(schedules, year, prev_div_rankings):
     assert year >= 2002
     intraconf_opps = get_intraconference_ranked_opponents(year, prev_div_rankings)
@@ -104,62 +125,91 @@ def verify_ranked_games(schedules, year, prev_div_rankings):
             assert interconf_opps[team] in opps
         
 
-def list_teams(games):
-    teams = set()
-    for game in games:
-        teams.add(game['Winner']) 
-        teams.add(game['Loser'])
-    return teams
-
-def team_schedules(games, year):
-    schedules = {} 
-    for team in list_teams(games):
-        schedules[team] = [game for game in games if team in [game['Loser'], game['Winner']]]
-        assert len(schedules[team]) == 16 if year < 2021 else 17
-    return schedules
-
-
-def main():
-    # TODO Handle the 2002 realignment corner case 
-    prev_div_rankings = None
-    for year in range(2002, 2021+1):
-        games, playoff_games = load_year(year)
-        schedules = team_schedules(games, year)
-        div_rankings = rank_divisions(schedules)
-
-        print(f'{year}: Number of games, {len(games)}', end='; ')
-        print("Teams, ", len(list_teams(games)))
-
-        def print_seeds(conf):
-            seeds_without_17th, seeds_without_ranked_opps = None, None
-            seeds = get_seeds(schedules, conf, year)
-            verify_seeds(playoff_games, seeds)
-
-            # TODO Remove the if-statement once 2002 realignment is handled
-            if prev_div_rankings is not None:
-                verify_ranked_games(schedules, year, prev_div_rankings)
-
-                if year >= 2021:
-                    schedules_without_17th = get_schedules_without_17th(schedules, year, prev_div_rankings)
-                    seeds_without_17th = get_seeds(schedules_without_17th, conf, year)
-
-                schedules_without_ranked_opps = get_schedules_without_ranked_opps(schedules, year, prev_div_rankings)
-                seeds_without_ranked_opps = get_seeds(schedules_without_ranked_opps, conf, year)
-
-            print(f"\t{conf} Playoff Seeds:", seeds)
-            if seeds_without_17th is not None and seeds_without_17th != seeds:
-                print(f"No 17th {conf} Playoff Seeds:", seeds_without_17th)
-            if seeds_without_ranked_opps is not None and seeds_without_ranked_opps != seeds:
-                print(f"No rank {conf} Playoff Seeds:", seeds_without_ranked_opps)
-
-        print_seeds('AFC')
-        print_seeds('NFC')
-        print("\tDivision rankings:", div_rankings)
-        
-        prev_div_rankings = div_rankings
+
+# Phase one of the pipeline. Only needs the year's own games.
+def rank_year(year):
+    games, _ = load_year(year)
+    return rank_divisions(team_schedules(games, year))
+
+# Phase two of the pipeline. Everything else for the year, which needs
+# the previous year's division rankings to find the ranked games.
+def analyze_year(year, prev_div_rankings):
+    games, playoff_games = load_year(year)
+    # Index once up front, rather than once per get_seeds call
+    season = team_schedules(games, year, playoff_games)
+    schedules = SeasonIndex(season)
+
+    # Both counterfactuals are views of the same games, evaluated in one batch
+    counterfactuals = {}
+    # TODO Remove the if-statement once 2002 realignment is handled
+    if prev_div_rankings is not None:
+        verify_ranked_games(schedules, year, prev_div_rankings)
+        table = GameTable(games)
+        masks = get_counterfactual_masks(table, year, prev_div_rankings)
+        counterfactuals = dict(zip(masks, table.get_indexes(list(masks.values()))))
+
+    analysis = {'num_games': len(games), 'num_teams': len(list_teams(games))}
+    for conf in ['AFC', 'NFC']:
+        seeds = get_seeds(schedules, conf, year)
+        verify_seeds(season, seeds)
+        seeds_without_17th, seeds_without_ranked_opps = None, None
+        if 'no17' in counterfactuals:
+            seeds_without_17th = get_seeds(counterfactuals['no17'], conf, year)
+        if 'norank' in counterfactuals:
+            seeds_without_ranked_opps = get_seeds(counterfactuals['norank'], conf, year)
+
+        analysis[conf] = (seeds, seeds_without_17th, seeds_without_ranked_opps)
+    return analysis
+
+# Yields (year, div_rankings, analysis) in year order.
+#
+# Ranking the divisions only needs each year's own games, so every year is
+# ranked in parallel first. Then the rest of each year, which depends on the
+# previous year's rankings, is fanned out. With a single worker, it all runs
+# in-process one year at a time (in the same order as the trace output).
+#
+# Years have to be consecutive. prev_div_rankings are the division rankings of
+# the year before the first one, without which its counterfactuals are skipped.
+def analyze_years(years, workers=None, prev_div_rankings=None):
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for year in years:
+            div_rankings = rank_year(year)
+            yield year, div_rankings, analyze_year(year, prev_div_rankings)
+            prev_div_rankings = div_rankings
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        all_div_rankings = list(executor.map(rank_year, years))
+        # TODO Handle the 2002 realignment corner case
+        all_prev_div_rankings = [prev_div_rankings] + all_div_rankings[:-1]
+        analyses = executor.map(analyze_year, years, all_prev_div_rankings)
+        yield from zip(years, all_div_rankings, analyses)
+
+def print_analysis(year, div_rankings, analysis):
+    print(f'{year}: Number of games, {analysis["num_games"]}', end='; ')
+    print("Teams, ", analysis['num_teams'])
+
+    for conf in ['AFC', 'NFC']:
+        seeds, seeds_without_17th, seeds_without_ranked_opps = analysis[conf]
+        print(f"\t{conf} Playoff Seeds:", seeds)
+        if seeds_without_17th is not None and seeds_without_17th != seeds:
+            print(f"No 17th {conf} Playoff Seeds:", seeds_without_17th)
+        if seeds_without_ranked_opps is not None and seeds_without_ranked_opps != seeds:
+            print(f"No rank {conf} Playoff Seeds:", seeds_without_ranked_opps)
+
+    print("\tDivision rankings:", div_rankings)
+
+def main(workers=None):
+    for year, div_rankings, analysis in analyze_years(range(2002, 2021+1), workers):
+        print_analysis(year, div_rankings, analysis)
 
 if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == 'trace':
-        trace_on = True
-    main()
+        # Tracing only makes sense with everything in one process.
+        import tiebreak_events
+        tiebreak_events.add_sink(tiebreak_events.TextSink())
+        main(workers=1)
+    else:
+        main()
@@ -0,0 +1,213 @@
+import numpy as np
+
+from load_schedules import *
+from nfl_tiebreakers import *
+from season_index import *
+
+
+# Dense NumPy version of SeasonIndex. Teams are numbered by team_ids and a
+# season becomes a handful of 32x32 matrices, indexed [team, opponent]:
+#   wins:    number of times team beat opponent
+#   ties:    number of ties between the two
+#   results: wins + 0.5 * ties (i.e. record against opponent)
+#   played:  number of games between the two
+#   points:  points scored by team against opponent (points.T is points allowed)
+#
+# Records, head-to-head subsets, common opponents, SoV & SoS are array
+# operations over those. It's still a SeasonIndex (& a schedules dict), so
+# get_seeds & rank_divisions run the exact same tiebreak steps over it:
+#
+#   get_seeds(SeasonArrays(team_schedules(games, year)), 'AFC', year)
+#
+# SeasonArrays can also be views of a GameTable (see below), in which case
+# they only have the aggregates & not the per-team lists of games.
+#
+# equivalence_checks.py checks both against SeasonIndex over generated seasons.
+class SeasonArrays(SeasonIndex):
+    def __init__(self, schedules):
+        # Skip SeasonIndex.__init__, the aggregates are computed from the arrays instead.
+        dict.__init__(self, schedules)
+        self.fingerprint = None
+
+        # Each game shows up in two team schedules, only count it once.
+        games = {id(game): game for team_games in schedules.values() for game in team_games}
+        self.game_arrays = get_game_arrays(list(games.values()))
+        self.teams = [team for team in all_teams if team in schedules]
+        self.set_matrices(*get_game_matrices(*self.game_arrays))
+
+    # A view of (some of) the games of a GameTable, from already computed matrices
+    @classmethod
+    def from_matrices(cls, wins, ties, points, game_arrays):
+        index = cls.__new__(cls)
+        index.fingerprint = None
+        index.game_arrays = game_arrays
+        index.teams = all_teams
+        index.set_matrices(wins, ties, points)
+        return index
+
+    def set_matrices(self, wins, ties, points):
+        self.wins, self.ties, self.points = wins, ties, points
+        self.played = self.wins + self.wins.T + self.ties
+        self.results = self.wins + 0.5 * self.ties
+        self.ids = np.array([team_ids[team] for team in self.teams], dtype=np.intp)
+
+        self.record_vector = self.results.sum(axis=1)
+        self.points_for_vector = self.points.sum(axis=1)
+        self.points_against_vector = self.points.sum(axis=0)
+        self.div_record_vector = (self.results * same_division_mask).sum(axis=1)
+        self.conf_record_vector = (self.results * same_conference_mask).sum(axis=1)
+        self.sov_vector = self.wins @ self.record_vector
+        self.sos_vector = self.played @ self.record_vector
+
+        # The tiebreak steps look these up by team name. Going through
+        # tolist() keeps them plain Python numbers (so the trace reads the same).
+        def by_team(vector):
+            return dict(zip(self.teams, vector[self.ids].tolist()))
+        self.records = by_team(self.record_vector)
+        self.points_for = by_team(self.points_for_vector)
+        self.points_against = by_team(self.points_against_vector)
+        self.div_records = by_team(self.div_record_vector)
+        self.conf_records = by_team(self.conf_record_vector)
+        self.sov = by_team(self.sov_vector)
+        self.sos = by_team(self.sos_vector)
+        self.opponents = {team: set() for team in self.teams}
+        for team_id, opp_id in zip(*[ids.tolist() for ids in np.nonzero(self.played[self.ids])]):
+            self.opponents[self.teams[team_id]].add(all_teams[opp_id])
+
+    # Same as SeasonIndex's, but from the arrays (views don't have the games)
+    def get_fingerprint(self):
+        if self.fingerprint is None:
+            self.fingerprint = get_results_fingerprint(list(zip(*[array.tolist() for array in self.game_arrays])))
+        return self.fingerprint
+
+    def get_record_vs(self, team, opponents):
+        team_id, opp_ids = team_ids[team], get_team_id_array(opponents)
+        # Same as summing no games in the dict version
+        if not self.played[team_id, opp_ids].any():
+            return 0
+        return self.results[team_id, opp_ids].sum().item()
+
+    def get_games_vs(self, team, opponents):
+        return self.played[team_ids[team], get_team_id_array(opponents)].sum().item()
+
+    def get_net_points_vs(self, team, opponents):
+        team_id, opp_ids = team_ids[team], get_team_id_array(opponents)
+        return (self.points[team_id, opp_ids] - self.points[opp_ids, team_id]).sum().item()
+
+    def get_common_opponents(self, teams):
+        common = (self.played[get_team_id_array(teams)] > 0).all(axis=0)
+        return {all_teams[opp] for opp in np.flatnonzero(common)}
+
+
+def get_team_id_array(teams):
+    return np.array([team_ids[team] for team in teams], dtype=np.intp)
+
+def get_group_mask(groups):
+    mask = np.zeros((len(all_teams), len(all_teams)), dtype=bool)
+    for group_teams in groups:
+        ids = get_team_id_array(group_teams)
+        mask[np.ix_(ids, ids)] = True
+    return mask
+
+# [team, opponent] is True if the two are in the same division/conference
+same_division_mask = get_group_mask(divisions.values())
+same_conference_mask = get_group_mask(conf_teams.values())
+
+# (winner IDs, loser IDs, PtsW, PtsL) of the games, as arrays
+def get_game_arrays(games):
+    return (np.array([game.winner_id for game in games], dtype=np.intp),
+        np.array([game.loser_id for game in games], dtype=np.intp),
+        np.array([game.pts_w for game in games], dtype=np.int64),
+        np.array([game.pts_l for game in games], dtype=np.int64))
+
+# The wins, ties & points matrices (see SeasonArrays) of the games. For a batch
+# of seasons, pass the batch index of each game as batch_idx, & the matrices
+# get a leading batch dimension.
+def get_game_matrices(winners, losers, pts_w, pts_l, batch_idx=None, batch_size=None):
+    num_teams = len(all_teams)
+    if batch_idx is None:
+        shape, winner_idx, loser_idx = (num_teams, num_teams), (winners, losers), (losers, winners)
+    else:
+        shape = (batch_size, num_teams, num_teams)
+        winner_idx, loser_idx = (batch_idx, winners, losers), (batch_idx, losers, winners)
+    tied = pts_w == pts_l
+
+    # np.bincount over the flattened matrices is a good deal faster than np.add.at
+    def count(idx, weights=None):
+        counts = np.bincount(np.ravel_multi_index(idx, shape), weights, minlength=np.prod(shape))
+        return counts.astype(np.int64).reshape(shape)
+    wins = count(tuple([idx[~tied] for idx in winner_idx]))
+    ties = count(tuple([idx[tied] for idx in winner_idx]))
+    ties += np.swapaxes(ties, -1, -2)
+    points = count(winner_idx, pts_w) + count(loser_idx, pts_l)
+    return wins, ties, points
+
+
+# A season's games as one set of arrays, shared by any number of counterfactual
+# versions of it. A counterfactual is a boolean mask of the games that are kept
+# (& optionally different winners/losers/scores), and is evaluated as a
+# SeasonArrays view without building any per-team schedules.
+#
+#   table = GameTable(games)
+#   index = table.get_index(~table.get_matchup_mask({'KC': ['LV']}))
+#   get_seeds(index, 'AFC', year)
+class GameTable:
+    def __init__(self, games):
+        self.games = games
+        self.winners, self.losers, self.pts_w, self.pts_l = get_game_arrays(games)
+
+    def get_all_games_mask(self):
+        return np.ones(len(self.games), dtype=bool)
+
+    # Mask of the games between any of the given pairs of teams, as {team: opp or [opps]}
+    def get_matchup_mask(self, matchups):
+        pairs = np.zeros((len(all_teams), len(all_teams)), dtype=bool)
+        for team, opps in matchups.items():
+            for opp in [opps] if isinstance(opps, str) else opps:
+                pairs[team_ids[team], team_ids[opp]] = pairs[team_ids[opp], team_ids[team]] = True
+        return pairs[self.winners, self.losers]
+
+    # (winners, losers) with the results of the masked games flipped. The
+    # points go along with the result (the new winner gets PtsW).
+    def get_flipped(self, mask):
+        return np.where(mask, self.losers, self.winners), np.where(mask, self.winners, self.losers)
+
+    # Number of the masked games each team plays, indexed by team ID
+    def get_game_counts(self, mask):
+        num_teams = len(all_teams)
+        return np.bincount(self.winners[mask], minlength=num_teams) + np.bincount(self.losers[mask], minlength=num_teams)
+
+    def get_index(self, mask=None, winners=None, losers=None, pts_w=None, pts_l=None):
+        return self.get_indexes(None if mask is None else [mask], winners, losers, pts_w, pts_l)[0]
+
+    # Evaluates a batch of masks at once, returning a SeasonArrays view for each.
+    # Different winners/losers/scores can be given either for the whole batch
+    # (one per game) or for each mask (a row per mask).
+    def get_indexes(self, masks=None, winners=None, losers=None, pts_w=None, pts_l=None):
+        masks, results, matrices = self.get_batch_matrices(masks, winners, losers, pts_w, pts_l)
+        return [self.get_row_index(masks, results, matrices, row) for row in range(len(masks))]
+
+    # Returns (masks, results, (wins, ties, points)) for a batch, same arguments
+    # as get_indexes. The masks & results are broadcast to a row per mask, &
+    # the matrices have a leading batch dimension.
+    def get_batch_matrices(self, masks=None, winners=None, losers=None, pts_w=None, pts_l=None):
+        if masks is None:
+            # Every game, in as many rows as there are rows of results
+            num_rows = max([len(array) for array in [winners, losers, pts_w, pts_l] if np.ndim(array) == 2] + [1])
+            masks = np.ones((num_rows, len(self.games)), dtype=bool)
+        masks = np.atleast_2d(np.asarray(masks, dtype=bool))
+        results = []
+        for table_array, array in zip([self.winners, self.losers, self.pts_w, self.pts_l], [winners, losers, pts_w, pts_l]):
+            results.append(np.broadcast_to(table_array if array is None else array, masks.shape))
+        batch_idx, game_idx = np.nonzero(masks)
+        matrices = get_game_matrices(*[array[batch_idx, game_idx] for array in results], batch_idx, len(masks))
+        return masks, results, matrices
+
+    # SeasonArrays view of one row of get_batch_matrices
+    def get_row_index(self, masks, results, matrices, row):
+        game_arrays = tuple([array[row][masks[row]] for array in results])
+        return SeasonArrays.from_matrices(*[matrix[row] for matrix in matrices], game_arrays)
+
+# get_seeds for the conference in each of the counterfactuals
+def get_masked_seeds(table, masks, conf, year, **results):
+    return [get_seeds(index, conf, year) for index in table.get_indexes(masks, **results)]
@@ -0,0 +1,314 @@
+import random
+
+from schedule_analyzer import *
+
+
+# Synthetic seasons, scheduled the same way as the real ones:
+#   * Home & away against each division rival
+#   * Every team in one other division of the conference (intraconf_matchup_rotation)
+#   * Every team in one division of the other conference
+#   * The teams that finished in the same place the year before in the rest of
+#     the conference's divisions
+#   * From 2021 on, a 17th game against the team that finished in the same
+#     place in another division of the other conference (interconf_matchup_rotation)
+#
+# The previous year's finish comes from rank_divisions on the generated season
+# before it, so a stream of seasons schedules itself like the real ones do.
+#
+# The league doesn't have to be the NFL's. A League with more (or bigger)
+# divisions is scheduled by the same rules, with the division matchups rotated
+# round-robin style. Its games refer to teams by their index in league.teams,
+# so only the default league's games can be seeded with get_seeds (which is
+# built around the 32 team league).
+
+class League:
+    # conferences is {conf: {div: [teams]}}. Every division in a conference needs
+    # the same number of teams, and an even number of divisions per conference.
+    def __init__(self, conferences, intraconf_rotation=None, interconf_rotation=None):
+        self.conferences = conferences
+        self.divisions = {div: div_teams for conf_divs in conferences.values() for div, div_teams in conf_divs.items()}
+        self.teams = [team for div_teams in self.divisions.values() for team in div_teams]
+        self.team_ids = {team: idx for idx, team in enumerate(self.teams)}
+        self.intraconf_rotation = intraconf_rotation or get_intraconf_rotation(conferences)
+        self.interconf_rotation = interconf_rotation if interconf_rotation is not None else get_interconf_rotation(conferences)
+
+        for conf_divs in conferences.values():
+            assert len(conf_divs) % 2 == 0
+            assert len(set([len(div_teams) for div_teams in conf_divs.values()])) == 1
+
+    def get_conference(self, div):
+        for conf, conf_divs in self.conferences.items():
+            if div in conf_divs:
+                return conf
+
+    # True if this is the league the tiebreak engine is built around
+    def is_nfl(self):
+        return self.divisions == divisions
+
+    # Number of games each team plays, with the rotations as they are in the given year
+    def get_num_games(self, year):
+        conf_divs = next(iter(self.conferences.values()))
+        div_size = len(next(iter(conf_divs.values())))
+        num_games = 2 * (div_size - 1) + div_size + len(conf_divs) - 2
+        if self.interconf_rotation:
+            num_games += div_size + (1 if year >= 2021 else 0)
+        return num_games
+
+# Round-robin rounds (circle method) pairing up the given divisions. Each round
+# is a dict with both directions of every pairing.
+def get_round_robin_rounds(divs):
+    divs = list(divs)
+    rounds = []
+    for _ in range(len(divs) - 1):
+        matchups = {}
+        for idx in range(len(divs) // 2):
+            div, match_div = divs[idx], divs[-1-idx]
+            matchups[div], matchups[match_div] = match_div, div
+        rounds.append(matchups)
+        divs = [divs[0], divs[-1]] + divs[1:-1]
+    return rounds
+
+def get_intraconf_rotation(conferences):
+    conf_rounds = [get_round_robin_rounds(conf_divs) for conf_divs in conferences.values()]
+    rotation = []
+    for round_idx in range(len(conf_rounds[0])):
+        matchups = {}
+        for rounds in conf_rounds:
+            matchups.update(rounds[round_idx])
+        rotation.append(matchups)
+    return rotation
+
+# Only for two conferences with the same number of divisions, otherwise
+# there are no interconference games.
+def get_interconf_rotation(conferences):
+    if len(conferences) != 2:
+        return []
+    first_divs, second_divs = [list(conf_divs) for conf_divs in conferences.values()]
+    if len(first_divs) != len(second_divs):
+        return []
+    rotation = []
+    for shift in range(len(first_divs)):
+        matchups = {}
+        for idx, div in enumerate(first_divs):
+            match_div = second_divs[(idx + shift) % len(second_divs)]
+            matchups[div], matchups[match_div] = match_div, div
+        rotation.append(matchups)
+    return rotation
+
+# The NFL, scheduled with the rotations in schedule_analyzer
+nfl_league = League(
+    {conf: {div: div_teams for div, div_teams in divisions.items() if div.startswith(conf)} for conf in ['NFC', 'AFC']},
+    [{conf+div: conf+match_div for conf in ['NFC', 'AFC'] for div, match_div in matchups.items()}
+        for matchups in intraconf_matchup_rotation],
+    interconf_matchup_rotation)
+
+# Returns a league with the given shape. Teams are named after their division,
+# e.g. 'C0D1T2' is the 3rd team of the 2nd division of the 1st conference.
+def make_league(num_confs=2, divs_per_conf=4, teams_per_div=4):
+    conferences = {}
+    for conf_idx in range(num_confs):
+        conf = f'C{conf_idx}'
+        conferences[conf] = {f'{conf}D{div_idx}': [f'{conf}D{div_idx}T{team_idx}' for team_idx in range(teams_per_div)]
+            for div_idx in range(divs_per_conf)}
+    return League(conferences)
+
+
+# Score distributions are called with an RNG & return (winner's points, loser's points).
+# Each team's score is normally distributed (rounded, & never negative). A game
+# is a tie with probability tie_prob.
+class ScoreDist:
+    def __init__(self, tie_prob=0.005, mean_points=22.0, sd_points=10.0):
+        self.tie_prob = tie_prob
+        self.mean_points = mean_points
+        self.sd_points = sd_points
+
+    def sample_points(self, rng):
+        return max(0, round(rng.gauss(self.mean_points, self.sd_points)))
+
+    def __call__(self, rng):
+        if rng.random() < self.tie_prob:
+            pts = self.sample_points(rng)
+            return pts, pts
+        pts_a, pts_b = self.sample_points(rng), self.sample_points(rng)
+        while pts_a == pts_b:
+            pts_b = self.sample_points(rng)
+        return max(pts_a, pts_b), min(pts_a, pts_b)
+
+default_score_dist = ScoreDist()
+
+
+# Returns [(home, away)] for the year. prev_div_rankings is {div: teams from
+# first to last} for the year before, like rank_divisions returns.
+def get_matchups(league, year, prev_div_rankings):
+    matchups = []
+    # Alternates the home team between years & between pairs of teams
+    def add_game(team, opp):
+        if (year + league.team_ids[team] + league.team_ids[opp]) % 2:
+            matchups.append((team, opp))
+        else:
+            matchups.append((opp, team))
+
+    for div_teams in league.divisions.values():
+        for team in div_teams:
+            matchups += [(team, opp) for opp in div_teams if opp != team]
+
+    intraconf_divs = league.intraconf_rotation[(year-2002) % len(league.intraconf_rotation)]
+    for div, match_div in intraconf_divs.items():
+        for rank_idx, team in enumerate(league.divisions[div]):
+            # Each pair of divisions only once
+            if div < match_div:
+                for opp in league.divisions[match_div]:
+                    add_game(team, opp)
+
+            # Same place finishers of the divisions that aren't matched up this year
+            conf = league.get_conference(div)
+            for opp_div in league.conferences[conf]:
+                if opp_div not in [div, match_div] and div < opp_div:
+                    add_game(prev_div_rankings[div][rank_idx], prev_div_rankings[opp_div][rank_idx])
+
+    rotation = league.interconf_rotation
+    if rotation:
+        # The division each plays in full is half way around the rotation from
+        # the one its 17th game is against.
+        full_divs = rotation[(year-2021 + len(rotation)//2) % len(rotation)]
+        for div, match_div in full_divs.items():
+            if div < match_div:
+                for team in league.divisions[div]:
+                    for opp in league.divisions[match_div]:
+                        add_game(team, opp)
+
+        if year >= 2021:
+            assert len(rotation) > 1
+            ranked_divs = rotation[(year-2021) % len(rotation)]
+            for div, match_div in ranked_divs.items():
+                if div < match_div:
+                    for team, opp in zip(prev_div_rankings[div], prev_div_rankings[match_div]):
+                        add_game(team, opp)
+    return matchups
+
+# Spreads the games over the weeks so that no team plays twice in the same week.
+# When two teams have no open week in common, an open week of one team & an open
+# week of the other trade places along the chain of games played in them (as in
+# edge colouring), which frees up a week for both. If that can't be done either,
+# the game goes past num_weeks.
+def assign_weeks(matchups, num_weeks, rng):
+    order = list(range(len(matchups)))
+    rng.shuffle(order)
+    team_weeks = {}  # {team: {week: game index}}
+    weeks = [0] * len(matchups)
+
+    def get_chain(team, week, other_week):
+        chain = []
+        while week in team_weeks[team]:
+            game_idx = team_weeks[team][week]
+            chain.append(game_idx)
+            home, away = matchups[game_idx]
+            team = away if home == team else home
+            week, other_week = other_week, week
+        return chain, team
+
+    def swap_chain(chain, week, other_week):
+        for game_idx in chain:
+            for team in matchups[game_idx]:
+                del team_weeks[team][weeks[game_idx]]
+        for game_idx in chain:
+            weeks[game_idx] = other_week if weeks[game_idx] == week else week
+            for team in matchups[game_idx]:
+                team_weeks[team][weeks[game_idx]] = game_idx
+
+    for game_idx in order:
+        home, away = matchups[game_idx]
+        home_weeks, away_weeks = team_weeks.setdefault(home, {}), team_weeks.setdefault(away, {})
+        open_weeks = [week for week in range(1, num_weeks+1) if week not in home_weeks and week not in away_weeks]
+        if not open_weeks:
+            home_open = [week for week in range(1, num_weeks+1) if week not in home_weeks]
+            away_open = [week for week in range(1, num_weeks+1) if week not in away_weeks]
+            for week in home_open:
+                for other_week in away_open:
+                    # Frees week up for away, unless the chain runs back into home
+                    chain, end_team = get_chain(away, week, other_week)
+                    if end_team != home:
+                        swap_chain(chain, week, other_week)
+                        open_weeks = [week]
+                        break
+                if open_weeks:
+                    break
+        if not open_weeks:
+            week = num_weeks + 1
+            while week in home_weeks or week in away_weeks:
+                week += 1
+            open_weeks = [week]
+
+        weeks[game_idx] = rng.choice(open_weeks)
+        home_weeks[weeks[game_idx]] = game_idx
+        away_weeks[weeks[game_idx]] = game_idx
+    return weeks
+
+def generate_season(league, year, prev_div_rankings, rng, score_dist=default_score_dist):
+    matchups = get_matchups(league, year, prev_div_rankings)
+    # One bye week for everyone
+    weeks = assign_weeks(matchups, league.get_num_games(year) + 1, rng)
+    games = []
+    for (home, away), week in zip(matchups, weeks):
+        pts_w, pts_l = score_dist(rng)
+        home_id, away_id = league.team_ids[home], league.team_ids[away]
+        # Ties are listed with the home team as the winner, same as the CSVs
+        if pts_w == pts_l or rng.random() < 0.5:
+            games.append(Game(week, 6, home_id, away_id, True, pts_w, pts_l))
+        else:
+            games.append(Game(week, 6, away_id, home_id, False, pts_w, pts_l))
+    return games
+
+# {div: teams from first to last} for the season. Seasons in the NFL go
+# through rank_divisions. Custom leagues (or the rare NFL season that would
+# take a coin toss to rank) are ranked by record, then net points.
+def rank_season(league, games, year):
+    if league.is_nfl():
+        try:
+            return rank_divisions(team_schedules(games, year))
+        except UnresolvedTiebreak:
+            pass
+
+    records, net_points = [0.0] * len(league.teams), [0] * len(league.teams)
+    for game in games:
+        result = 0.5 if game.pts_w == game.pts_l else 1.0
+        records[game.winner_id] += result
+        records[game.loser_id] += 1.0 - result
+        net_points[game.winner_id] += game.pts_w - game.pts_l
+        net_points[game.loser_id] += game.pts_l - game.pts_w
+    def rank_key(team):
+        team_id = league.team_ids[team]
+        return (-records[team_id], -net_points[team_id], team_id)
+    return {div: sorted(div_teams, key=rank_key) for div, div_teams in league.divisions.items()}
+
+# Yields (year, games) for consecutive years, starting with start_year, forever
+# or for num_seasons. Each season is scheduled off of the previous one's
+# rankings (the first off of the league's own order), unless chain_rankings
+# is False, which skips ranking every season & is a good deal faster.
+def generate_seasons(start_year=2021, num_seasons=None, league=nfl_league,
+        score_dist=default_score_dist, seed=0, chain_rankings=True):
+    rng = random.Random(seed)
+    prev_div_rankings = {div: div_teams.copy() for div, div_teams in league.divisions.items()}
+    year = start_year
+    while num_seasons is None or year < start_year + num_seasons:
+        games = generate_season(league, year, prev_div_rankings, rng, score_dist)
+        yield year, games
+        if chain_rankings:
+            prev_div_rankings = rank_season(league, games, year)
+        year += 1
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    num_seasons = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    start = time.perf_counter()
+    for year, games in generate_seasons(num_seasons=num_seasons):
+        afc_seeds, nfc_seeds = None, None
+        try:
+            schedules = SeasonIndex(team_schedules(games, year))
+            afc_seeds, nfc_seeds = get_seeds(schedules, 'AFC', year), get_seeds(schedules, 'NFC', year)
+        except UnresolvedTiebreak as e:
+            print(f"{year}: {e!r}")
+        print(f"{year}: AFC {afc_seeds}, NFC {nfc_seeds}")
+    print(f"{num_seasons} seasons in {time.perf_counter() - start:.2f}s", file=sys.stderr)
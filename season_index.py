@@ -0,0 +1,189 @@
+import hashlib
+
+from load_schedules import *
+
+
+# Precomputed per-season aggregates. Every tiebreak step reads from this
+# instead of re-scanning each team's games every time the step is applied.
+#
+# This is a dict subclass ({team: games}, same as the output of team_schedules)
+# so it can be passed anywhere a schedules dict is expected. It assumes the
+# underlying games aren't modified once the index is built.
+class SeasonIndex(dict):
+    def __init__(self, schedules):
+        super().__init__(schedules)
+
+        self.records = {}         # {team: wins + 0.5 * ties}
+        self.opponents = {}       # {team: set of opponents}
+        self.games_vs = {}        # {team: {opp: number of games played}}
+        self.wins_vs = {}         # {team: {opp: number of wins against opp}}
+        self.records_vs = {}      # {team: {opp: record against opp}}
+        self.net_points_vs = {}   # {team: {opp: points scored - points allowed}}
+        self.points_for = {}
+        self.points_against = {}
+
+        self.fingerprint = None
+
+        for team, games in schedules.items():
+            self.add_team(team)
+            self.tally_games(team, games)
+        self.update_derived()
+
+    def add_team(self, team):
+        self.records[team] = 0.0
+        self.points_for[team], self.points_against[team] = 0, 0
+        for per_opp in [self.games_vs, self.wins_vs, self.records_vs, self.net_points_vs]:
+            per_opp[team] = {}
+        self.opponents[team] = set()
+
+    # Adds the games to the team's tallies (but not to the derived records below).
+    # With a sign of -1, takes them back out instead.
+    def tally_games(self, team, games, sign=1):
+        self.fingerprint = None
+        record, points_for, points_against = self.records[team], self.points_for[team], self.points_against[team]
+        games_vs, wins_vs = self.games_vs[team], self.wins_vs[team]
+        records_vs, net_points_vs = self.records_vs[team], self.net_points_vs[team]
+        # Same as game_result & get_game_opponent, inlined since this is
+        # run for every game of every (simulated or counterfactual) season.
+        team_id = team_ids[team]
+        for game in games:
+            pts_w, pts_l = game.pts_w, game.pts_l
+            won = game.winner_id == team_id
+            if won:
+                opp, scored, allowed = all_teams[game.loser_id], pts_w, pts_l
+            else:
+                assert game.loser_id == team_id
+                opp, scored, allowed = all_teams[game.winner_id], pts_l, pts_w
+
+            if pts_w == pts_l:
+                result = 0.5
+            elif won:
+                result = 1.0
+                wins_vs[opp] = wins_vs.get(opp, 0) + sign
+                if not wins_vs[opp]:
+                    del wins_vs[opp]
+            else:
+                result = 0.0
+
+            record += sign * result
+            points_for += sign * scored
+            points_against += sign * allowed
+            games_vs[opp] = games_vs.get(opp, 0) + sign
+            records_vs[opp] = records_vs.get(opp, 0.0) + sign * result
+            net_points_vs[opp] = net_points_vs.get(opp, 0) + sign * (scored - allowed)
+            # No games left against the opponent, so it's no longer an opponent at all
+            if not games_vs[opp]:
+                del games_vs[opp], records_vs[opp], net_points_vs[opp]
+
+        self.records[team] = record
+        self.points_for[team], self.points_against[team] = points_for, points_against
+        self.opponents[team] = set(games_vs)
+
+    # Division/conference records, SoV & SoS. These depend on other teams' games,
+    # so they're redone from the tallies whenever they change. By default for every
+    # team, otherwise only for the given teams (whose tallies or whose opponents' records
+    # changed, respectively).
+    def update_derived(self, tallied_teams=None, sov_teams=None):
+        if tallied_teams is None:
+            self.div_records, self.conf_records = {}, {}
+            self.sov, self.sos = {}, {}
+            tallied_teams = sov_teams = self
+
+        for team in tallied_teams:
+            self.div_records[team] = self.get_record_vs(team, divisions[team_division[team]])
+            self.conf_records[team] = self.get_record_vs(team, conf_teams[team_conference[team]])
+
+        # Beating (or playing) the same team twice counts their record twice.
+        records = self.records
+        for team in sov_teams:
+            self.sov[team] = sum([wins * records[opp] for opp, wins in self.wins_vs[team].items()], 0.0)
+            self.sos[team] = sum([played * records[opp] for opp, played in self.games_vs[team].items()], 0.0)
+
+    # Returns a new index with the given games added to this one's. Only the
+    # new games are tallied, & only the tallies of teams in them are copied.
+    def with_games(self, games):
+        new_games = {}
+        for game in games:
+            new_games.setdefault(game.winner, []).append(game)
+            new_games.setdefault(game.loser, []).append(game)
+
+        index = SeasonIndex.__new__(SeasonIndex)
+        dict.__init__(index, self)
+        index.fingerprint = None
+        index.records, index.opponents = self.records.copy(), self.opponents.copy()
+        index.points_for, index.points_against = self.points_for.copy(), self.points_against.copy()
+        index.games_vs, index.wins_vs = self.games_vs.copy(), self.wins_vs.copy()
+        index.records_vs, index.net_points_vs = self.records_vs.copy(), self.net_points_vs.copy()
+
+        for team, team_games in new_games.items():
+            if team in index:
+                index[team] = index[team] + team_games
+                for per_opp in [index.games_vs, index.wins_vs, index.records_vs, index.net_points_vs]:
+                    per_opp[team] = per_opp[team].copy()
+            else:
+                index[team] = team_games
+                index.add_team(team)
+            index.tally_games(team, team_games)
+        index.update_derived()
+        return index
+
+    # Identifies the season by the results of its games (regardless of which
+    # object or order they're in), e.g. for caching tiebreak results.
+    def get_fingerprint(self):
+        if self.fingerprint is None:
+            games = {id(game): game for team_games in self.values() for game in team_games}
+            self.fingerprint = get_results_fingerprint([(game.winner_id, game.loser_id, game.pts_w, game.pts_l)
+                for game in games.values()])
+        return self.fingerprint
+
+    # Record of team against just the given opponents
+    def get_record_vs(self, team, opponents):
+        records_vs = self.records_vs[team]
+        return sum([records_vs[opp] for opp in opponents if opp in records_vs])
+
+    def get_games_vs(self, team, opponents):
+        games_vs = self.games_vs[team]
+        return sum([games_vs[opp] for opp in opponents if opp in games_vs])
+
+    def get_net_points_vs(self, team, opponents):
+        net_points_vs = self.net_points_vs[team]
+        return sum([net_points_vs[opp] for opp in opponents if opp in net_points_vs])
+
+    def get_net_points(self, team):
+        return self.points_for[team] - self.points_against[team]
+
+    def get_common_opponents(self, teams):
+        return set.intersection(*[self.opponents[team] for team in teams])
+
+    # What ranking the teams depends on besides their own games: their SoV, SoS &
+    # points ranks (within the conference & the league). If this & the teams'
+    # games are the same in two seasons, so are the seeds/rankings of the teams.
+    def get_outside_stamp(self, teams):
+        league_pf_ranks, league_pa_ranks = get_point_ranks(self.points_for), get_point_ranks(self.points_against)
+        conf_pf_ranks, conf_pa_ranks = {}, {}
+        for conf_team_list in conf_teams.values():
+            conf_pf_ranks.update(get_point_ranks({team: self.points_for[team] for team in conf_team_list}))
+            conf_pa_ranks.update(get_point_ranks({team: self.points_against[team] for team in conf_team_list}))
+        return tuple([(self.sov[team], self.sos[team], league_pf_ranks[team], league_pa_ranks[team],
+            conf_pf_ranks[team], conf_pa_ranks[team]) for team in teams])
+
+
+# Returns {team: rank}, 1 being the most points. Tied teams share the best
+# rank, same as rank_teams (which isn't used here since it traces).
+def get_point_ranks(points):
+    # Index of the first (i.e. best ranked) team with each number of points
+    first_idx = {}
+    for idx, team_points in enumerate(sorted(points.values(), reverse=True)):
+        first_idx.setdefault(team_points, idx)
+    return {team: 1 + first_idx[team_points] for team, team_points in points.items()}
+
+# Fingerprint of a season's (winner ID, loser ID, PtsW, PtsL) results, in any order
+def get_results_fingerprint(results):
+    return hashlib.blake2b(repr(sorted(results)).encode(), digest_size=16).digest()
+
+# Returns the given schedules as a SeasonIndex, only building a new
+# index if it isn't one already.
+def get_season_index(schedules):
+    if isinstance(schedules, SeasonIndex):
+        return schedules
+    return SeasonIndex(schedules)
@@ -0,0 +1,245 @@
+import numpy as np
+
+from season_arrays import *
+
+
+# Seeds for a whole batch of outcomes of the same schedule at once. Row i of
+# the winners/losers (& optionally scores & masks, as for GameTable.get_indexes)
+# is one outcome of the season:
+#
+#   table = GameTable(games)
+#   seeds = get_seeds_batch(table, year, winners=winners, losers=losers)
+#   seeds['AFC']  # N x 7 team IDs (see team_ids), in seed order
+#
+# Groups of teams are [row, team] masks, & each tiebreak step narrows the group
+# of every row at once, with the same restarts as get_best_team. Only the steps
+# up to strength of schedule are done here. Any row with a tie that gets past
+# those is seeded by the scalar get_seeds on its SeasonArrays view instead, so
+# the results are always the same as get_seeds.
+#
+# rank_divisions_batch does the same for rank_divisions:
+#
+#   div_rankings = rank_divisions_batch(table, winners=winners, losers=losers)
+#   div_rankings['AFCW']  # N x 4 team IDs, first to last
+#
+# equivalence_checks.py checks both row by row against the dict path, with
+# rows that take the scalar fallback & rows that don't.
+
+batch_chunk_size = 1024
+
+# Team ID arrays of each conference's divisions, in divisions order
+conf_div_ids = {conf: [get_team_id_array(div_teams) for div, div_teams in divisions.items() if div.startswith(conf)]
+    for conf in conf_teams}
+
+# The teams of each group with the best value
+def get_best_of(group, values):
+    values = np.where(group, values, -np.inf)
+    return group & (values == values.max(axis=1, keepdims=True))
+
+# Batch versions of the tiebreak steps. Each takes the rows & their groups,
+# & returns the groups of teams that are left.
+def batch_record_step(standings, rows, group, tiebreak_type):
+    return get_best_of(group, standings.records[rows])
+
+def batch_head_to_head_step(standings, rows, group, tiebreak_type):
+    h2h_records = (standings.results[rows] * group[:, None, :]).sum(axis=2)
+    if tiebreak_type == 'div':
+        return get_best_of(group, h2h_records)
+
+    # For the Wild Card, one team beat every other team or one team lost to
+    # every other team. That's only ever one team if no two of the teams played
+    # more than once, so rows where they did are left to the scalar path.
+    played = standings.played[rows]
+    group_pairs = group[:, :, None] & group[:, None, :]
+    standings.fallback[rows[((played > 1) & group_pairs).any(axis=(1, 2))]] = True
+
+    num_teams = group.sum(axis=1)
+    beat_all = group & (h2h_records == (num_teams - 1)[:, None])
+    played_all = ((played > 0) | ~group_pairs | np.eye(len(all_teams), dtype=bool)).all(axis=2)
+    lost_to_all = group & (h2h_records == 0) & played_all
+    remaining = group.copy()
+    beat_rows = beat_all.any(axis=1)
+    remaining[beat_rows] = beat_all[beat_rows]
+    lost_rows = lost_to_all.any(axis=1) & ~beat_rows
+    remaining[lost_rows] &= ~lost_to_all[lost_rows]
+    return remaining
+
+def batch_div_step(standings, rows, group, tiebreak_type):
+    return get_best_of(group, standings.div_records[rows])
+
+def batch_conf_step(standings, rows, group, tiebreak_type):
+    return get_best_of(group, standings.conf_records[rows])
+
+def batch_common_games_step(standings, rows, group, tiebreak_type):
+    played = standings.played[rows]
+    # Opponents that every team of the group played
+    common = ((played > 0) | ~group[:, :, None]).all(axis=1)
+    remaining = get_best_of(group, (standings.results[rows] * common[:, None, :]).sum(axis=2))
+    if tiebreak_type == 'wc':
+        # Minimum of 4 common games
+        too_few = ~(group & ((played * common[:, None, :]).sum(axis=2) >= 4)).any(axis=1)
+        remaining[too_few] = group[too_few]
+    return remaining
+
+def batch_sov_step(standings, rows, group, tiebreak_type):
+    return get_best_of(group, standings.sov[rows])
+
+def batch_sos_step(standings, rows, group, tiebreak_type):
+    return get_best_of(group, standings.sos[rows])
+
+# The start of div_tiebreak_funcs & wc_tiebreak_funcs
+batch_steps = {
+    'div': [batch_record_step, batch_head_to_head_step, batch_div_step,
+        batch_common_games_step, batch_conf_step, batch_sov_step, batch_sos_step],
+    'wc': [batch_record_step, batch_head_to_head_step, batch_conf_step,
+        batch_common_games_step, batch_sov_step, batch_sos_step],
+}
+
+# Records & tiebreak values of a batch of outcomes, each [row, team]
+class BatchStandings:
+    def __init__(self, wins, ties):
+        self.num_rows = len(wins)
+        self.rows = np.arange(self.num_rows)
+        self.played = wins + np.swapaxes(wins, 1, 2) + ties
+        self.results = wins + 0.5 * ties
+        self.records = self.results.sum(axis=2)
+        self.div_records = (self.results * same_division_mask).sum(axis=2)
+        self.conf_records = (self.results * same_conference_mask).sum(axis=2)
+        self.sov = np.einsum('rij,rj->ri', wins, self.records)
+        self.sos = np.einsum('rij,rj->ri', self.played, self.records)
+        # Rows to leave to the scalar get_seeds
+        self.fallback = np.zeros(self.num_rows, dtype=bool)
+
+    # The best team of the group ([row, team] mask) in each row, as
+    # get_best_team would pick. Garbage for rows that fall back.
+    def get_best_teams(self, group, tiebreak_type, conf):
+        group = group.copy()
+        if tiebreak_type == 'wc':
+            # Only the best of each division's teams (see resolve_best_team)
+            for div_ids in conf_div_ids[conf]:
+                div_group = np.zeros_like(group)
+                div_group[:, div_ids] = group[:, div_ids]
+                rows = np.flatnonzero(div_group.sum(axis=1) > 1)
+                if rows.size:
+                    div_best = self.resolve(rows, div_group[rows], 'div')
+                    group[np.ix_(rows, div_ids)] = False
+                    group[rows, div_best] = True
+        return self.resolve(self.rows, group, tiebreak_type)
+
+    # Applies the batch steps to the groups of the rows until each is down to
+    # one team. A row whose group loses some teams starts over from the first
+    # step, like in resolve_best_team.
+    def resolve(self, rows, group, tiebreak_type):
+        group = group.copy()
+        pending = np.arange(len(rows))
+        while pending.size:
+            restarting = []
+            for step in batch_steps[tiebreak_type]:
+                remaining = step(self, rows[pending], group[pending], tiebreak_type)
+                num_teams = remaining.sum(axis=1)
+                changed = (remaining != group[pending]).any(axis=1)
+                group[pending] = remaining
+                restarting.append(pending[changed & (num_teams > 1)])
+                pending = pending[~changed & (num_teams > 1)]
+                if not pending.size:
+                    break
+            # Ties that the batch steps can't break
+            self.fallback[rows[pending]] = True
+            pending = np.concatenate(restarting)
+        return group.argmax(axis=1)
+
+    # Same as get_seeds, for every row (but garbage for rows that fall back)
+    def get_seeds(self, conf, num_seeds):
+        seeds = np.zeros((self.num_rows, num_seeds), dtype=np.intp)
+        div_champs = np.zeros((self.num_rows, len(all_teams)), dtype=bool)
+        for div_ids in conf_div_ids[conf]:
+            div_teams = np.zeros((self.num_rows, len(all_teams)), dtype=bool)
+            div_teams[:, div_ids] = True
+            div_champs[self.rows, self.get_best_teams(div_teams, 'div', conf)] = True
+
+        remaining = div_champs.copy()
+        for seed_idx in range(4):
+            seeds[:, seed_idx] = self.get_best_teams(remaining, 'wc', conf)
+            remaining[self.rows, seeds[:, seed_idx]] = False
+
+        remaining = np.zeros((self.num_rows, len(all_teams)), dtype=bool)
+        remaining[:, get_team_id_array(conf_teams[conf])] = True
+        remaining &= ~div_champs
+        for seed_idx in range(4, num_seeds):
+            seeds[:, seed_idx] = self.get_best_teams(remaining, 'wc', conf)
+            remaining[self.rows, seeds[:, seed_idx]] = False
+        return seeds
+
+    # Same as rank_divisions, as {div: N x 4 team IDs} (but garbage for rows
+    # that fall back)
+    def rank_divisions(self):
+        div_rankings = {}
+        for div, div_teams in divisions.items():
+            div_ids = get_team_id_array(div_teams)
+            remaining = np.zeros((self.num_rows, len(all_teams)), dtype=bool)
+            remaining[:, div_ids] = True
+            div_rankings[div] = np.zeros((self.num_rows, len(div_ids)), dtype=np.intp)
+            for rank_idx in range(len(div_ids)):
+                div_rankings[div][:, rank_idx] = self.resolve(self.rows, remaining, 'div')
+                remaining[self.rows, div_rankings[div][:, rank_idx]] = False
+        return div_rankings
+
+# Rows start:end of a batch argument, which is either None, the same for
+# every row (1D) or a row per outcome (2D).
+def get_batch_rows(array, start, end):
+    if array is None or np.ndim(array) < 2:
+        return array
+    return array[start:end]
+
+def get_num_batch_rows(batch_args):
+    return max([len(array) for array in batch_args if np.ndim(array) == 2] + [1])
+
+# Yields (start, standings, get_index) for each chunk of the batch, where
+# get_index(row) is the SeasonArrays view of a row of the chunk.
+def iter_batch_standings(table, batch_args, chunk_size):
+    num_rows = get_num_batch_rows(batch_args)
+    for start in range(0, num_rows, chunk_size):
+        end = min(start + chunk_size, num_rows)
+        chunk_args = [get_batch_rows(array, start, end) for array in batch_args]
+        if chunk_args[0] is None:
+            chunk_args[0] = np.ones((end - start, len(table.games)), dtype=bool)
+        chunk_masks, chunk_results, matrices = table.get_batch_matrices(*chunk_args)
+        yield start, BatchStandings(*matrices[:2]), lambda row: table.get_row_index(chunk_masks, chunk_results, matrices, row)
+
+# Returns {conf: N x num_seeds array of team IDs} for the N outcomes, which
+# are given the same way as for GameTable.get_indexes.
+def get_seeds_batch(table, year, masks=None, winners=None, losers=None, pts_w=None, pts_l=None,
+        confs=('AFC', 'NFC'), chunk_size=batch_chunk_size):
+    batch_args = [masks, winners, losers, pts_w, pts_l]
+    num_rows = get_num_batch_rows(batch_args)
+    num_seeds = 7 if year >= 2020 else 6
+
+    seeds = {conf: np.zeros((num_rows, num_seeds), dtype=np.intp) for conf in confs}
+    for start, standings, get_index in iter_batch_standings(table, batch_args, chunk_size):
+        for conf in confs:
+            standings.fallback[:] = False
+            seeds[conf][start:start + standings.num_rows] = standings.get_seeds(conf, num_seeds)
+            for row in np.flatnonzero(standings.fallback):
+                seeds[conf][start + row] = get_team_id_array(get_seeds(get_index(row), conf, year))
+    return seeds
+
+# Returns {div: N x 4 array of team IDs, first to last} for the N outcomes,
+# given the same way as for get_seeds_batch.
+def rank_divisions_batch(table, masks=None, winners=None, losers=None, pts_w=None, pts_l=None,
+        chunk_size=batch_chunk_size):
+    batch_args = [masks, winners, losers, pts_w, pts_l]
+    num_rows = get_num_batch_rows(batch_args)
+
+    div_rankings = {div: np.zeros((num_rows, len(div_teams)), dtype=np.intp) for div, div_teams in divisions.items()}
+    for start, standings, get_index in iter_batch_standings(table, batch_args, chunk_size):
+        chunk_rankings = standings.rank_divisions()
+        for div, div_ranking in chunk_rankings.items():
+            div_rankings[div][start:start + standings.num_rows] = div_ranking
+        for row in np.flatnonzero(standings.fallback):
+            for div, div_ranking in rank_divisions(get_index(row)).items():
+                div_rankings[div][start + row] = get_team_id_array(div_ranking)
+    return div_rankings
+
+# Seeds from get_seeds_batch as lists of team names
+def get_seed_names(seed_ids):
+    return [[all_teams[team_id] for team_id in row] for row in seed_ids.tolist()]
@@ -0,0 +1,90 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from schedule_analyzer import *
+
+
+# Which regular season games decided the seeding: for every game, would the
+# seeds of either conference be different if the game hadn't been played
+# ('removed') or had gone the other way ('flipped')?
+#
+# Every variant of the season is a view of the same GameTable, built in one
+# batch. A conference is only re-seeded if one of its teams played in the game,
+# or if the game changed anything else its seeding depends on (see
+# SeasonIndex.get_outside_stamp). Otherwise its seeds can't have changed.
+
+variants = ['removed', 'flipped']
+
+# Returns [(game, variant, {conf: (seeds, new_seeds)})] for every variant of
+# a game that changes the seeds, with only the conferences that changed.
+def sweep_season(year):
+    games, _ = load_year(year)
+    table = GameTable(games)
+    index = table.get_index()
+    seeds = {conf: get_seeds(index, conf, year) for conf in conf_teams}
+    stamps = {conf: index.get_outside_stamp(conf_teams[conf]) for conf in conf_teams}
+
+    # Row i of each is the season with game i removed/flipped
+    one_game = np.eye(len(games), dtype=bool)
+    winners, losers = table.get_flipped(one_game)
+    variant_indexes = {
+        'removed': table.get_indexes(~one_game),
+        'flipped': table.get_indexes(None, winners, losers),
+    }
+
+    changes = []
+    for game_idx, game in enumerate(games):
+        for variant in variants:
+            # A tie goes the same way flipped
+            if variant == 'flipped' and game.is_tie:
+                continue
+            variant_index = variant_indexes[variant][game_idx]
+            changed = {}
+            for conf, conf_team_list in conf_teams.items():
+                if game.winner not in conf_team_list and game.loser not in conf_team_list\
+                        and variant_index.get_outside_stamp(conf_team_list) == stamps[conf]:
+                    continue
+                new_seeds = get_seeds(variant_index, conf, year)
+                if new_seeds != seeds[conf]:
+                    changed[conf] = (seeds[conf], new_seeds)
+            if changed:
+                changes.append((game, variant, changed))
+    return changes
+
+# Yields (year, changes) in year order, with the years swept in parallel.
+def sweep_years(years, workers=None):
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for year in years:
+            yield year, sweep_season(year)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        yield from zip(years, executor.map(sweep_season, years))
+
+def describe_change(seeds, new_seeds):
+    moves = []
+    for seed_idx, team in enumerate(new_seeds):
+        if team not in seeds:
+            moves.append(f"{team} in as #{seed_idx+1}")
+        elif seeds.index(team) != seed_idx:
+            moves.append(f"{team} #{seeds.index(team)+1} -> #{seed_idx+1}")
+    moves += [f"{team} out" for team in seeds if team not in new_seeds]
+    return ', '.join(moves)
+
+def print_sweep_report(year, changes):
+    print(f"{year}: {len(changes)} removed/flipped games changed the seeding")
+    for game, variant, changed in changes:
+        result = 'tied' if game.is_tie else 'over'
+        print(f"\tWk {game.week} {game.winner} {result} {game.loser} {game.pts_w}-{game.pts_l}, {variant}:")
+        for conf, (seeds, new_seeds) in changed.items():
+            print(f"\t\t{conf}: {describe_change(seeds, new_seeds)}")
+
+
+if __name__ == '__main__':
+    import sys
+    years = [int(year) for year in sys.argv[1:]] or range(2002, 2021+1)
+    for year, changes in sweep_years(years):
+        print_sweep_report(year, changes)
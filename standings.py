@@ -0,0 +1,94 @@
+from schedule_analyzer import *
+
+
+# Mutable standings for a season. Games can be added, removed or have their
+# result flipped, and only the tallies of the two teams involved (plus the SoV &
+# SoS of their opponents) are updated, rather than re-indexing the season.
+#
+# Seeds & division rankings are cached per conference/division. A group only
+# needs to be re-ranked if one of its teams' games changed, or if anything
+# it could depend on from outside the group did: its teams' SoV, SoS & points
+# ranks (within the conference & the league). Otherwise, the cached result is
+# still what get_seeds/rank_division would return.
+class Standings:
+    def __init__(self, year, games=()):
+        self.year = year
+        self.index = SeasonIndex({team: [] for team in all_teams})
+        self.team_versions = {team: 0 for team in all_teams}
+        self.cache = {}
+        for game in games:
+            self.add_game(game)
+
+    def change_game(self, game, sign):
+        index = self.index
+        teams = [game.winner, game.loser]
+        for team in teams:
+            if sign > 0:
+                index[team].append(game)
+            else:
+                index[team].remove(game)
+            index.tally_games(team, [game], sign)
+            self.team_versions[team] += 1
+
+        # Anyone who played either team has a different SoV/SoS now
+        sov_teams = set(teams)
+        for team, games_vs in index.games_vs.items():
+            if teams[0] in games_vs or teams[1] in games_vs:
+                sov_teams.add(team)
+        index.update_derived(teams, sov_teams)
+
+    def add_game(self, game):
+        self.change_game(game, 1)
+
+    def remove_game(self, game):
+        self.change_game(game, -1)
+
+    # Returns the flipped game, which replaces the given one. The points go
+    # along with the result (the new winner gets PtsW).
+    def flip_result(self, game):
+        flipped = game.flipped()
+        self.remove_game(game)
+        self.add_game(flipped)
+        return flipped
+
+    # Everything the ranking of the group's teams depends on.
+    def get_group_stamp(self, teams):
+        return (tuple([self.team_versions[team] for team in teams]), self.index.get_outside_stamp(teams))
+
+    def is_dirty(self, key, teams):
+        return key not in self.cache or self.cache[key][0] != self.get_group_stamp(teams)
+
+    def get_cached(self, key, teams, compute):
+        stamp = self.get_group_stamp(teams)
+        if key not in self.cache or self.cache[key][0] != stamp:
+            self.cache[key] = (stamp, compute())
+        return self.cache[key][1]
+
+    def get_dirty_conferences(self):
+        return [conf for conf in conf_teams if self.is_dirty(('seeds', conf), conf_teams[conf])]
+
+    def get_dirty_divisions(self):
+        return [div for div in divisions if self.is_dirty(('div', div), divisions[div])]
+
+    def get_seeds(self, conf):
+        return self.get_cached(('seeds', conf), conf_teams[conf],
+            lambda: get_seeds(self.index, conf, self.year))
+
+    def rank_divisions(self):
+        div_rankings = {}
+        for div, div_teams in divisions.items():
+            div_rankings[div] = self.get_cached(('div', div), div_teams,
+                lambda: rank_division(self.index, div_teams))
+        return div_rankings
+
+
+# Replays the season a week at a time, yielding (week, standings) after each
+# week's games. Note that the standings are updated in place.
+def replay_season(year):
+    games, _ = load_year(year)
+    standings = Standings(year)
+    for week in sorted(set([game.week for game in games])):
+        for game in games:
+            if game.week == week:
+                standings.add_game(game)
+        yield week, standings
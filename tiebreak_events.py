@@ -0,0 +1,136 @@
+import json
+import sys
+
+
+# Structured tiebreak events. Nothing is built unless at least one sink is
+# attached, and callers check `enabled` before building an event, so there's
+# no cost to any of this when tracing is off.
+#
+# Events are dicts. A 'step' event is sent for each tiebreak step that's
+# applied in get_best_team:
+#   step:      name of the tiebreak function
+#   type:      'div' or 'wc'
+#   teams:     teams the step was applied to
+#   og_teams:  teams get_best_team was originally called with
+#   details:   what the step computed (see below), in order
+#   survivors: teams left after the step
+#   result:    'selected' (one team left), 'eliminated' or 'unchanged'
+#
+# Step details are dicts with a 'kind':
+#   values:             {label, values}, e.g. the records being compared
+#   ranking:            {points, ranking, ranks}, from rank_teams
+#   beat_all:           {team, teams}, for the Wild Card head-to-head
+#   lost_to_all:        {team, teams}, for the Wild Card head-to-head
+#   h2h_not_applicable: {teams}, for the Wild Card head-to-head
+#   skipped:            {teams}, common games with too few games
+#
+# The other events are:
+#   only_team:      {team, og_teams}, get_best_team left with a single team
+#   division_champ: {team, division}
+#   division_rank:  {team, division, rank}, from rank_division (not in the text trace)
+#   seed:           {team, seed}, for the division champs
+#   wild_card:      {team, wild_card, seed}
+#
+# Every event also has whatever is in context (e.g. the year) at the time.
+
+sinks = []
+enabled = False
+context = {}
+
+# Details for the step currently being applied, collected by the step function.
+details = []
+
+def add_sink(sink):
+    global enabled
+    sinks.append(sink)
+    enabled = True
+
+def remove_sink(sink):
+    global enabled
+    sinks.remove(sink)
+    enabled = bool(sinks)
+
+def set_context(**fields):
+    context.clear()
+    context.update(fields)
+
+def emit(event):
+    event = {**context, **event}
+    for sink in sinks:
+        sink.send(event)
+
+def add_detail(kind, **fields):
+    details.append({'kind': kind, **fields})
+
+# Returns the details collected so far & starts over.
+def take_details():
+    global details
+    taken, details = details, []
+    return taken
+
+
+def render_detail(detail):
+    kind = detail['kind']
+    if kind == 'values':
+        return f"[ ] {detail['label']}: {detail['values']}"
+    elif kind == 'ranking':
+        return f"[ ] Ranking ({str(detail['points'])}): {detail['ranking']}\n\t{detail['ranks']}"
+    elif kind == 'beat_all':
+        return f"[ ] {detail['team']} beat all teams in {detail['teams']}"
+    elif kind == 'lost_to_all':
+        return f"[ ] {detail['team']} lost to each of {detail['teams']}"
+    elif kind == 'h2h_not_applicable':
+        return f"[ ] WildCard head-to-head did not chagne {detail['teams']}"
+    else:
+        assert kind == 'skipped'
+        return f"[!] Common games tiebreak skipped in WC for {detail['teams']}"
+
+# Returns the event as the lines of the text trace (see results/complete_playoff_trace.txt)
+def render_event(event):
+    kind = event['event']
+    if kind == 'step':
+        lines = [render_detail(detail) for detail in event['details']]
+        if event['result'] == 'selected':
+            lines.append(f"[+] {event['survivors'][0]} selected out of {event['og_teams']} using {event['step']}")
+        elif event['result'] == 'eliminated':
+            lines.append(f"[-] {event['survivors']} remain out of {event['og_teams']} using {event['step']}")
+        return lines
+    elif kind == 'only_team':
+        return [f"[+] Only team ({event['team']}) is best team, out of original {event['og_teams']}"]
+    elif kind == 'division_champ':
+        return [f"[*] {event['team']} won the {event['division']}"]
+    elif kind == 'division_rank':
+        return []
+    elif kind == 'seed':
+        return [f"[*] Selected {event['team']} as #{event['seed']} seed"]
+    else:
+        assert kind == 'wild_card'
+        return [f"[*] Selected {event['team']} as #{event['wild_card']} WC / #{event['seed']} seed"]
+
+
+# Writes the text trace, to stdout by default.
+class TextSink:
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+
+    def send(self, event):
+        for line in render_event(event):
+            print(line, file=self.out)
+
+# One JSON object per event. Sets of teams are written as lists.
+class JsonLinesSink:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def send(self, event):
+        self.file.write(json.dumps(event, default=list) + '\n')
+
+    def close(self):
+        self.file.close()
+
+class BufferSink:
+    def __init__(self):
+        self.events = []
+
+    def send(self, event):
+        self.events.append(event)
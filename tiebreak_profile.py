@@ -0,0 +1,149 @@
+import json
+import statistics
+import sys
+import time
+
+
+# Per-step profiling of get_best_team: how often each tiebreak step is applied,
+# what it did, how long it took, how deep the restarts went & how much
+# tiebreaking each get_seeds call took. Like tiebreak_events, callers check
+# `enabled` before recording anything, so there's no cost while it's off.
+#
+#   tiebreak_profile.start()
+#   ... get_seeds, rank_divisions, ...
+#   tiebreak_profile.stop()
+#   tiebreak_profile.print_summary()
+#   tiebreak_profile.dump('results/tiebreak_profile.json')
+#
+# Cache hits in get_best_team don't apply any steps, so they're counted but
+# don't show up in the step stats.
+
+enabled = False
+
+# {(step, type): {calls, selected, eliminated, unchanged, skipped, teams, time_s}}
+# Steps are skipped when rank_group knows they can't separate the teams.
+step_stats = {}
+counters = {'get_best_team': 0, 'cache_hits': 0, 'resolves': 0}
+# {depth: number of resolve_best_team calls at that depth}. Depth 1 is the
+# outermost call, each restart or division tiebreak within a Wild Card
+# tiebreak is one deeper.
+depths = {}
+depth = 0
+# [{get_best_team, resolves, steps, time_s}] for each get_seeds call
+seeds_calls = []
+seeds_start = None
+
+def reset():
+    global depth, seeds_start
+    step_stats.clear()
+    for name in counters:
+        counters[name] = 0
+    depths.clear()
+    depth = 0
+    seeds_calls.clear()
+    seeds_start = None
+
+def start():
+    global enabled
+    reset()
+    enabled = True
+
+def stop():
+    global enabled
+    enabled = False
+
+def get_step_stats(step, tiebreak_type):
+    key = (step, tiebreak_type)
+    if key not in step_stats:
+        step_stats[key] = {'calls': 0, 'selected': 0, 'eliminated': 0,
+            'unchanged': 0, 'skipped': 0, 'teams': 0, 'time_s': 0.0}
+    return step_stats[key]
+
+def record_step(tiebreak_func, tiebreak_type, teams, remaining_teams, time_s):
+    stats = get_step_stats(tiebreak_func.__name__, tiebreak_type)
+    stats['calls'] += 1
+    stats['teams'] += len(teams)
+    stats['time_s'] += time_s
+    if len(remaining_teams) == 1:
+        stats['selected'] += 1
+    elif remaining_teams != teams:
+        stats['eliminated'] += 1
+    else:
+        stats['unchanged'] += 1
+
+def record_skip(tiebreak_func, tiebreak_type):
+    get_step_stats(tiebreak_func.__name__, tiebreak_type)['skipped'] += 1
+
+def count(name):
+    counters[name] += 1
+
+# Calls func (resolve_best_team) one level deeper
+def call_at_depth(func, *args):
+    global depth
+    depth += 1
+    counters['resolves'] += 1
+    depths[depth] = depths.get(depth, 0) + 1
+    try:
+        return func(*args)
+    finally:
+        depth -= 1
+
+def get_total_steps():
+    return sum([stats['calls'] for stats in step_stats.values()])
+
+def start_seeds():
+    global seeds_start
+    seeds_start = (counters['get_best_team'], counters['resolves'], get_total_steps(), time.perf_counter())
+
+def end_seeds():
+    global seeds_start
+    if seeds_start is None:
+        return
+    best_teams, resolves, steps, start_s = seeds_start
+    seeds_calls.append({'get_best_team': counters['get_best_team'] - best_teams,
+        'resolves': counters['resolves'] - resolves, 'steps': get_total_steps() - steps,
+        'time_s': time.perf_counter() - start_s})
+    seeds_start = None
+
+
+def get_summary():
+    steps = []
+    for (step, tiebreak_type), stats in step_stats.items():
+        steps.append({'step': step, 'type': tiebreak_type, **stats,
+            'mean_teams': stats['teams'] / stats['calls'] if stats['calls'] else 0.0,
+            'mean_us': 1e6 * stats['time_s'] / stats['calls'] if stats['calls'] else 0.0})
+    steps.sort(key=lambda stats: -stats['time_s'])
+
+    per_seeds = {}
+    for name in ['get_best_team', 'resolves', 'steps', 'time_s']:
+        values = [seeds_call[name] for seeds_call in seeds_calls]
+        if values:
+            per_seeds[name] = {'mean': statistics.mean(values), 'max': max(values)}
+    return {'steps': steps, 'counters': dict(counters),
+        'depths': {str(depth): calls for depth, calls in sorted(depths.items())},
+        'get_seeds_calls': len(seeds_calls), 'per_get_seeds': per_seeds}
+
+def dump(path):
+    with open(path, 'w') as dump_file:
+        json.dump(get_summary(), dump_file, indent=2)
+
+def print_summary(file=sys.stdout):
+    summary = get_summary()
+    total_s = sum([stats['time_s'] for stats in summary['steps']]) or 1.0
+    print(f"{'Step':<34} {'Type':<6} {'Calls':>8} {'Sel':>7} {'Elim':>7} {'Pass':>7} {'Skip':>7}"
+        f" {'Teams':>6} {'Total ms':>10} {'Mean us':>9} {'Share':>6}", file=file)
+    for stats in summary['steps']:
+        print(f"{stats['step']:<34} {stats['type']:<6} {stats['calls']:>8} {stats['selected']:>7}"
+            f" {stats['eliminated']:>7} {stats['unchanged']:>7} {stats['skipped']:>7}"
+            f" {stats['mean_teams']:>6.2f} {1000 * stats['time_s']:>10.3f} {stats['mean_us']:>9.2f}"
+            f" {100 * stats['time_s'] / total_s:>5.1f}%", file=file)
+
+    counts = summary['counters']
+    print(f"\nget_best_team calls: {counts['get_best_team']}, cache hits: {counts['cache_hits']},"
+        f" resolves: {counts['resolves']}", file=file)
+    print("Resolves by depth: " + ', '.join([f"{depth}: {calls}" for depth, calls in summary['depths'].items()]), file=file)
+    if summary['per_get_seeds']:
+        per_seeds = summary['per_get_seeds']
+        print(f"Per get_seeds ({summary['get_seeds_calls']} calls): "
+            + ', '.join([f"{name} {values['mean']:.3g} mean / {values['max']:.3g} max"
+                for name, values in per_seeds.items()]), file=file)